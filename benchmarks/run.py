@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+'''
+    Benchmarks of GitHandler and FileDumper on synthetic repositories
+
+    python benchmarks/run.py --scale 0.1 --output results.json
+    python benchmarks/run.py --baseline results.json
+'''
+from __future__ import unicode_literals
+
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from timeit import default_timer
+
+import click
+from tabulate import tabulate
+
+import git_app_version
+import synthetic
+from git_app_version.dumper import FORMATS, FileDumper
+from git_app_version.githandler import (
+    BACKEND_GITPYTHON, BACKEND_PYTHON, BACKEND_SUBPROCESS, GitHandler
+)
+
+BACKENDS = (BACKEND_GITPYTHON, BACKEND_SUBPROCESS, BACKEND_PYTHON)
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 1.25
+# differences below this number of seconds are noise
+MIN_DELTA = 0.002
+
+
+def old_commit(repo_dir):
+    '''
+    get a commit in the middle of the first-parent history
+    '''
+
+    count = int(subprocess.check_output(
+        ['git', '--git-dir', repo_dir, 'rev-list', '--count',
+         '--first-parent', 'HEAD']
+    ).decode('ascii'))
+
+    return subprocess.check_output(
+        ['git', '--git-dir', repo_dir, 'rev-parse',
+         'HEAD~{}'.format(count // 2)]
+    ).decode('ascii').strip()
+
+
+def benchmarks(repo_dir, output_dir):
+    '''
+    get [(name, setup)] benchmarks, setup() returning the function to time
+    '''
+
+    middle = old_commit(repo_dir)
+
+    def handler_call(method, *args, **kwargs):
+        def setup():
+            handler = GitHandler(repo_dir)
+            return lambda: getattr(handler, method)(*args, **kwargs)
+        return setup
+
+    def top_branches():
+        handler = GitHandler(repo_dir)
+        branches = handler.get_branches(middle)
+        return lambda: handler.get_top_branches(branches, full_commit=middle)
+
+    def backend_infos(backend):
+        # the handler is opened in the timed call : backends differ there too
+        def setup():
+            return lambda: GitHandler(repo_dir, backend=backend).get_infos(
+                middle
+            )
+        return setup
+
+    def dumper(fileformat):
+        data = GitHandler(repo_dir).get_infos(middle)
+
+        def setup():
+            return lambda: FileDumper().dump(
+                data=dict(data),
+                fileformat=fileformat,
+                target='version',
+                cwd=output_dir
+            )
+        return setup
+
+    def dumper_all():
+        data = GitHandler(repo_dir).get_infos(middle)
+
+        def setup():
+            return lambda: FileDumper().dump_all(
+                data=dict(data),
+                fileformats=FORMATS,
+                target='version',
+                cwd=output_dir
+            )
+        return setup
+
+    items = [
+        ('get_infos HEAD', handler_call('get_infos', 'HEAD')),
+        ('get_infos middle', handler_call('get_infos', middle)),
+        (
+            'get_infos middle version,full_commit',
+            handler_call(
+                'get_infos', middle, fields=['version', 'full_commit']
+            )
+        ),
+        ('get_version HEAD', handler_call('get_version', 'HEAD')),
+        ('get_version middle', handler_call('get_version', middle)),
+        ('get_branches HEAD', handler_call('get_branches', 'HEAD')),
+        ('get_branches middle', handler_call('get_branches', middle)),
+        ('get_top_branches middle', top_branches),
+        (
+            'get_containing middle remotes,heads,tags',
+            handler_call(
+                'get_containing', middle,
+                ('refs/remotes/', 'refs/heads/', 'refs/tags/')
+            )
+        ),
+    ]
+    items.extend(
+        ('open + get_infos middle {} backend'.format(backend),
+         backend_infos(backend)) for backend in BACKENDS
+    )
+    items.extend(
+        ('dump {}'.format(fileformat), dumper(fileformat))
+        for fileformat in FORMATS
+    )
+    items.append(('dump all', dumper_all()))
+
+    return items
+
+
+def measure(setup, repeat):
+    '''
+    time a function, setup excluded, after one warm up call
+    '''
+
+    setup()()
+
+    durations = []
+    for _ in range(repeat):
+        func = setup()
+        start = default_timer()
+        func()
+        durations.append(default_timer() - start)
+
+    durations.sort()
+
+    return {
+        'min': durations[0],
+        'median': durations[len(durations) // 2],
+        'mean': sum(durations) / len(durations),
+        'repeat': repeat,
+    }
+
+
+def metadata(spec):
+    '''
+    get the environment of a benchmarks run
+    '''
+
+    return {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_app_version': git_app_version.__version__,
+        'git': subprocess.check_output(['git', '--version']).decode(
+            'utf-8'
+        ).strip(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repository': spec.as_dict(),
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    '''
+    compare median durations to a baseline,
+    get ([(name, baseline, current, ratio, status)], regressions count)
+    '''
+
+    rows = []
+    regressions = 0
+    for name, current in sorted(results['benchmarks'].items()):
+        previous = baseline.get('benchmarks', {}).get(name)
+        if previous is None:
+            rows.append((name, None, current['median'], None, 'new'))
+            continue
+
+        ratio = current['median'] / previous['median'] \
+            if previous['median'] else float('inf')
+        status = 'ok'
+        if ratio > threshold and \
+                current['median'] - previous['median'] > MIN_DELTA:
+            status = 'REGRESSION'
+            regressions += 1
+        elif ratio < 1 / threshold:
+            status = 'faster'
+
+        rows.append((name, previous['median'], current['median'], ratio,
+                     status))
+
+    return rows, regressions
+
+
+def print_comparison(rows):
+    '''
+    display a comparison table
+    '''
+
+    def milliseconds(value):
+        return '' if value is None else '{:.2f}'.format(value * 1000)
+
+    click.echo(
+        tabulate(
+            [
+                (
+                    name, milliseconds(previous), milliseconds(current),
+                    '' if ratio is None else '{:.2f}'.format(ratio), status
+                ) for name, previous, current, ratio, status in rows
+            ],
+            headers=['benchmark', 'baseline ms', 'current ms', 'ratio', ''],
+            tablefmt='simple',
+            disable_numparse=True
+        ),
+        err=True
+    )
+
+
+@click.command(context_settings={'help_option_names': ['-h', '--help']})
+@click.option(
+    '--scale',
+    type=click.FloatRange(min=0),
+    default=1.0,
+    help='synthetic repository size factor, 1.0 = {} commits,'
+    ' {} remote branches and {} tags.'.format(
+        synthetic.DEFAULT_COMMITS, synthetic.DEFAULT_BRANCHES,
+        synthetic.DEFAULT_TAGS
+    )
+)
+@click.option(
+    '--commit-graph/--no-commit-graph',
+    default=True,
+    help='write a commit-graph in the synthetic repository.'
+)
+@click.option(
+    '--repeat',
+    type=click.IntRange(min=1),
+    default=DEFAULT_REPEAT,
+    help='timed runs per benchmark.'
+)
+@click.option(
+    '--only',
+    multiple=True,
+    help='run benchmarks whose name contains this text,'
+    ' can be set several times.'
+)
+@click.option(
+    '--work-dir',
+    default='.benchmarks',
+    type=click.Path(file_okay=False),
+    help='directory where synthetic repositories are kept.'
+)
+@click.option(
+    '--output',
+    '-o',
+    type=click.File('w'),
+    default='-',
+    help='JSON results file, Default is the standard output.'
+)
+@click.option(
+    '--baseline',
+    type=click.File('r'),
+    default=None,
+    help='JSON results of a previous run to compare with,'
+    ' exit with status 1 on regressions.'
+)
+@click.option(
+    '--threshold',
+    type=click.FloatRange(min=1),
+    default=DEFAULT_THRESHOLD,
+    help='median duration ratio flagged as a regression.'
+)
+def main(
+    scale, commit_graph, repeat, only, work_dir, output, baseline, threshold
+):
+    '''
+    Run benchmarks on a synthetic repository and store results as JSON
+    '''
+
+    spec = synthetic.Spec.scaled(scale, commit_graph=commit_graph)
+    repo_dir = os.path.abspath(os.path.join(work_dir, spec.dirname()))
+
+    click.echo('Building {} ...'.format(repo_dir), err=True)
+    synthetic.build(repo_dir, spec)
+
+    output_dir = tempfile.mkdtemp(prefix='git-app-version-bench-')
+    results = {'metadata': metadata(spec), 'benchmarks': {}}
+    try:
+        for name, setup in benchmarks(repo_dir, output_dir):
+            if only and not any(text in name for text in only):
+                continue
+            click.echo('Running {} ...'.format(name), err=True)
+            results['benchmarks'][name] = measure(setup, repeat)
+    finally:
+        shutil.rmtree(output_dir)
+
+    output.write(json.dumps(results, indent=2, sort_keys=True) + '\n')
+
+    if baseline is not None:
+        rows, regressions = compare(results, json.load(baseline), threshold)
+        print_comparison(rows)
+        if regressions:
+            click.echo('{} regression(s)'.format(regressions), err=True)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+'''
+    Synthetic git repositories for benchmarks
+
+    repositories are written in one `git fast-import` stream :
+    a first-parent history with side branches merged back every few commits,
+    some side branches having their own nested side branches,
+    remote branches and tags (annotated and lightweight) pointing at
+    commits spread over the whole history
+'''
+from __future__ import unicode_literals
+
+import json
+import os
+import random
+import shutil
+import subprocess
+
+DEFAULT_COMMITS = 100000
+DEFAULT_BRANCHES = 10000
+DEFAULT_TAGS = 20000
+
+# every MERGE_EVERY first-parent commits, a side branch is merged
+MERGE_EVERY = 20
+SIDE_LENGTH = 8
+# one side branch every NESTED_EVERY merges has a nested side branch
+NESTED_EVERY = 5
+
+START_TIMESTAMP = 1262304000  # 2010-01-01
+IDENTITY = 'Bench User <bench@example.com>'
+PARAMS_FILENAME = 'synthetic.json'
+
+
+class Spec(object):
+    '''
+    synthetic repository parameters
+    '''
+
+    def __init__(
+        self,
+        commits=DEFAULT_COMMITS,
+        branches=DEFAULT_BRANCHES,
+        tags=DEFAULT_TAGS,
+        commit_graph=True,
+        seed=42
+    ):
+        self.commits = commits
+        self.branches = branches
+        self.tags = tags
+        self.commit_graph = commit_graph
+        self.seed = seed
+
+    @classmethod
+    def scaled(cls, scale=1.0, **kwargs):
+        '''
+        get default parameters multiplied by scale
+        '''
+
+        return cls(
+            commits=max(int(DEFAULT_COMMITS * scale), MERGE_EVERY * 2),
+            branches=max(int(DEFAULT_BRANCHES * scale), 1),
+            tags=max(int(DEFAULT_TAGS * scale), 1),
+            **kwargs
+        )
+
+    def as_dict(self):
+        '''
+        get parameters as a dict
+        '''
+
+        return {
+            'commits': self.commits,
+            'branches': self.branches,
+            'tags': self.tags,
+            'commit_graph': self.commit_graph,
+            'seed': self.seed,
+        }
+
+    def dirname(self):
+        '''
+        get a directory name identifying the parameters
+        '''
+
+        return 'repo-c{commits}-b{branches}-t{tags}-g{graph}-s{seed}'.format(
+            graph=int(self.commit_graph), **self.as_dict()
+        )
+
+
+class StreamWriter(object):
+    '''
+    write `git fast-import` commands, commits are numbered by marks
+    '''
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.mark = 0
+        self.timestamp = START_TIMESTAMP
+
+    def write(self, text):
+        '''
+        write commands text
+        '''
+
+        self.stream.write(text.encode('utf-8'))
+
+    def data(self, text):
+        '''
+        write a data block
+        '''
+
+        raw = text.encode('utf-8')
+        self.stream.write('data {}\n'.format(len(raw)).encode('ascii'))
+        self.stream.write(raw + b'\n')
+
+    def commit(self, ref, message, parents=()):
+        '''
+        write a commit changing one file, return its mark
+        '''
+
+        self.mark += 1
+        self.timestamp += 60
+        self.write('commit {}\nmark :{}\n'.format(ref, self.mark))
+        self.write(
+            'committer {} {} +0000\n'.format(IDENTITY, self.timestamp)
+        )
+        self.data(message)
+        for index, parent in enumerate(parents):
+            self.write(
+                '{} :{}\n'.format('from' if index == 0 else 'merge', parent)
+            )
+        self.write('M 644 inline file-{}\n'.format(self.mark % 100))
+        self.data('{}\n'.format(self.mark))
+        self.write('\n')
+
+        return self.mark
+
+    def reset(self, ref, mark):
+        '''
+        point a reference at a commit
+        '''
+
+        self.write('reset {}\nfrom :{}\n\n'.format(ref, mark))
+
+    def tag(self, name, mark):
+        '''
+        write an annotated tag of a commit
+        '''
+
+        self.write('tag {}\nfrom :{}\n'.format(name, mark))
+        self.write('tagger {} {} +0000\n'.format(IDENTITY, self.timestamp))
+        self.data(name)
+
+
+def write_history(writer, commits):
+    '''
+    write the commits history, return the marks of first-parent commits
+    and of side branches commits
+    '''
+
+    mainline = []
+    side = []
+    head = None
+    merges = 0
+
+    while writer.mark < commits:
+        head = writer.commit(
+            'refs/heads/master', 'commit {}'.format(writer.mark + 1),
+            (head, ) if head else ()
+        )
+        mainline.append(head)
+
+        if len(mainline) % MERGE_EVERY or writer.mark + SIDE_LENGTH >= commits:
+            continue
+
+        # side branch forked a few first-parent commits back
+        merges += 1
+        fork = mainline[-MERGE_EVERY // 2]
+        ref = 'refs/heads/side'
+        tip = fork
+        for index in range(SIDE_LENGTH):
+            tip = writer.commit(
+                ref, 'side {}.{}'.format(merges, index), (tip, )
+            )
+            side.append(tip)
+
+            if merges % NESTED_EVERY == 0 and index == SIDE_LENGTH // 2:
+                nested = tip
+                for nested_index in range(2):
+                    nested = writer.commit(
+                        'refs/heads/nested',
+                        'nested {}.{}'.format(merges, nested_index),
+                        (nested, )
+                    )
+                    side.append(nested)
+                tip = writer.commit(
+                    ref, 'merge nested {}'.format(merges), (tip, nested)
+                )
+                side.append(tip)
+
+        head = writer.commit(
+            'refs/heads/master', 'merge side {}'.format(merges), (head, tip)
+        )
+        mainline.append(head)
+
+    return mainline, side
+
+
+def write_stream(stream, spec):
+    '''
+    write a whole synthetic repository as a `git fast-import` stream
+    '''
+
+    rand = random.Random(spec.seed)
+    writer = StreamWriter(stream)
+
+    mainline, side = write_history(writer, spec.commits)
+    commits = mainline + side
+
+    writer.reset('refs/remotes/origin/master', mainline[-1])
+    for index in range(spec.branches - 1):
+        writer.reset(
+            'refs/remotes/origin/branch-{:05d}'.format(index),
+            rand.choice(commits)
+        )
+
+    # tags follow the first-parent history like releases, annotated first
+    step = max(len(mainline) // spec.tags, 1)
+    for index in range(spec.tags):
+        mark = mainline[min(index * step, len(mainline) - 1)]
+        name = 'v{}.{}.{}'.format(index // 10000, index // 100 % 100,
+                                  index % 100)
+        if index % 2:
+            writer.reset('refs/tags/' + name, mark)
+        else:
+            writer.tag(name, mark)
+
+
+def build(directory, spec):
+    '''
+    create a bare synthetic repository, kept while its parameters match
+    '''
+
+    params_path = os.path.join(directory, PARAMS_FILENAME)
+    if os.path.exists(params_path):
+        with open(params_path) as fpt:
+            if json.load(fpt) == spec.as_dict():
+                return directory
+        shutil.rmtree(directory)
+
+    subprocess.check_call(
+        ['git', 'init', '--quiet', '--bare', directory]
+    )
+    process = subprocess.Popen(
+        ['git', '--git-dir', directory, 'fast-import', '--quiet'],
+        stdin=subprocess.PIPE
+    )
+    write_stream(process.stdin, spec)
+    process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError('git fast-import failed')
+
+    git = ['git', '--git-dir', directory]
+    subprocess.check_call(git + ['symbolic-ref', 'HEAD', 'refs/heads/master'])
+    subprocess.check_call(git + ['pack-refs', '--all'])
+    if spec.commit_graph:
+        subprocess.check_call(
+            git + ['commit-graph', 'write', '--reachable', '--no-progress']
+        )
+
+    with open(params_path, 'w') as fpt:
+        json.dump(spec.as_dict(), fpt)
+
+    return directory
@@ -1,27 +1,65 @@
 # -*- coding: utf-8 -*-
+'''
+    git-app-version
+
+    __version__ is only read on first use : from version.txt in a
+    PyInstaller bundle or next to this package, else from the _version
+    module generated by versioneer when the package is built
+'''
+import io
 import os
 import sys
 
-from ._version import get_versions
+_VERSION = []
+
+
+def get_version():
+    '''
+    get the application version, read once
+    '''
+
+    if not _VERSION:
+        _VERSION.append(_read_version())
+
+    return _VERSION[0]
+
 
-__version__ = ''
+def _read_version():
+    '''
+    read the application version
+    '''
 
-if getattr(sys, 'frozen', False):  # pragma: no cover
-    # we are running in a bundle
-    bundle_dir = sys._MEIPASS
+    if getattr(sys, 'frozen', False):  # pragma: no cover
+        # we are running in a bundle
+        bundle_dir = sys._MEIPASS
+    else:
+        bundle_dir = os.path.dirname(os.path.abspath(__file__))
 
+    version = ''
     version_file = os.path.join(bundle_dir, 'version.txt')
-    if os.path.exists(version_file):
-        with open(version_file) as f:
-            __version__ = f.read().strip("\n")
-else:  # pragma: no cover
-    # we are running in a normal Python environment
-    from pkg_resources import resource_string, resource_exists  # noqa
-    if resource_exists('git_app_version', 'version.txt'):
-        __version__ = resource_string('git_app_version',
-                                      'version.txt').strip("\n")
+    if os.path.exists(version_file):  # pragma: no cover
+        with io.open(version_file, 'r', encoding='utf-8') as f:
+            version = f.read().strip('\n')
+
+    if not version:
+        # static in built packages, runs git describe in a source checkout
+        from ._version import get_versions
+        version = get_versions()['version']
+
+    return version
 
-if not __version__:  # pragma: no cover
-    __version__ = get_versions()['version']
 
-del get_versions
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        '''
+        read __version__ on first use
+        '''
+
+        if name == '__version__':
+            return get_version()
+
+        raise AttributeError(
+            'module {!r} has no attribute {!r}'.format(__name__, name)
+        )
+else:  # pragma: no cover
+    __version__ = get_version()
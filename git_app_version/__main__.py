@@ -4,16 +4,34 @@
 '''
 # from __future__ import unicode_literals
 
+import glob
+import json
 import os
 import re
 
 import click
-from git.exc import InvalidGitRepositoryError, NoSuchPathError
-from tabulate import tabulate
 
 import git_app_version
-from git_app_version.dumper import FileDumper
-from git_app_version.githandler import RESERVED_KEYS, GitHandler
+import git_app_version.helper.date as dthelper
+from git_app_version.dumper import FORMATS, FileDumper
+from git_app_version.fanout import NOT_GIT_REPOSITORY, collect, collect_all
+from git_app_version.githandler import (
+    BACKEND_AUTO, BACKEND_NAMES, DEPLOY_DATE_COMMIT, DEPLOY_DATE_NOW,
+    FIELD_NAMES, RESERVED_KEYS, SOURCE_DATE_EPOCH
+)
+from git_app_version.githandler import GitHandler
+from git_app_version.githandler.errors import (
+    command_error, not_repository_errors
+)
+from git_app_version.helper.timing import NULL_TIMINGS, Timings
+from git_app_version.watcher import (
+    DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL, create_watcher
+)
+from git_app_version.watcher import watch as watch_changes
+
+# the daemon client and server, GitPython and tabulate are imported
+# by the commands and options using them : a `dump --quiet` run stays
+# a fast cold start
 
 
 def print_version(ctx, param, value):
@@ -29,6 +47,27 @@ def print_version(ctx, param, value):
 CONTEXT_SETTINGS = {'help_option_names': ['-h', '--help']}
 
 
+class DefaultGroup(click.Group):
+    '''
+    Click group running a default command
+    when the first argument is not a command name
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.default_command = kwargs.pop('default_command')
+        click.Group.__init__(self, *args, **kwargs)
+
+    def parse_args(self, ctx, args):
+        '''
+        insert the default command name before other arguments
+        '''
+
+        if not args or args[0] not in self.commands:
+            args = [self.default_command] + list(args)
+
+        return click.Group.parse_args(self, ctx, args)
+
+
 class MetadataParamType(click.ParamType):
     '''
     Click paramerer Type to parse <key>=<value> option
@@ -59,6 +98,224 @@ class MetadataParamType(click.ParamType):
 METADATA = MetadataParamType()
 
 
+class RepositoriesParamType(click.ParamType):
+    '''
+    Click parameter Type to parse a repository path or glob pattern
+    to a list of absolute directory paths
+    '''
+    name = 'repository'
+
+    def convert(self, value, param, ctx):
+        '''
+        expand glob patterns and check that directories exist
+        '''
+
+        if isinstance(value, list):
+            return value
+
+        if not glob.has_magic(value):
+            return [
+                click.Path(
+                    exists=True,
+                    resolve_path=True,
+                    file_okay=False,
+                    readable=True
+                ).convert(value, param, ctx)
+            ]
+
+        paths = [
+            os.path.realpath(path) for path in sorted(glob.glob(value))
+            if os.path.isdir(path)
+        ]
+        if not paths:
+            self.fail(u'no directory matches {}'.format(value), param, ctx)
+
+        return paths
+
+
+REPOSITORIES = RepositoriesParamType()
+
+
+class FieldsParamType(click.ParamType):
+    '''
+    Click parameter Type to parse a comma separated list of fields
+    '''
+    name = 'fields'
+
+    def convert(self, value, param, ctx):
+        '''
+        split and check selected fields
+        '''
+
+        if isinstance(value, list):
+            return value
+
+        fields = [field.strip() for field in value.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in FIELD_NAMES]
+        if unknown:
+            self.fail(
+                u'unknown field(s) {}, choose from {}'.format(
+                    ', '.join(unknown), ', '.join(FIELD_NAMES)
+                ), param, ctx
+            )
+
+        return fields
+
+
+FIELDS = FieldsParamType()
+
+
+class DeployDateParamType(click.ParamType):
+    '''
+    Click parameter Type to check a deploy date
+    '''
+    name = 'date'
+
+    def convert(self, value, param, ctx):
+        '''
+        check a deploy date : now, commit, an ISO 8601 date or a timestamp
+        '''
+
+        value = value.strip()
+        if value in (DEPLOY_DATE_NOW, DEPLOY_DATE_COMMIT) \
+                or dthelper.datetime_from_string(value) is not None:
+            return value
+
+        self.fail(
+            u'{} is not a valid date, use \'{}\', \'{}\','
+            u' an ISO 8601 date or a timestamp'.format(
+                value, DEPLOY_DATE_NOW, DEPLOY_DATE_COMMIT
+            ), param, ctx
+        )
+
+
+DEPLOY_DATE = DeployDateParamType()
+
+
+OUTPUT_OPTIONS = (
+    click.option('--quiet', '-q', is_flag=True, help='silent mode'),
+    click.option(
+        '--skip-unchanged',
+        is_flag=True,
+        help='leave files which already have the same content untouched,'
+        ' keeping their modification time for build caches.'
+    ),
+    click.option(
+        '--output',
+        '-o',
+        default='version',
+        help='output file path (without extension).'
+        ' Default is \'<repository-path>/version\'.'
+    ),
+    click.option(
+        '--format',
+        '-f',
+        'output_formats',
+        type=click.Choice(('all', ) + FORMATS),
+        multiple=True,
+        default=['json'],
+        help='output file format and extension,'
+        ' use \'all\' to output all format, can be set several times ,'
+        ' Default is json.'
+    ),
+    click.option(
+        '--namespace',
+        '-n',
+        default='',
+        help='namespace like notation in version file, use dot separator'
+        ' to segment namespaces e.g.: \'foo.bar.git\'.'
+        ' Default is \'app_version\' for XML and INI'
+        ' and no namespace for JSON and YAML.'
+        ' Never used for CSV or Shell file.'
+    ),
+    click.option(
+        '--meta',
+        '-m',
+        type=METADATA,
+        multiple=True,
+        help='meta data to add, format = "<key>=<value>",'
+        ' can be set several times'
+    ),
+    click.option(
+        '--csv-delimiter',
+        '-d',
+        'csv_delimiter',
+        default=u',',
+        help='CSV delimiter, default=","'
+    ),
+    click.option(
+        '--csv-eol',
+        '-e',
+        'csv_eol',
+        type=click.Choice(['lf', 'crlf']),
+        default="lf",
+        help='CSV end of line,'
+        ' lf = Unix new line, crlf = windows new line, default=lf'
+    ),
+    click.option(
+        '--csv-quote',
+        '-u',
+        'csv_quote',
+        default=u'"',
+        help='CSV quoting character, default=\'"\''
+    ),
+)
+
+FIELDS_OPTION = click.option(
+    '--fields',
+    '-F',
+    type=FIELDS,
+    multiple=True,
+    help='comma separated commit informations fields to get,'
+    ' can be set several times, branches, top_branches and version'
+    ' are only computed when selected, local_branches and tags_containing'
+    ' are only written when selected, Default is all other fields.'
+)
+
+TIMEOUT_OPTION = click.option(
+    '--timeout',
+    'time_budget',
+    type=click.FloatRange(min=0),
+    default=None,
+    help='seconds allowed to get informations of each commit,'
+    ' git commands still running are killed, version and branches are then'
+    ' degraded with a warning and listed in degraded_fields,'
+    ' Default is no limit.'
+)
+
+BACKEND_OPTION = click.option(
+    '--backend',
+    type=click.Choice(BACKEND_NAMES),
+    default=BACKEND_AUTO,
+    help='how git is accessed : \'gitpython\', \'subprocess\' git commands'
+    ' or pure \'python\' without any git process, \'auto\' picks python'
+    ' when the repository has a commit-graph and no grafts or replace refs,'
+    ' subprocess otherwise, Default is auto.'
+)
+
+DEPLOY_DATE_OPTION = click.option(
+    '--deploy-date',
+    type=DEPLOY_DATE,
+    envvar=SOURCE_DATE_EPOCH,
+    show_envvar=True,
+    default=None,
+    help='deploy_date and deploy_timestamp value : \'now\', \'commit\''
+    ' for the commit date, an ISO 8601 date or a timestamp,'
+    ' Default is the SOURCE_DATE_EPOCH timestamp when set, else now.'
+)
+
+
+def output_options(func):
+    '''
+    add output file options to a command
+    '''
+
+    for option in reversed(OUTPUT_OPTIONS):
+        func = option(func)
+
+    return func
+
+
 @click.command(context_settings=CONTEXT_SETTINGS)
 @click.option(
     '--version',
@@ -69,64 +326,320 @@ METADATA = MetadataParamType()
     is_eager=True
 )
 # @click.option('--verbose', '-v', count=True)
-@click.option('--quiet', '-q', is_flag=True, help='silent mode')
+@output_options
 @click.option(
-    '--output',
-    '-o',
-    default='version',
-    help='output file path (without extension).'
-    ' Default is \'<repository-path>/version\'.'
+    '--cache/--no-cache',
+    default=False,
+    help='store version and branches in \'<git-dir>/git-app-version\''
+    ' and reuse them while the commit and the references do not change,'
+    ' Default is --no-cache.'
 )
 @click.option(
-    '--format',
-    '-f',
-    'output_formats',
-    type=click.Choice(['all', 'json', 'yml', 'xml', 'ini', 'csv', 'sh']),
+    '--cache-size',
+    type=click.IntRange(min=1),
+    default=256,
+    help='maximum number of cached results, Default is 256.'
+)
+@FIELDS_OPTION
+@TIMEOUT_OPTION
+@BACKEND_OPTION
+@DEPLOY_DATE_OPTION
+@click.option(
+    '--repository',
+    '-r',
+    'repositories',
+    type=REPOSITORIES,
     multiple=True,
-    default=['json'],
-    help='output file format and extension,'
-    ' use \'all\' to output all format, can be set several times ,'
-    ' Default is json.'
+    help='other git repository path or glob pattern to check,'
+    ' can be set several times.'
 )
 @click.option(
-    '--namespace',
-    '-n',
-    default='',
-    help='namespace like notation in version file, use dot separator'
-    ' to segment namespaces e.g.: \'foo.bar.git\'.'
-    ' Default is \'app_version\' for XML and INI'
-    ' and no namespace for JSON and YAML.'
-    ' Never used for CSV or Shell file.'
+    '--jobs',
+    '-j',
+    type=click.IntRange(min=1),
+    default=None,
+    help='number of worker processes used to check several repositories,'
+    ' Default is the number of CPU cores.'
 )
 @click.option(
-    '--meta',
-    '-m',
-    type=METADATA,
-    multiple=True,
-    help='meta data to add, format = "<key>=<value>", can be set several times'
+    '--daemon/--no-daemon',
+    default=False,
+    help='ask the \'git-app-version serve\' daemon,'
+    ' collect in process when no daemon is running, Default is --no-daemon.'
+)
+@click.option(
+    '--socket',
+    'socket_path',
+    type=click.Path(dir_okay=False),
+    default=None,
+    help='daemon socket path, Default is $GIT_APP_VERSION_SOCKET'
+    ' or \'git-app-version-<uid>.sock\' in the user runtime directory.'
+)
+@click.option(
+    '--profile',
+    is_flag=True,
+    help='report durations of each phase, git command and file format'
+    ' written on standard error.'
+)
+@click.option(
+    '--profile-format',
+    type=click.Choice(['table', 'json']),
+    default='table',
+    help='profile report format, Default is table.'
+)
+@click.argument('repository', type=REPOSITORIES, default=os.getcwd())
+@click.argument('commits', metavar='[COMMIT]...', nargs=-1)
+@click.option(
+    '--commits-from',
+    '-c',
+    type=click.File('r'),
+    help='read commits to check from a file, one per line,'
+    ' use \'-\' to read standard input.'
+)
+@click.pass_context
+def dump(
+    ctx, repository, repositories, jobs, commits, commits_from, output,
+    output_formats, namespace, meta, quiet, skip_unchanged, csv_delimiter,
+    csv_quote, csv_eol, cache, cache_size, fields, time_budget, backend,
+    deploy_date, daemon, socket_path, profile, profile_format
+):
+    '''
+    Get Git commit informations and store them in a config file
+
+    \b
+    REPOSITORY git repository path or glob pattern,
+               Default is the current directory.
+               With several repositories, they are checked in parallel
+               and files are written in each repository.
+    COMMIT     git commits to check, Default is HEAD.
+               With several commits, one file is written per commit
+               and '-<abbrev_commit>' is added to output file path.
+
+    \b
+    Other commands :
+    history    write informations of a commits range as JSON Lines,
+               see 'git-app-version history -h'.
+    serve      run a daemon answering requests of --daemon calls,
+               see 'git-app-version serve -h'.
+    watch      regenerate files when HEAD or references change,
+               see 'git-app-version watch -h'.
+    '''
+
+    commits = list(commits)
+    if commits_from is not None:
+        commits.extend(line.strip() for line in commits_from if line.strip())
+
+    repositories = _unique(
+        path for paths in (repository, ) + repositories for path in paths
+    )
+    fields = _unique(field for items in fields for field in items) or None
+    if time_budget is not None and fields \
+            and 'degraded_fields' not in fields:
+        fields.append('degraded_fields')
+    batch = len(commits) > 1
+
+    # batch output file paths need the abbreviated commit
+    query_fields = fields
+    if batch and fields and 'abbrev_commit' not in fields:
+        query_fields = fields + ['abbrev_commit']
+
+    query = {
+        'cache': cache,
+        'cache_size': cache_size,
+        'fields': query_fields,
+        'time_budget': time_budget,
+        'backend': backend,
+        'deploy_date': deploy_date
+    }
+
+    timings = None
+    if profile:
+        timings = Timings()
+        ctx.call_on_close(lambda: print_timings(timings, profile_format))
+
+    options = {
+        'timings': timings,
+        'fields': fields,
+        'output_formats': output_formats,
+        'namespace': namespace,
+        'meta': meta,
+        'quiet': quiet,
+        'skip_unchanged': skip_unchanged,
+        'csv_delimiter': csv_delimiter,
+        'csv_quote': csv_quote,
+        'csv_eol': csv_eol
+    }
+
+    if daemon:
+        collected = collect_from_daemon(
+            repositories, commits, socket_path, jobs, timings, **query
+        )
+        if collected is not None:
+            ctx.exit(
+                write_collected(
+                    collected, output, batch, len(repositories) > 1, **options
+                )
+            )
+
+    if len(repositories) == 1:
+        try:
+            results = collect(
+                repositories[0], commits, timings=timings, **query
+            )
+        except not_repository_errors():
+            click.echo(
+                NOT_GIT_REPOSITORY.format(
+                    click.format_filename(repositories[0])
+                )
+            )
+            ctx.exit(1)
+
+        ctx.exit(
+            write_results(
+                repositories[0], results, output, batch, **options
+            )
+        )
+
+    ctx.exit(
+        write_collected(
+            collect_all(
+                repositories, commits, processes=jobs, timings=timings,
+                **query
+            ),
+            output, batch, True, **options
+        )
+    )
+
+
+def collect_from_daemon(
+    repositories, commits, socket_path, jobs, timings=None, **query
+):
+    '''
+    collect repositories with the daemon,
+    None when no daemon is running
+
+    repositories left when the daemon stops are collected in process
+    '''
+
+    from git_app_version import client
+
+    collected = []
+    for index, repository in enumerate(repositories):
+        try:
+            with (timings or NULL_TIMINGS).phase('daemon request'):
+                results = client.collect(
+                    repository, commits, socket_path=socket_path, **query
+                )
+        except client.DaemonError as exc:
+            collected.append((repository, None, str(exc)))
+            continue
+
+        if results is None:
+            if not collected:
+                return None
+            collected.extend(
+                collect_all(
+                    repositories[index:],
+                    commits,
+                    processes=jobs,
+                    timings=timings,
+                    **query
+                )
+            )
+            break
+
+        collected.append((repository, results, None))
+
+    return collected
+
+
+def write_collected(collected, output, batch, several, **options):
+    '''
+    write (repository, results, error) collected in several repositories
+
+    return the exit status, 1 if a repository or a commit failed
+    '''
+
+    status = 0
+    for path, results, error in collected:
+        if error is not None:
+            click.echo(error, err=True)
+            status = 1
+            continue
+
+        if several and not options['quiet']:
+            click.echo(u'Repository : {}'.format(click.format_filename(path)))
+
+        status = write_results(
+            path, results, output, batch, **options
+        ) or status
+
+    return status
+
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option(
+    '--socket',
+    'socket_path',
+    type=click.Path(dir_okay=False),
+    default=None,
+    help='socket path, Default is $GIT_APP_VERSION_SOCKET'
+    ' or \'git-app-version-<uid>.sock\' in the user runtime directory.'
 )
 @click.option(
-    '--csv-delimiter',
-    '-d',
-    'csv_delimiter',
-    default=u',',
-    help='CSV delimiter, default=","'
+    '--idle-timeout',
+    type=click.FloatRange(min=0),
+    default=0,
+    help='stop after this number of seconds without request,'
+    ' Default is 0 (never).'
+)
+@click.pass_context
+def serve(ctx, socket_path, idle_timeout):
+    '''
+    Run a daemon answering `git-app-version --daemon` requests
+
+    git repositories indexes are kept in memory between requests,
+    the daemon stops on a shutdown request or after the idle timeout.
+    '''
+
+    import socket
+    from git_app_version import client
+    from git_app_version.server import serve as serve_forever
+
+    socket_path = socket_path or client.default_socket_path()
+    try:
+        serve_forever(socket_path, idle_timeout)
+    except socket.error as exc:
+        click.echo(str(exc), err=True)
+        ctx.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@output_options
+@FIELDS_OPTION
+@TIMEOUT_OPTION
+@BACKEND_OPTION
+@DEPLOY_DATE_OPTION
+@click.option(
+    '--debounce',
+    type=click.FloatRange(min=0),
+    default=DEFAULT_DEBOUNCE,
+    help='seconds without change to wait before regenerating files,'
+    ' Default is {}.'.format(DEFAULT_DEBOUNCE)
 )
 @click.option(
-    '--csv-eol',
-    '-e',
-    'csv_eol',
-    type=click.Choice(['lf', 'crlf']),
-    default="lf",
-    help='CSV end of line,'
-    ' lf = Unix new line, crlf = windows new line, default=lf'
+    '--poll-interval',
+    type=click.FloatRange(min=0.01),
+    default=DEFAULT_POLL_INTERVAL,
+    help='seconds between checks when inotify is unavailable,'
+    ' Default is {}.'.format(DEFAULT_POLL_INTERVAL)
 )
 @click.option(
-    '--csv-quote',
-    '-u',
-    'csv_quote',
-    default=u'"',
-    help='CSV quoting character, default=\'"\''
+    '--polling',
+    is_flag=True,
+    help='check changes by polling even when inotify is available.'
 )
 @click.argument(
     'repository',
@@ -135,68 +648,290 @@ METADATA = MetadataParamType()
     ),
     default=os.getcwd()
 )
-@click.argument('commit', default='HEAD')
 @click.pass_context
-def dump(
-    ctx, repository, commit, output, output_formats, namespace, meta, quiet,
-    csv_delimiter, csv_quote, csv_eol
+def watch(
+    ctx, repository, output, output_formats, namespace, meta, quiet,
+    skip_unchanged, csv_delimiter, csv_quote, csv_eol, fields, time_budget,
+    backend, deploy_date, debounce, poll_interval, polling
 ):
     '''
-    Get Git commit informations and store them in a config file
+    Regenerate version files when HEAD or references change
 
     \b
     REPOSITORY git repository path, Default is the current directory.
-    COMMIT     git commit to check, Default is HEAD.
     '''
 
     try:
-        # pprint(repository)
-        # pprint(type(repository))
-        vcs = GitHandler(repository)
-
-        data = vcs.get_infos(commit=commit)
-
-        # add metadatas
-        for item in meta:
-            for key, val in item.items():
-                data[key] = val
-
-        if not quiet:
-            print_commit_table(data)
-
-        dumper = FileDumper()
-        if not quiet and len(output_formats):
-            click.echo("written to :")
-
-        if 'all' in output_formats:
-            output_formats = ['json', 'yml', 'xml', 'ini', 'csv', 'sh']
-
-        for output_format in output_formats:
-            dest = dumper.dump(
-                data=data,
-                fileformat=output_format,
-                target=output,
-                cwd=repository,
-                namespace=namespace,
-                csv_delimiter=csv_delimiter,
-                csv_quote=csv_quote,
-                csv_eol=csv_eol
-            )
-            if not quiet:
-                click.echo(dest)
+        vcs = GitHandler(repository, backend=backend)
+    except not_repository_errors():
+        click.echo(
+            NOT_GIT_REPOSITORY.format(click.format_filename(repository))
+        )
+        ctx.exit(1)
+
+    fields = _unique(field for items in fields for field in items) or None
 
-        ctx.exit(0)
+    def regenerate():
+        '''
+        write version files of the current HEAD
+        '''
+
+        data = vcs.get_infos(
+            fields=fields, time_budget=time_budget, deploy_date=deploy_date
+        )
+        warn_degraded('HEAD', data)
+        write_infos(
+            data,
+            output=output,
+            output_formats=output_formats,
+            cwd=repository,
+            namespace=namespace,
+            meta=meta,
+            quiet=quiet,
+            skip_unchanged=skip_unchanged,
+            csv_delimiter=csv_delimiter,
+            csv_quote=csv_quote,
+            csv_eol=csv_eol
+        )
+
+    def report(exc):
+        '''
+        report a failed regeneration, files are written again on next change
+        '''
+
+        click.echo(u'Regeneration failed : {}'.format(exc), err=True)
+
+    try:
+        regenerate()
+    except Exception as exc:  # pylint: disable=broad-except
+        report(exc)
 
-    except (InvalidGitRepositoryError, NoSuchPathError):
-        msg = u'The directory \'{}\' is not a git repository.'
-        click.echo(msg.format(click.format_filename(repository)))
+    watcher = create_watcher(
+        vcs.git_dir, poll_interval=poll_interval, inotify=not polling
+    )
+
+    try:
+        watch_changes(watcher, regenerate, debounce, on_error=report)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@FIELDS_OPTION
+@TIMEOUT_OPTION
+@BACKEND_OPTION
+@DEPLOY_DATE_OPTION
+@click.option(
+    '--output',
+    '-o',
+    type=click.File('w', lazy=True),
+    default='-',
+    help='JSON Lines output file path, Default is the standard output.'
+)
+@click.argument(
+    'repository',
+    type=click.Path(
+        exists=True, resolve_path=True, file_okay=False, readable=True
+    ),
+    default=os.getcwd()
+)
+@click.argument('revisions', metavar='[REVISION]...', nargs=-1)
+@click.pass_context
+def history(
+    ctx, repository, revisions, output, fields, time_budget, backend,
+    deploy_date
+):
+    '''
+    Write Git commit informations of a commits range as JSON Lines
+
+    \b
+    REPOSITORY git repository path, Default is the current directory.
+    REVISION   git rev-list revisions e.g. 'v1.0..HEAD', Default is HEAD.
+               One line is written per commit, as commits are listed.
+    '''
+
+    try:
+        vcs = GitHandler(repository, backend=backend)
+    except not_repository_errors():
+        click.echo(
+            NOT_GIT_REPOSITORY.format(click.format_filename(repository))
+        )
+        ctx.exit(1)
+
+    fields = _unique(field for items in fields for field in items) or None
+
+    try:
+        for data in vcs.iter_history(
+            revisions or ['HEAD'],
+            fields=fields,
+            time_budget=time_budget,
+            deploy_date=deploy_date
+        ):
+            warn_degraded(data.get('full_commit', ''), data)
+            output.write(json.dumps(data, sort_keys=True) + '\n')
+    except command_error():
+        click.echo(
+            u'Invalid revisions \'{}\'.'.format(' '.join(revisions)),
+            err=True
+        )
         ctx.exit(1)
 
 
+cli = DefaultGroup(
+    context_settings=CONTEXT_SETTINGS,
+    default_command='dump',
+    commands={
+        'dump': dump,
+        'history': history,
+        'serve': serve,
+        'watch': watch
+    },
+    help='Get Git commit informations, see \'git-app-version dump -h\'.'
+)
+
+
+def write_results(
+    repository, results, output, batch, fields=None, **options
+):
+    '''
+    write commit informations collected in a repository,
+    keeping only the selected fields when some are given
+
+    return the exit status, 1 if a commit was unknown
+    '''
+
+    status = 0
+    for commit, data in results:
+        if data is None:
+            click.echo(u'Unknown commit \'{}\'.'.format(commit), err=True)
+            status = 1
+            continue
+
+        target = output
+        if batch:
+            target = u'{}-{}'.format(output, data['abbrev_commit'])
+
+        if fields:
+            data = dict((field, data[field]) for field in fields)
+
+        warn_degraded(commit, data)
+        write_infos(data, output=target, cwd=repository, **options)
+
+    return status
+
+
+def warn_degraded(commit, data):
+    '''
+    warn on standard error about fields degraded by the time budget
+    '''
+
+    if data.get('degraded_fields'):
+        click.echo(
+            u'Warning : time budget exceeded for commit \'{}\','
+            u' degraded fields : {}.'.format(
+                commit, ', '.join(data['degraded_fields'])
+            ),
+            err=True
+        )
+
+
+def write_infos(
+    data, output, output_formats, cwd, namespace, meta, quiet, csv_delimiter,
+    csv_quote, csv_eol, skip_unchanged=False, timings=None
+):
+    '''
+    add metadata to commit informations, display and write them,
+    file writes are recorded in the optional timings
+    '''
+
+    # add metadatas
+    for item in meta:
+        for key, val in item.items():
+            data[key] = val
+
+    if not quiet:
+        print_commit_table(data)
+
+    if not len(output_formats):
+        return
+
+    dumper = FileDumper(timings, skip_unchanged=skip_unchanged)
+    destinations = dumper.dump_all(
+        data=data,
+        fileformats=output_formats,
+        target=output,
+        cwd=cwd,
+        namespace=namespace,
+        csv_delimiter=csv_delimiter,
+        csv_quote=csv_quote,
+        csv_eol=csv_eol
+    )
+
+    if quiet:
+        return
+
+    if dumper.changed:
+        click.echo("written to :")
+        for dest in dumper.changed:
+            click.echo(dest)
+
+    unchanged = [dest for dest in destinations if dest not in dumper.changed]
+    if unchanged:
+        click.echo("unchanged :")
+        for dest in unchanged:
+            click.echo(dest)
+
+
+def _unique(items):
+    '''
+    remove duplicates from an iterable, keeping the first occurrences order
+    '''
+
+    seen = set()
+    unique = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            unique.append(item)
+
+    return unique
+
+
+def print_timings(timings, output_format='table'):
+    '''
+    display timings in standard error as a table or as JSON
+    '''
+
+    if output_format == 'json':
+        click.echo(json.dumps(timings.as_dict(), indent=2), err=True)
+        return
+
+    from tabulate import tabulate
+
+    table = [
+        [kind, name, calls, '{:.3f}'.format(seconds * 1000)]
+        for kind, name, calls, seconds in timings.summary()
+    ]
+    click.echo('Profile :', err=True)
+    click.echo(
+        tabulate(
+            table,
+            headers=['kind', 'name', 'calls', 'ms'],
+            tablefmt='simple',
+            disable_numparse=True
+        ),
+        err=True
+    )
+
+
 def print_commit_table(data):
     '''
     display a dict as a Table in standard output
     '''
+    from tabulate import tabulate
+
     click.echo('Git commit :')
     keys = sorted(data.keys())
     table = []
@@ -212,4 +947,4 @@ def print_commit_table(data):
 
 
 if __name__ == '__main__':
-    dump()
+    cli()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+'''
+    Thin client of the `git-app-version serve` daemon
+
+    only the standard library is imported,
+    callers fall back to in process collection when no daemon is running
+'''
+from __future__ import unicode_literals
+
+import json
+import os
+import socket
+import tempfile
+
+SOCKET_ENV = 'GIT_APP_VERSION_SOCKET'
+DEFAULT_TIMEOUT = 30.0
+
+
+class DaemonError(Exception):
+    '''
+    the daemon answered with an error message
+    '''
+
+
+def default_socket_path():
+    '''
+    get the daemon socket path,
+    from GIT_APP_VERSION_SOCKET or in the user runtime directory
+    '''
+
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+
+    return os.path.join(
+        directory, 'git-app-version-{}.sock'.format(os.getuid())
+    )
+
+
+def request(payload, socket_path=None, timeout=DEFAULT_TIMEOUT):
+    '''
+    send a JSON request to the daemon and get its JSON response,
+    None when no daemon answers
+    '''
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path or default_socket_path())
+        sock.sendall((json.dumps(payload) + '\n').encode('utf-8'))
+
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if chunk.endswith(b'\n'):
+                break
+    except (socket.error, socket.timeout):
+        return None
+    finally:
+        sock.close()
+
+    try:
+        return json.loads(b''.join(chunks).decode('utf-8'))
+    except ValueError:
+        return None
+
+
+def ping(socket_path=None, timeout=DEFAULT_TIMEOUT):
+    '''
+    check if a daemon is running
+    '''
+
+    response = request({'command': 'ping'}, socket_path, timeout)
+
+    return response is not None and response.get('pong', False)
+
+
+def collect(
+    repository,
+    commits=None,
+    cache=False,
+    cache_size=256,
+    fields=None,
+    socket_path=None,
+    timeout=DEFAULT_TIMEOUT,
+    time_budget=None,
+    backend=None,
+    deploy_date=None
+):
+    '''
+    get commit informations of a repository from the daemon,
+    see fanout.collect()
+
+    return None when no daemon is running,
+    raise DaemonError when the daemon can not collect the repository
+    '''
+
+    if time_budget is not None:
+        # the daemon may use the whole time budget of every commit
+        timeout += time_budget * max(len(commits or []), 1)
+
+    response = request(
+        {
+            'command': 'collect',
+            'repository': os.path.abspath(repository),
+            'commits': list(commits or []),
+            'cache': cache,
+            'cache_size': cache_size,
+            'fields': fields,
+            'time_budget': time_budget,
+            'backend': backend,
+            'deploy_date': deploy_date,
+            # SOURCE_DATE_EPOCH and CI variables are read from the caller
+            'environ': dict(os.environ),
+        }, socket_path, timeout
+    )
+    if response is None:
+        return None
+
+    if 'error' in response:
+        raise DaemonError(response['error'])
+
+    return [(commit, data) for commit, data in response['results']]
@@ -4,21 +4,141 @@ Data dumper to files with several format
 '''
 from __future__ import unicode_literals
 
+import binascii
+import hashlib
+import io
 import json
-from builtins import open
-
-import xmltodict
-import yaml
-from backports import configparser, csv
+import os
+import stat
+from timeit import default_timer
 
 import git_app_version.helper.tools as tools
+from git_app_version.helper.timing import KIND_DUMP, NULL_TIMINGS
+
+FORMATS = ('json', 'yml', 'xml', 'ini', 'csv', 'sh')
+# file extension of each format, unknown formats are dumped as JSON
+EXTENSIONS = {
+    'json': 'json',
+    'yaml': 'yml',
+    'yml': 'yml',
+    'xml': 'xml',
+    'ini': 'ini',
+    'csv': 'csv',
+    'sh': 'sh',
+}
+# files are small : a few threads are enough to overlap their writes
+DEFAULT_WORKERS = 4
+# rw-rw-rw- minus the umask, as a file created by open()
+FILE_MODE = 0o666
+
+
+class NormalizedData(object):
+    '''
+    data prepared once for all formats :
+    list values flattened to strings, namespace nestings built on demand
+    '''
+
+    def __init__(self, data):
+        self.data = data
+        self.flat = [(key, tools.flatten(val)) for key, val in data.items()]
+        self._nested = {}
+
+    def nested(self, namespace=None):
+        '''
+        reorganize data with a namespace if necessary
+        '''
+
+        if not namespace:
+            return self.data
+
+        if namespace not in self._nested:
+            to_dump = self.data
+            for name in reversed(namespace.split('.')):
+                to_dump = {name: to_dump}
+            self._nested[namespace] = to_dump
+
+        return self._nested[namespace]
+
+
+def encode(content):
+    '''
+    get the bytes a text mode write of a rendered file would produce
+    '''
+
+    if os.linesep != '\n':  # pragma: no cover
+        content = content.replace('\n', os.linesep)
+
+    return content.encode('utf-8')
+
+
+def file_digest(path, chunk_size=65536):
+    '''
+    get the SHA-256 digest of a file content
+    '''
+
+    digest = hashlib.sha256()
+    with io.open(path, 'rb') as fpt:
+        for chunk in iter(lambda: fpt.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.digest()
+
+
+def write_file(path, content, skip_unchanged=False):
+    '''
+    write a rendered file through a temporary file renamed over it,
+    when skip_unchanged, a file with the same content is left untouched,
+    get (duration, changed)
+    '''
+
+    start = default_timer()
+    encoded = encode(content)
+
+    try:
+        current = os.stat(path)
+    except OSError:
+        current = None
+
+    if skip_unchanged and current is not None \
+            and current.st_size == len(encoded) \
+            and file_digest(path) == hashlib.sha256(encoded).digest():
+        return default_timer() - start, False
+
+    tmp_path = '{}.{}.tmp'.format(
+        path, binascii.hexlify(os.urandom(4)).decode('ascii')
+    )
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, FILE_MODE)
+    try:
+        with io.open(fd, 'wb') as fpt:
+            fpt.write(encoded)
+        if current is not None:
+            # keep the mode of the replaced file
+            os.chmod(tmp_path, stat.S_IMODE(current.st_mode))
+        getattr(os, 'replace', os.rename)(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return default_timer() - start, True
 
 
 class FileDumper(object):
     '''
     Main dumper
+
+    format libraries are only imported by the dump of their format
     '''
 
+    def __init__(self, timings=None, skip_unchanged=False):
+        # helper.timing.Timings recording each format write duration
+        self.timings = NULL_TIMINGS if timings is None else timings
+        # leave files which already have the rendered content untouched,
+        # their modification time stays valid for build caches
+        self.skip_unchanged = skip_unchanged
+        # files actually written by the last dump, in formats order
+        self.changed = []
+
     def dump(
         self,
         data=None,
@@ -34,151 +154,197 @@ class FileDumper(object):
         Agnostic main dump function
         '''
 
-        target = tools.create_parent_dirs(target, cwd)
-        if fileformat == 'yaml' or fileformat == 'yml':
-            return self.__dump_yaml(data, target, namespace)
-        elif fileformat == 'xml':
-            return self.__dump_xml(data, target, namespace)
-        elif fileformat == 'ini':
-            return self.__dump_ini(data, target, namespace)
-        elif fileformat == 'sh':
-            return self.__dump_sh(data, target)
-        elif fileformat == 'csv':
-            return self.__dump_csv(
-                data,
-                target,
-                delimiter=csv_delimiter,
-                quotechar=csv_quote,
-                eol=csv_eol
-            )
-        else:
-            return self.__dump_json(data, target, namespace)
+        return self.dump_all(
+            data, [fileformat], target, cwd, namespace, csv_delimiter,
+            csv_quote, csv_eol
+        )[0]
 
-    def __create_infos_to_dump(self, infos, namespace=None):
+    def dump_all(
+        self,
+        data=None,
+        fileformats=FORMATS,
+        target=None,
+        cwd=None,
+        namespace='',
+        csv_delimiter=',',
+        csv_quote='"',
+        csv_eol='lf',
+        workers=DEFAULT_WORKERS
+    ):
         '''
-        reorganize data with a namespace if necessary
+        dump to several formats : data are normalized once, each format is
+        rendered in memory then files are written concurrently,
+        get the files in formats order, see changed for the written ones
         '''
 
-        to_dump = infos
-        if namespace is not None and namespace != '':
-            namespaces = namespace.split('.')
-            namespaces.reverse()
-            for name in namespaces:
-                to_dump = {name: to_dump}
+        if 'all' in fileformats:
+            fileformats = FORMATS
+
+        target = tools.create_parent_dirs(target, cwd)
+        normalized = NormalizedData(data)
+
+        renders = []
+        for fileformat in fileformats:
+            extension = EXTENSIONS.get(fileformat, 'json')
+            path = '{}.{}'.format(target, extension)
+            if any(path == rendered[1] for rendered in renders):
+                continue
+
+            start = default_timer()
+            content = self.__render(
+                normalized, extension, namespace, csv_delimiter, csv_quote,
+                csv_eol
+            )
+            renders.append(
+                (fileformat, path, content, default_timer() - start)
+            )
+
+        jobs = [
+            (path, content, self.skip_unchanged)
+            for _, path, content, _ in renders
+        ]
+        if len(jobs) > 1 and workers > 1:
+            from multiprocessing.pool import ThreadPool
+
+            pool = ThreadPool(min(workers, len(jobs)))
+            try:
+                writes = pool.map(lambda job: write_file(*job), jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            writes = [write_file(*job) for job in jobs]
+
+        self.changed = []
+        for (fileformat, path, _, duration), (write_duration, changed) in zip(
+            renders, writes
+        ):
+            self.timings.add(KIND_DUMP, fileformat, duration + write_duration)
+            if changed:
+                self.changed.append(path)
 
-        return to_dump
+        return [path for _, path, _, _ in renders]
 
-    def __dump_sh(self, data, target):
+    def __render(
+        self, normalized, extension, namespace, csv_delimiter, csv_quote,
+        csv_eol
+    ):
         '''
-        dump to Shell variables file
+        render data in the format of a file extension
         '''
 
-        target = target + '.sh'
+        if extension == 'yml':
+            return self.__render_yaml(normalized, namespace)
+        elif extension == 'xml':
+            return self.__render_xml(normalized, namespace)
+        elif extension == 'ini':
+            return self.__render_ini(normalized, namespace)
+        elif extension == 'sh':
+            return self.__render_sh(normalized)
+        elif extension == 'csv':
+            return self.__render_csv(
+                normalized,
+                delimiter=csv_delimiter,
+                quotechar=csv_quote,
+                eol=csv_eol
+            )
+        else:
+            return self.__render_json(normalized, namespace)
 
-        with open(target, 'w', encoding='utf-8') as fpt:
-            for key, val in data.items():
-                fpt.write("{}=\"{}\"\n".format(key, tools.flatten(val)))
+    def __render_sh(self, normalized):
+        '''
+        render Shell variables
+        '''
 
-        return target
+        return ''.join(
+            "{}=\"{}\"\n".format(key, val) for key, val in normalized.flat
+        )
 
-    def __dump_csv(self, data, target, delimiter=',', quotechar='"', eol='lf'):
+    def __render_csv(self, normalized, delimiter=',', quotechar='"',
+                     eol='lf'):
         '''
-        dump to CSV file (comma separated values)
+        render CSV (comma separated values)
         '''
 
-        target = target + '.csv'
-
         eol = '\r\n' if eol == 'crlf' or eol == '\r\n' else '\n'
 
-        with open(target, 'w', encoding='utf-8') as fpt:
-            writer = csv.writer(
-                fpt,
-                delimiter=delimiter,
-                lineterminator=eol,
-                quotechar=quotechar,
-                quoting=csv.QUOTE_MINIMAL
-            )
-            for key, val in data.items():
-                writer.writerow((key, tools.flatten(val)))
+        from backports import csv
+
+        buf = io.StringIO()
+        writer = csv.writer(
+            buf,
+            delimiter=delimiter,
+            lineterminator=eol,
+            quotechar=quotechar,
+            quoting=csv.QUOTE_MINIMAL
+        )
+        writer.writerows(normalized.flat)
 
-        return target
+        return buf.getvalue()
 
-    def __dump_ini(self, data, target, namespace=None):
+    def __render_ini(self, normalized, namespace=None):
         '''
-        dump to INI file
+        render INI
         '''
 
-        target = target + '.ini'
-
         if namespace is None or namespace == '':
             namespace = 'app_version'
 
+        from backports import configparser
+
         ini = configparser.RawConfigParser()
         ini.add_section(namespace)
 
-        for key, val in data.items():
-            ini.set(namespace, key, tools.flatten(val))
+        for key, val in normalized.flat:
+            ini.set(namespace, key, val)
 
-        with open(target, 'w', encoding='utf-8') as fpt:
-            ini.write(fpt)
+        buf = io.StringIO()
+        ini.write(buf)
 
-        return target
+        return buf.getvalue()
 
-    def __dump_xml(self, data, target, namespace=None):
+    def __render_xml(self, normalized, namespace=None):
         '''
-        dump to XML file
+        render XML
         '''
 
-        target = target + '.xml'
         if namespace is None or namespace == '':
             namespace = 'app_version'
 
-        with open(target, 'w', encoding='utf-8') as fpt:
-            xml = xmltodict.unparse(
-                self.__create_infos_to_dump(data, namespace),
-                encoding='utf-8',
-                pretty=True,
-                indent='  '
-            )
+        import xmltodict
 
-            fpt.write(xml)
+        return xmltodict.unparse(
+            normalized.nested(namespace),
+            encoding='utf-8',
+            pretty=True,
+            indent='  '
+        )
 
-            return target
-
-    def __dump_json(self, data, target, namespace=None):
+    def __render_json(self, normalized, namespace=None):
         '''
-        dump to JSON file
+        render JSON
         '''
 
-        target = target + '.json'
-
-        data1 = self.__create_infos_to_dump(data, namespace)
-
-        with open(target, 'w', encoding='utf-8') as fpt:
-            fpt.write(json.dumps(data1, indent=2, ensure_ascii=False))
-
-        return target
+        return json.dumps(
+            normalized.nested(namespace), indent=2, ensure_ascii=False
+        )
 
-    def __dump_yaml(self, data, target, namespace=None):
+    def __render_yaml(self, normalized, namespace=None):
         '''
-        dump to YAML file
+        render YAML
         '''
 
-        target = target + '.yml'
+        if not normalized.data:
+            return "---\n"
 
-        with open(target, 'w', encoding='utf-8') as fpt:
-            if not data:
-                fpt.write("---\n")
-            else:
-                yaml.safe_dump(
-                    self.__create_infos_to_dump(data, namespace),
-                    fpt,
-                    default_flow_style=False,
-                    explicit_start=True,
-                    allow_unicode=True,
-                    # force quoting
-                    # to prevent abbrev_commit to be read as a float
-                    default_style='\''
-                )
+        import yaml
 
-        return target
+        return yaml.safe_dump(
+            normalized.nested(namespace),
+            default_flow_style=False,
+            explicit_start=True,
+            allow_unicode=True,
+            # force quoting
+            # to prevent abbrev_commit to be read as a float
+            default_style='\''
+        )
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+'''
+    Commit informations collection for one or many repositories
+'''
+from __future__ import unicode_literals
+
+from git_app_version.githandler import BACKEND_GITPYTHON, GitHandler
+from git_app_version.githandler.errors import (
+    not_repository_errors, unknown_revision_errors
+)
+from git_app_version.helper.timing import Timings
+
+NOT_GIT_REPOSITORY = u'The directory \'{}\' is not a git repository.'
+
+
+def collect(
+    repository,
+    commits=None,
+    cache=False,
+    cache_size=256,
+    fields=None,
+    timings=None,
+    time_budget=None,
+    backend=BACKEND_GITPYTHON,
+    deploy_date=None
+):
+    '''
+    get commit informations of a repository
+
+    return a list of (commit, data) tuples,
+    data is None when the commit can not be resolved,
+    fields is an optional list of fields to get,
+    timings an optional helper.timing.Timings,
+    time_budget optional seconds allowed per commit,
+    backend a GitHandler backend name,
+    deploy_date see GitHandler.get_deploy_date()
+    '''
+
+    return collect_infos(
+        GitHandler(
+            repository,
+            cache=cache,
+            cache_size=cache_size,
+            timings=timings,
+            backend=backend
+        ),
+        commits,
+        fields,
+        time_budget,
+        deploy_date
+    )
+
+
+def collect_infos(
+    vcs, commits=None, fields=None, time_budget=None, deploy_date=None
+):
+    '''
+    get commit informations with an existing GitHandler,
+    see collect()
+    '''
+
+    commits = list(commits or ['HEAD'])
+    if len(commits) > 1:
+        resolved = vcs.get_commits(commits)
+    else:
+        resolved = [(commit, _resolve(vcs, commit)) for commit in commits]
+
+    return [
+        (
+            commit, None if snapshot is None else
+            vcs.get_infos(
+                commit=snapshot,
+                fields=fields,
+                time_budget=time_budget,
+                deploy_date=deploy_date
+            )
+        )
+        for commit, snapshot in resolved
+    ]
+
+
+def _resolve(vcs, commit):
+    '''
+    get the snapshot of a commit-ish, None when it can not be resolved
+    as get_commits() does
+    '''
+
+    try:
+        return vcs.get_commit(commit)
+    except unknown_revision_errors():
+        return None
+
+
+def _collect_worker(job):
+    '''
+    pool worker : collect a repository and report any failure as a message,
+    job is a (collect() keyword arguments, profile) tuple,
+    timing records are sent back when profiling
+    '''
+
+    kwargs, profile = job
+    repository = kwargs['repository']
+    timings = Timings() if profile else None
+    try:
+        results = collect(timings=timings, **kwargs)
+        error = None
+    except not_repository_errors():
+        results, error = None, NOT_GIT_REPOSITORY.format(repository)
+    except Exception as exc:  # pylint: disable=broad-except
+        # one broken repository must not stop the others
+        results, error = None, u'{}: {}'.format(repository, exc)
+
+    return repository, results, error, timings.records if profile else None
+
+
+def collect_all(
+    repositories,
+    commits=None,
+    cache=False,
+    cache_size=256,
+    processes=None,
+    fields=None,
+    timings=None,
+    time_budget=None,
+    backend=BACKEND_GITPYTHON,
+    deploy_date=None
+):
+    '''
+    collect many repositories in a pool of worker processes
+
+    yield (repository, results, error) tuples in repositories order,
+    results being collect() output or None when error is set,
+    workers timings are added to the optional timings
+    '''
+
+    import multiprocessing
+
+    processes = min(
+        processes or multiprocessing.cpu_count(), len(repositories)
+    )
+    if processes < 1:
+        return
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for repository, results, error, records in pool.imap(
+            _collect_worker,
+            [
+                (
+                    {
+                        'repository': repository,
+                        'commits': commits,
+                        'cache': cache,
+                        'cache_size': cache_size,
+                        'fields': fields,
+                        'time_budget': time_budget,
+                        'backend': backend,
+                        'deploy_date': deploy_date,
+                    }, timings is not None
+                ) for repository in repositories
+            ]
+        ):
+            if records:
+                timings.extend(records)
+            yield repository, results, error
+    finally:
+        pool.close()
+        pool.join()
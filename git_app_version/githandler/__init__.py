@@ -0,0 +1,970 @@
+# -*- coding: utf-8 -*-
+'''
+    Git manipulation
+'''
+from __future__ import unicode_literals
+
+import os
+import re
+import subprocess
+import sys
+
+import pytz
+
+import git_app_version.helper.date as dthelper
+from git_app_version.helper.budget import Budget, BudgetExceeded
+from git_app_version.helper.timing import NULL_TIMINGS
+from git_app_version.githandler.backends import (
+    BACKEND_AUTO, BACKEND_GITPYTHON, BACKEND_NAMES, BACKEND_PYTHON,
+    BACKEND_SUBPROCESS, CACHE_DIRNAME, create_backend
+)
+from git_app_version.githandler.cache import DEFAULT_MAX_ENTRIES, ResultCache
+from git_app_version.githandler.commit import CommitSnapshot
+from git_app_version.githandler.commitgraph import reachable_tips
+from git_app_version.githandler.errors import command_error
+from git_app_version.githandler.shallow import (
+    SOURCE_ABBREV, ShallowResolver, is_shallow
+)
+
+# fields written by default, metadata can not override them
+RESERVED_KEYS = (
+    'abbrev_commit', 'author_date', 'author_email', 'author_name',
+    'author_timestamp', 'branches', 'commit_date', 'commit_timestamp',
+    'committer_email', 'committer_name', 'deploy_date', 'deploy_timestamp',
+    'full_commit', 'message', 'top_branches', 'version'
+)
+
+# fields which need git work besides reading the commit object
+BRANCHES_FIELDS = ('branches', 'top_branches', 'branches_source')
+LOCAL_BRANCHES_FIELDS = ('local_branches', )
+TAGS_FIELDS = ('tags_containing', )
+VERSION_FIELDS = ('version', 'version_source')
+SOURCE_FIELDS = ('branches_source', 'version_source')
+# fields only written when selected,
+# local branches and tags are also only computed when selected
+OPTIONAL_FIELDS = LOCAL_BRANCHES_FIELDS + TAGS_FIELDS + SOURCE_FIELDS
+CACHEABLE_FIELDS = BRANCHES_FIELDS + VERSION_FIELDS + LOCAL_BRANCHES_FIELDS \
+    + TAGS_FIELDS
+# fields which can be selected
+FIELD_NAMES = tuple(
+    sorted(RESERVED_KEYS + OPTIONAL_FIELDS + ('degraded_fields', ))
+)
+
+# references namespaces checked for containment and the fields they give
+NS_REMOTES = 'refs/remotes/'
+NS_HEADS = 'refs/heads/'
+NS_TAGS = 'refs/tags/'
+NAMESPACE_FIELDS = (
+    (NS_REMOTES, BRANCHES_FIELDS),
+    (NS_HEADS, LOCAL_BRANCHES_FIELDS),
+    (NS_TAGS, TAGS_FIELDS),
+)
+
+# deploy dates other than ISO 8601 dates and timestamps
+DEPLOY_DATE_NOW = 'now'
+DEPLOY_DATE_COMMIT = 'commit'
+# default deploy date of reproducible builds,
+# see https://reproducible-builds.org/specs/source-date-epoch/
+SOURCE_DATE_EPOCH = 'SOURCE_DATE_EPOCH'
+
+# describe and containment git commands of get_infos() run concurrently
+# through githandler.aio, the event loop of any thread can wait for
+# subprocesses since Python 3.8
+CONCURRENT_GIT = sys.version_info >= (3, 8)
+
+SOURCE_DESCRIBE = 'describe'
+SOURCE_CONTAINS = 'contains'
+# source of fields degraded because the time budget ran out
+SOURCE_TIMEOUT = 'timeout'
+
+
+class GitHandler(object):
+    '''
+    Git
+    '''
+
+    def __init__(
+        self,
+        path,
+        cache=False,
+        cache_size=DEFAULT_MAX_ENTRIES,
+        timings=None,
+        backend=BACKEND_GITPYTHON,
+        environ=None
+    ):
+        # helper.timing.Timings recording phases and git commands durations
+        self.timings = NULL_TIMINGS if timings is None else timings
+        # backends.Backend name, see backends.create_backend()
+        self.backend = create_backend(path, backend, self.timings)
+        self.git_dir = self.backend.git_dir
+        self.refs = self.backend.refs
+        self.objects = self.backend.objects
+        self.describer = self.backend.describer
+        self._abbrev = False
+        self._shallow = None
+        # environment variables read for SOURCE_DATE_EPOCH and CI variables
+        # of shallow clones, Default is os.environ
+        self._environ = os.environ if environ is None else environ
+
+        self.cache = None
+        if cache:
+            self.cache = ResultCache(
+                os.path.join(self.refs.common_dir, CACHE_DIRNAME, 'results'),
+                max_entries=cache_size
+            )
+
+    @property
+    def environ(self):
+        '''
+        environment variables changing results
+        '''
+
+        return self._environ
+
+    @environ.setter
+    def environ(self, environ):
+        if environ != self._environ:
+            # shallow clone results depend on CI variables
+            self._shallow = None
+        self._environ = environ
+
+    def get_deploy_date(self, snapshot=None, deploy_date=None):
+        '''
+        get the deploy date : deploy_date is 'now', 'commit' for the commit
+        date of snapshot in UTC, an ISO 8601 date or a timestamp,
+        Default is the SOURCE_DATE_EPOCH environment variable when set,
+        else the current date,
+        invalid dates raise ValueError
+        '''
+
+        if deploy_date is None:
+            deploy_date = self.environ.get(SOURCE_DATE_EPOCH) \
+                or DEPLOY_DATE_NOW
+
+        if deploy_date == DEPLOY_DATE_NOW:
+            return dthelper.utcnow()
+
+        if deploy_date == DEPLOY_DATE_COMMIT and snapshot is not None:
+            return snapshot.committed_datetime.astimezone(pytz.utc)
+
+        date = dthelper.datetime_from_string(deploy_date)
+        if date is None:
+            raise ValueError(u'invalid deploy date : {}'.format(deploy_date))
+
+        return date
+
+    def get_commit(self, commit='HEAD'):
+        '''
+        resolve a commit-ish once and return its snapshot
+
+        references and full SHA1 hashes are read in process,
+        other revisions by the backend, see backends.Backend.read_commit(),
+        unknown revisions raise ValueError (BadName with gitpython),
+        an already resolved CommitSnapshot is returned as is
+        '''
+
+        if isinstance(commit, CommitSnapshot):
+            return commit
+
+        hexsha = self.refs.resolve_revision(commit)
+        if hexsha is not None:
+            snapshot = self.objects.read_commit(hexsha)
+            if snapshot is not None:
+                return snapshot
+
+        snapshot = self.backend.read_commit(hexsha or commit)
+        if snapshot is None:
+            raise ValueError(u'unknown revision : {}'.format(commit))
+
+        return snapshot
+
+    @property
+    def repo(self):
+        '''
+        GitPython Repo of the repository,
+        created on first use by other backends than gitpython
+        '''
+
+        return self.backend.repo
+
+    def close(self):
+        '''
+        release backend processes and the commit-graph,
+        pooled cat-file processes are left to other handlers
+        '''
+
+        self.backend.close()
+
+    def _resolve_hexsha(self, commit):
+        '''
+        get the full SHA1 hash of a snapshot, a reference or a full hash,
+        None for other revisions
+        '''
+
+        if isinstance(commit, CommitSnapshot):
+            return commit.hexsha
+
+        return self.refs.resolve_revision(commit)
+
+    def _get_abbrev(self):
+        '''
+        get core.abbrev minimal length, None for git automatic length
+        '''
+
+        if self._abbrev is False:
+            abbrev = self.backend.config_value('core', 'abbrev', 'auto')
+            if isinstance(abbrev, bool) or abbrev in ('no', 'false'):
+                self._abbrev = 40
+            else:
+                try:
+                    self._abbrev = max(4, min(40, int(abbrev)))
+                except ValueError:
+                    self._abbrev = None
+
+        return self._abbrev
+
+    def iter_history(self, revisions=('HEAD', ), fields=None,
+                     time_budget=None, deploy_date=None):
+        '''
+        yield git commit data of every commit listed by
+        `git rev-list <revisions>`, e.g. ['v1.0..HEAD']
+
+        commits are streamed from a single git process and versions
+        share the cached tag index, memory use does not grow with the range,
+        raise GitCommandError for an invalid range,
+        time_budget and deploy_date apply to each commit, see get_infos()
+        '''
+
+        fields = check_fields(fields)
+
+        command = ['git', '--git-dir', self.git_dir, 'rev-list'] + \
+            list(revisions) + ['--']
+        process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        try:
+            while True:
+                # only the time spent waiting for git is recorded
+                with self.timings.command(command[3:]):
+                    line = process.stdout.readline()
+                if not line:
+                    break
+
+                hexsha = line.strip().decode('ascii')
+                if hexsha:
+                    yield self.get_infos(
+                        hexsha,
+                        fields=fields,
+                        time_budget=time_budget,
+                        deploy_date=deploy_date
+                    )
+
+            if process.wait() != 0:
+                raise command_error(
+                    command, process.returncode,
+                    process.stderr.read().decode('utf-8', 'replace')
+                )
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+    def get_commits(self, commits):
+        '''
+        resolve many commit-ishes at once, through one pooled
+        `git cat-file --batch` process unless the backend is in process
+
+        yield (commit-ish, CommitSnapshot) tuples in order,
+        the snapshot is None when the commit-ish can not be resolved
+        '''
+
+        return self.backend.read_commits(commits)
+
+    def shallow_resolver(self):
+        '''
+        get the version and branches resolver of shallow clones,
+        None when the repository is not shallow
+        '''
+
+        if not is_shallow(self.refs.common_dir):
+            self._shallow = None
+        elif self._shallow is None:
+            self._shallow = ShallowResolver(
+                self.refs, self.describer, self.environ
+            )
+
+        return self._shallow
+
+    def shallow_version(self, commit='HEAD'):
+        '''
+        get (version, source) of a commit in a shallow clone,
+        None when the commit can not be resolved
+        '''
+
+        hexsha = self._resolve_hexsha(commit)
+        if hexsha is None:
+            return None
+
+        return self.shallow_resolver().version(
+            hexsha, self.objects.abbrev(hexsha, self._get_abbrev())
+        )
+
+    def shallow_branches(self, commit='HEAD'):
+        '''
+        get (remote branches, source) of a commit in a shallow clone,
+        None when the commit can not be resolved
+        '''
+
+        hexsha = self._resolve_hexsha(commit)
+        if hexsha is None:
+            return None
+
+        return self.shallow_resolver().branches(hexsha)
+
+    def describe_in_process(self, commit='HEAD', budget=None):
+        '''
+        get `git describe --tag --always` result from the cached tag index,
+        None when it has to be left to git
+        '''
+
+        hexsha = self._resolve_hexsha(commit)
+        if hexsha is None:
+            return None
+
+        return self.describer.describe(hexsha, self._get_abbrev(), budget)
+
+    def get_version(self, commit='HEAD', default='', budget=None):
+        '''
+        get human readable version
+        result of `git describe --tag --always`
+
+        computed in process from the cached tag index when possible,
+        shallow clones never walk history, see shallow_version()
+
+        budget is an optional helper.budget.Budget,
+        BudgetExceeded is raised when it runs out
+        '''
+
+        if self.shallow_resolver() is not None:
+            version = self.shallow_version(commit)
+            return version[0] if version is not None else default
+
+        version = self.describe_in_process(commit, budget)
+        if version is None:
+            version = self._git_version(commit, budget)
+
+        if not version:
+            version = default
+
+        return version
+
+    def get_commit_graph(self):
+        '''
+        get the repository commit-graph, None if there is none
+        '''
+
+        return self.backend.commit_graph()
+
+    def containment_tips(self, namespaces, graph=None):
+        '''
+        get {reference full name: commit SHA1 hash} of the non symbolic
+        references of namespaces, e.g. ['refs/remotes/', 'refs/tags/']
+        '''
+
+        return self.backend.ref_tips(namespaces, graph)
+
+    def containing_in_process(self, commit='HEAD', namespaces=(NS_REMOTES, ),
+                              budget=None):
+        '''
+        get references of namespaces which commit belong
+        from the commit-graph, in one walk from all the references,
+        None when there is no commit-graph, see get_containing()
+        '''
+
+        hexsha = self._resolve_hexsha(commit)
+        graph = self.get_commit_graph() if hexsha is not None else None
+        if graph is None:
+            return None
+
+        names = reachable_tips(
+            graph, self.objects, hexsha,
+            self.containment_tips(namespaces, graph), budget
+        )
+        if names is None:
+            return None
+
+        return split_namespaces(names, namespaces)
+
+    def branches_in_process(self, commit='HEAD', budget=None):
+        '''
+        get remote branches which commit belong from the commit-graph,
+        None when there is no commit-graph
+        '''
+
+        containing = self.containing_in_process(commit, (NS_REMOTES, ), budget)
+
+        return None if containing is None else containing[NS_REMOTES]
+
+    def parse_containing(self, raw, namespaces):
+        '''
+        parse `git for-each-ref --format=%(refname)` output
+        to {namespace: short reference names}, without symbolic references
+        '''
+
+        return split_namespaces(
+            [
+                name for name in raw.splitlines()
+                if name and not self.refs.is_symbolic(name)
+            ], namespaces
+        )
+
+    def shallow_containing(self, commit='HEAD', namespaces=(NS_REMOTES, )):
+        '''
+        get references of namespaces which commit belong in a shallow clone
+        without walking history : remote branches from shallow_branches(),
+        local branches and tags pointing at the commit
+        '''
+
+        hexsha = self._resolve_hexsha(commit)
+        names = [
+            name for name, target in self.containment_tips(
+                [prefix for prefix in namespaces if prefix != NS_REMOTES]
+            ).items() if target == hexsha
+        ]
+        containing = split_namespaces(sorted(names), namespaces)
+
+        if NS_REMOTES in namespaces:
+            branches = self.shallow_branches(commit)
+            containing[NS_REMOTES] = branches[0] if branches is not None \
+                else []
+
+        return containing
+
+    def get_containing(self, commit='HEAD', namespaces=(NS_REMOTES, ),
+                       budget=None):
+        '''
+        get {namespace: short reference names} of the references
+        which commit belong, e.g. {'refs/remotes/': ['origin/master'],
+        'refs/tags/': ['v1.0']}, all namespaces are checked at once
+
+        computed in process from the commit-graph when there is one,
+        or by the backend, e.g. one `git for-each-ref --contains=<commit>`,
+        shallow clones never walk history, see shallow_containing()
+
+        budget is an optional helper.budget.Budget,
+        BudgetExceeded is raised when it runs out
+        '''
+
+        if self.shallow_resolver() is not None:
+            return self.shallow_containing(commit, namespaces)
+
+        containing = self.containing_in_process(commit, namespaces, budget)
+        if containing is not None:
+            return containing
+
+        return self._git_containing(commit, namespaces, budget)
+
+    def _git_version(self, commit='HEAD', budget=None):
+        '''
+        get `git describe --tag --always` result from the backend
+        '''
+
+        return self.backend.describe(_rev(commit), self._get_abbrev(), budget)
+
+    def _git_containing(self, commit='HEAD', namespaces=(NS_REMOTES, ),
+                        budget=None):
+        '''
+        get references of namespaces which commit belong from the backend
+        '''
+
+        return self.parse_containing(
+            '\n'.join(
+                self.backend.containing(_rev(commit), namespaces, budget)
+            ), namespaces
+        )
+
+    def get_branches(self, commit='HEAD', budget=None):
+        '''
+        get remote branches which commit belong
+        result of `git branch --remote --no-color --contains=<commit>`
+
+        computed in process from the commit-graph when there is one,
+        shallow clones never walk history, see shallow_branches()
+
+        budget is an optional helper.budget.Budget,
+        BudgetExceeded is raised when it runs out
+        '''
+
+        if self.shallow_resolver() is not None:
+            branches = self.shallow_branches(commit)
+            return branches[0] if branches is not None else []
+
+        return self.get_containing(commit, (NS_REMOTES, ), budget)[NS_REMOTES]
+
+    def get_remote_refs(self):
+        '''
+        get all remote branches with their target full SHA1 hash
+        read in one pass from packed-refs and loose refs
+        '''
+
+        return self.refs.remote_branches()
+
+    def get_top_branches(self, branches, abbrev_commit=None, full_commit=None):
+        '''
+        get remote branches which commit belong and is the branch HEAD
+
+        remote branch heads are read once and compared to full_commit,
+        or only to the abbrev_commit prefix when full_commit is not given
+        '''
+
+        remote_refs = self.get_remote_refs()
+
+        top_branch = []
+
+        for branch in branches:
+            hexsha = remote_refs.get(branch, '')
+            if full_commit is not None:
+                match = hexsha == full_commit
+            else:
+                match = bool(abbrev_commit) and hexsha.startswith(
+                    abbrev_commit
+                )
+
+            if match:
+                top_branch.append(branch)
+
+        return top_branch
+
+    def remove_remote_prefix(self, branches):
+        '''
+        remove git remote prefix from branch name
+        e.g.: origin/master = master
+        '''
+        regex_remote = re.compile(r'^[^/]+/')  # remove git remote prefix
+
+        clean_branches = []
+        for branch in branches:
+            clean_branches.append(regex_remote.sub('', branch))
+
+        return clean_branches
+
+    def get_committer_name(self, commit='HEAD'):
+        '''
+        get git committer name
+        '''
+
+        return self.get_commit(commit).committer_name
+
+    def get_committer_email(self, commit='HEAD'):
+        '''
+        get git committer email
+        '''
+
+        return self.get_commit(commit).committer_email
+
+    def get_author_name(self, commit='HEAD'):
+        '''
+        get git author name
+        '''
+
+        return self.get_commit(commit).author_name
+
+    def get_author_email(self, commit='HEAD'):
+        '''
+        get git author email
+        '''
+
+        return self.get_commit(commit).author_email
+
+    def get_commit_date(self, commit='HEAD'):
+        '''
+        get git commit date
+        '''
+
+        return self.get_commit(commit).committed_datetime
+
+    def get_author_date(self, commit='HEAD'):
+        '''
+        get git authoring date
+        '''
+
+        return self.get_commit(commit).authored_datetime
+
+    def get_full_commit(self, commit='HEAD'):
+        '''
+        get git commit full SHA1 hash
+        '''
+
+        return self.get_commit(commit).hexsha
+
+    def get_abbrev_commit(self, commit='HEAD'):
+        '''
+        get git commit shorten SHA1 hash
+        '''
+
+        return self.get_commit(commit).abbrev_commit
+
+    def get_message(self, commit='HEAD'):
+        '''
+        get git commit message
+        '''
+
+        return self.get_commit(commit).message
+
+    def get_cached_infos(self, snapshot):
+        '''
+        get (cache key, cached version, branches and top_branches)
+        of a commit, both are None when the results cache is disabled
+
+        cache entries are keyed by the commit full SHA1 hash
+        and the state of all references,
+        shallow clone results depend on the environment and are not cached
+        '''
+
+        if self.cache is None or self.shallow_resolver() is not None:
+            return None, None
+
+        key = ResultCache.make_key(
+            snapshot.hexsha, self.refs.fingerprint('refs/')
+        )
+
+        return key, self.cache.get(key)
+
+    def build_cached_infos(
+        self,
+        snapshot,
+        branches=None,
+        version=None,
+        key=None,
+        cached=None,
+        degraded=(),
+        local_branches=None,
+        tags_containing=None
+    ):
+        '''
+        get version, branches and top_branches of a commit
+        from its remote branches and its raw version,
+        and store them in the results cache when a key is given
+
+        branches, version, local_branches or tags_containing can be None
+        when they were not computed,
+        previously cached informations are kept for them,
+        degraded fields get a 'timeout' source and are never cached
+        '''
+
+        infos = dict(cached or {})
+        shallow = self.shallow_resolver()
+
+        if local_branches is not None:
+            infos['local_branches'] = local_branches
+        if tags_containing is not None:
+            infos['tags_containing'] = tags_containing
+
+        if branches is not None:
+            with self.timings.phase('top branches'):
+                top_branch = self.get_top_branches(
+                    branches=branches, full_commit=snapshot.hexsha
+                )
+            infos['branches'] = self.remove_remote_prefix(branches)
+            infos['top_branches'] = self.remove_remote_prefix(top_branch)
+            infos['branches_source'] = SOURCE_CONTAINS
+            if shallow is not None:
+                infos['branches_source'] = shallow.branches(snapshot.hexsha)[1]
+
+        if version is not None:
+            infos['version'] = version or snapshot.abbrev_commit
+            infos['version_source'] = SOURCE_DESCRIBE if version \
+                else SOURCE_ABBREV
+            if shallow is not None:
+                infos['version_source'] = self.shallow_version(snapshot)[1]
+
+        for field in degraded:
+            if field.endswith('_source'):
+                infos[field] = SOURCE_TIMEOUT
+
+        if key is not None and not degraded:
+            self.cache.set(key, infos)
+
+        return infos
+
+    def format_infos(self, snapshot, cached_infos, deploy_date, fields=None):
+        '''
+        get git commit data from a snapshot,
+        the cacheable informations and the deploy date
+
+        only the selected fields are returned, all of them by default
+        '''
+
+        commit_date = snapshot.committed_datetime
+        author_date = snapshot.authored_datetime
+
+        infos = {
+            'abbrev_commit': snapshot.abbrev_commit,
+            'full_commit': snapshot.hexsha,
+            'message': snapshot.message,
+            'author_name': snapshot.author_name,
+            'author_email': snapshot.author_email,
+            'committer_name': snapshot.committer_name,
+            'committer_email': snapshot.committer_email,
+            'commit_date': dthelper.iso8601_from_datetime(commit_date),
+            'commit_timestamp': dthelper.timestamp_from_datetime(commit_date),
+            'author_date': dthelper.iso8601_from_datetime(author_date),
+            'author_timestamp': dthelper.timestamp_from_datetime(author_date),
+            'deploy_date': dthelper.iso8601_from_datetime(deploy_date),
+            'deploy_timestamp': dthelper.timestamp_from_datetime(deploy_date),
+        }
+        infos.update(cached_infos)
+
+        if fields is None:
+            return dict(
+                (field, value) for field, value in infos.items()
+                if field not in OPTIONAL_FIELDS
+            )
+
+        return dict((field, infos[field]) for field in fields)
+
+    def run_queries(
+        self, snapshot, namespaces=(), with_version=False, budget=None,
+        degraded=None
+    ):
+        '''
+        get ({namespace: short reference names}, version) of a commit
+        for get_infos(), see get_containing() and get_version()
+
+        a query cut by the time budget gets an empty result
+        and its fields are added to the degraded list,
+        when both queries are left to git after the in process ones,
+        their git commands run concurrently, see aio.run_git_queries()
+        '''
+
+        degraded = [] if degraded is None else degraded
+        timings = self.timings
+        empty = dict((prefix, []) for prefix in namespaces)
+        namespaces_degraded = namespaces_fields(namespaces)
+        version = containing = None
+
+        if namespaces and with_version and CONCURRENT_GIT \
+                and not self.backend.in_process \
+                and self.shallow_resolver() is None:
+            with timings.phase('describe'):
+                version = _within_budget(
+                    lambda: self.describe_in_process(snapshot, budget), '',
+                    degraded, VERSION_FIELDS
+                )
+            with timings.phase('branch containment'):
+                containing = _within_budget(
+                    lambda: self.containing_in_process(
+                        snapshot, namespaces, budget
+                    ), empty, degraded, namespaces_degraded
+                )
+            if version is None and containing is None:
+                from git_app_version.githandler import aio
+
+                queries = aio.run_git_queries(
+                    self, snapshot, namespaces, budget, degraded
+                )
+                if queries is not None:
+                    return queries
+            # the in process answer of one query is kept
+            query_version = self._git_version
+            query_containing = self._git_containing
+        else:
+            query_version = self.get_version
+            query_containing = self.get_containing
+
+        if with_version and version is None:
+            with timings.phase('describe'):
+                version = _within_budget(
+                    lambda: query_version(snapshot, budget=budget), '',
+                    degraded, VERSION_FIELDS
+                )
+        if namespaces and containing is None:
+            with timings.phase('branch containment'):
+                containing = _within_budget(
+                    lambda: query_containing(
+                        snapshot, namespaces, budget=budget
+                    ), empty, degraded, namespaces_degraded
+                )
+
+        return containing or {}, version
+
+    def get_infos(
+        self, commit='HEAD', fields=None, time_budget=None, deploy_date=None
+    ):
+        '''
+        get git commit data
+
+        commit can be a commit-ish or an already resolved CommitSnapshot,
+        it is resolved only once,
+        deploy date is never cached, see get_deploy_date() for deploy_date
+
+        fields is an optional list of fields to get,
+        branches, top_branches and version are only computed when selected,
+        local_branches and tags_containing only when explicitly selected,
+        all references containing the commit are found in one pass
+
+        time_budget is an optional number of seconds for the whole call,
+        git commands still running when it runs out are killed,
+        version falls back to the abbreviated commit and branches to
+        an empty list, their source is 'timeout' and they are listed in
+        degraded_fields, which is added when a time budget is given
+        '''
+
+        fields = check_fields(fields)
+        timings = self.timings
+        budget = Budget(time_budget)
+        degraded = []
+
+        with timings.phase('resolve commit'):
+            snapshot = self.get_commit(commit)
+        deploy_date = self.get_deploy_date(snapshot, deploy_date)
+
+        with timings.phase('cache lookup'):
+            key, cached_infos = self.get_cached_infos(snapshot)
+
+        missing = missing_fields(cached_infos, fields)
+        if missing:
+            namespaces, with_version = missing_queries(missing)
+            containing, version = self.run_queries(
+                snapshot, namespaces, with_version, budget, degraded
+            )
+            cached_infos = self.build_cached_infos(
+                snapshot,
+                branches=containing.get(NS_REMOTES),
+                version=version,
+                key=key,
+                cached=cached_infos,
+                degraded=degraded,
+                local_branches=containing.get(NS_HEADS),
+                tags_containing=containing.get(NS_TAGS)
+            )
+
+        cached_infos, fields = add_degraded_fields(
+            cached_infos, degraded, fields, time_budget
+        )
+        with timings.phase('format'):
+            return self.format_infos(
+                snapshot, cached_infos or {}, deploy_date, fields
+            )
+
+
+def missing_queries(missing):
+    '''
+    check which queries are needed to get the missing fields :
+    (references namespaces to check for containment, version)
+    '''
+
+    return (
+        tuple(
+            prefix for prefix, group in NAMESPACE_FIELDS
+            if any(field in missing for field in group)
+        ),
+        any(field in missing for field in VERSION_FIELDS),
+    )
+
+
+def namespaces_fields(namespaces):
+    '''
+    get the fields given by references namespaces
+    '''
+
+    return tuple(
+        field for prefix, group in NAMESPACE_FIELDS if prefix in namespaces
+        for field in group
+    )
+
+
+def split_namespaces(names, namespaces):
+    '''
+    split reference full names to {namespace: short names}
+    '''
+
+    containing = dict((prefix, []) for prefix in namespaces)
+    for name in names:
+        for prefix in namespaces:
+            if name.startswith(prefix):
+                containing[prefix].append(name[len(prefix):])
+                break
+
+    return containing
+
+
+def add_degraded_fields(cached_infos, degraded, fields, time_budget=None):
+    '''
+    get (cached_infos, fields) with the selected degraded fields list,
+    added when there is a time budget or when it is selected
+    '''
+
+    if time_budget is None and 'degraded_fields' not in (fields or ()):
+        return cached_infos, fields
+
+    cached_infos = dict(cached_infos or {}, degraded_fields=[
+        field for field in degraded
+        if (
+            field not in OPTIONAL_FIELDS if fields is None
+            else field in fields
+        )
+    ])
+    if fields is not None and 'degraded_fields' not in fields:
+        fields += ('degraded_fields', )
+
+    return cached_infos, fields
+
+
+def check_fields(fields):
+    '''
+    check a list of selected fields,
+    return None when all fields are selected
+    '''
+
+    if fields is None:
+        return None
+
+    fields = tuple(fields)
+    unknown = [field for field in fields if field not in FIELD_NAMES]
+    if unknown:
+        raise ValueError(u'unknown field(s) : {}'.format(', '.join(unknown)))
+
+    return fields
+
+
+def missing_fields(cached_infos, fields=None):
+    '''
+    get the cacheable fields which are selected but not yet cached,
+    optional fields are only selected explicitly
+    '''
+
+    return [
+        field for field in CACHEABLE_FIELDS
+        if (
+            field not in OPTIONAL_FIELDS if fields is None
+            else field in fields
+        ) and field not in (cached_infos or {})
+    ]
+
+
+def _within_budget(query, fallback, degraded, fields):
+    '''
+    get a query result, or fallback when the time budget ran out,
+    adding fields to the degraded ones
+    '''
+
+    try:
+        return query()
+    except BudgetExceeded:
+        degraded.extend(fields)
+        return fallback
+
+
+def _rev(commit):
+    '''
+    get a revision usable by git commands from a commit-ish or a snapshot
+    '''
+
+    if isinstance(commit, CommitSnapshot):
+        return commit.hexsha
+
+    return commit
+
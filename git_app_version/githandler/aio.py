@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+'''
+    Asynchronous Git manipulation (Python >= 3.5)
+
+    independent git queries are run concurrently
+'''
+import asyncio
+import functools
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+from git_app_version.githandler import (
+    NS_HEADS, NS_REMOTES, NS_TAGS, VERSION_FIELDS, GitHandler, _rev,
+    add_degraded_fields, check_fields, missing_fields, missing_queries,
+    namespaces_fields
+)
+from git_app_version.helper.budget import Budget, BudgetExceeded
+
+
+class AsyncGitHandler(object):
+    '''
+    asyncio Git commit informations collector
+
+    in process fast paths of GitHandler are used first,
+    remaining git commands are run concurrently as subprocesses,
+    unless the GitHandler backend is in process
+
+    every GitHandler call runs in a thread of its own, one at a time :
+    the event loop is never blocked by file reads or history walks
+    and the GitHandler is never used by two threads at once
+    '''
+
+    def __init__(self, path=None, handler=None, **kwargs):
+        # an existing GitHandler is left open by close()
+        self._own_handler = handler is None
+        self.handler = GitHandler(path, **kwargs) if handler is None \
+            else handler
+        self._executor = None
+
+    def close(self):
+        '''
+        stop the GitHandler thread and release the GitHandler
+        when it was created by this instance
+        '''
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._own_handler:
+            self.handler.close()
+
+    def _blocking(self, func, *args, **kwargs):
+        '''
+        run a GitHandler call in the GitHandler thread,
+        get an awaitable of its result
+        '''
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(1)
+
+        return _running_loop().run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def _git(self, *args, budget=None):
+        '''
+        run a git command, get (return code, standard output)
+
+        the command is killed when the optional helper.budget.Budget
+        runs out and BudgetExceeded is raised
+        '''
+
+        if budget is not None:
+            budget.check()
+
+        with self.handler.timings.command(('git', ) + args):
+            return await self._run_git(*args, budget=budget)
+
+    async def _run_git(self, *args, budget=None):
+        '''
+        run a git subprocess, in its own process group when
+        it may have to be killed with its children
+        '''
+
+        process = await asyncio.create_subprocess_exec(
+            'git',
+            '--git-dir',
+            self.handler.git_dir,
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=budget is not None
+            and budget.timeout is not None
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(
+                process.communicate(),
+                None if budget is None else budget.remaining()
+            )
+        except asyncio.TimeoutError:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            await process.wait()
+            raise BudgetExceeded(
+                u'time budget of {}s exceeded'.format(budget.timeout)
+            )
+
+        return process.returncode, stdout.decode('utf-8', 'replace')
+
+    async def get_version(self, commit='HEAD', default='', budget=None):
+        '''
+        get human readable version
+        result of `git describe --tag --always`
+        '''
+
+        handler = self.handler
+        if handler.backend.in_process \
+                or await self._blocking(handler.shallow_resolver) is not None:
+            return await self._blocking(
+                handler.get_version, commit, default, budget
+            )
+
+        version = await self._blocking(
+            handler.describe_in_process, commit, budget
+        )
+        if version is None:
+            version = await self._git_version(commit, budget)
+
+        return version or default
+
+    async def get_containing(
+        self, commit='HEAD', namespaces=(NS_REMOTES, ), budget=None
+    ):
+        '''
+        get {namespace: short reference names} of the references
+        which commit belong, see GitHandler.get_containing()
+        '''
+
+        if await self._blocking(self.handler.shallow_resolver) is not None:
+            return await self._blocking(
+                self.handler.shallow_containing, commit, namespaces
+            )
+
+        if self.handler.backend.in_process:
+            return await self._blocking(
+                self.handler.get_containing, commit, namespaces, budget
+            )
+
+        containing = await self._blocking(
+            self.handler.containing_in_process, commit, namespaces, budget
+        )
+        if containing is not None:
+            return containing
+
+        return await self._git_containing(commit, namespaces, budget)
+
+    async def _git_version(self, commit='HEAD', budget=None):
+        '''
+        get `git describe --tag --always` result from git
+        '''
+
+        returncode, stdout = await self._git(
+            'describe', '--tag', '--always', _rev(commit), budget=budget
+        )
+
+        return stdout.strip() if returncode == 0 else ''
+
+    async def _git_containing(
+        self, commit='HEAD', namespaces=(NS_REMOTES, ), budget=None
+    ):
+        '''
+        get references of namespaces which commit belong from
+        `git for-each-ref --contains=<commit>`
+        '''
+
+        returncode, stdout = await self._git(
+            'for-each-ref', '--format=%(refname)',
+            '--contains=' + _rev(commit), *namespaces, budget=budget
+        )
+        if returncode != 0:
+            return dict((prefix, []) for prefix in namespaces)
+
+        return await self._blocking(
+            self.handler.parse_containing, stdout, namespaces
+        )
+
+    async def git_queries(
+        self, snapshot, namespaces=(NS_REMOTES, ), budget=None, degraded=None
+    ):
+        '''
+        get (containing, version) of a commit from git commands
+        run concurrently, see GitHandler.run_queries()
+        '''
+
+        degraded = [] if degraded is None else degraded
+        timings = self.handler.timings
+
+        containing, version = await asyncio.gather(
+            _within_budget(
+                _timed(
+                    timings, 'branch containment',
+                    self._git_containing(snapshot, namespaces, budget)
+                ),
+                dict((prefix, []) for prefix in namespaces),
+                degraded, namespaces_fields(namespaces)
+            ),
+            _within_budget(
+                _timed(
+                    timings, 'describe', self._git_version(snapshot, budget)
+                ), '', degraded, VERSION_FIELDS
+            )
+        )
+
+        return containing, version
+
+    async def get_branches(self, commit='HEAD', budget=None):
+        '''
+        get remote branches which commit belong
+        result of `git branch --remote --no-color --contains=<commit>`
+        '''
+
+        containing = await self.get_containing(commit, (NS_REMOTES, ), budget)
+
+        return containing[NS_REMOTES]
+
+    async def get_infos(
+        self, commit='HEAD', fields=None, time_budget=None, deploy_date=None
+    ):
+        '''
+        get git commit data, running describe
+        and branch containment concurrently
+
+        only the selected fields are computed, all of them by default,
+        see GitHandler.get_infos() for the time budget and deploy date
+        '''
+
+        handler = self.handler
+        fields = check_fields(fields)
+        budget = Budget(time_budget)
+        degraded = []
+        snapshot = await self._blocking(handler.get_commit, commit)
+        deploy_date = await self._blocking(
+            handler.get_deploy_date, snapshot, deploy_date
+        )
+
+        key, cached_infos = await self._blocking(
+            handler.get_cached_infos, snapshot
+        )
+        missing = missing_fields(cached_infos, fields)
+        if missing:
+            namespaces, with_version = missing_queries(missing)
+            containing, version = await asyncio.gather(
+                _within_budget(
+                    self.get_containing(snapshot, namespaces, budget),
+                    dict((prefix, []) for prefix in namespaces),
+                    degraded, namespaces_fields(namespaces)
+                ) if namespaces else _none(),
+                _within_budget(
+                    self.get_version(snapshot, budget=budget), '',
+                    degraded, VERSION_FIELDS
+                ) if with_version else _none()
+            )
+            containing = containing or {}
+            cached_infos = await self._blocking(
+                handler.build_cached_infos,
+                snapshot,
+                branches=containing.get(NS_REMOTES),
+                version=version,
+                key=key,
+                cached=cached_infos,
+                degraded=degraded,
+                local_branches=containing.get(NS_HEADS),
+                tags_containing=containing.get(NS_TAGS)
+            )
+
+        cached_infos, fields = add_degraded_fields(
+            cached_infos, degraded, fields, time_budget
+        )
+
+        return await self._blocking(
+            handler.format_infos, snapshot, cached_infos or {}, deploy_date,
+            fields
+        )
+
+
+def get_infos(
+    path, commit='HEAD', fields=None, time_budget=None, deploy_date=None,
+    **kwargs
+):
+    '''
+    synchronous wrapper : get all git commit data with AsyncGitHandler
+    '''
+
+    handler = AsyncGitHandler(path, **kwargs)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            handler.get_infos(commit, fields, time_budget, deploy_date)
+        )
+    finally:
+        loop.close()
+        handler.close()
+
+
+def run_git_queries(
+    handler, snapshot, namespaces=(NS_REMOTES, ), budget=None, degraded=None
+):
+    '''
+    synchronous wrapper : get (containing, version) of a commit
+    from concurrent git commands with a GitHandler,
+    None when an event loop already runs in this thread
+
+    needs Python >= 3.8, see githandler.CONCURRENT_GIT
+    '''
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        return None
+
+    async_handler = AsyncGitHandler(handler=handler)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            async_handler.git_queries(snapshot, namespaces, budget, degraded)
+        )
+    finally:
+        loop.close()
+        async_handler.close()
+
+
+async def _timed(timings, phase, coroutine):
+    '''
+    get a coroutine result, recording its duration as a phase
+    '''
+
+    with timings.phase(phase):
+        return await coroutine
+
+
+async def _within_budget(coroutine, fallback, degraded, fields):
+    '''
+    get a query result, or fallback when the time budget ran out,
+    adding fields to the degraded ones
+    '''
+
+    try:
+        return await coroutine
+    except BudgetExceeded:
+        degraded.extend(fields)
+        return fallback
+
+
+def _running_loop():
+    '''
+    get the event loop running the current coroutine
+    '''
+
+    if hasattr(asyncio, 'get_running_loop'):
+        return asyncio.get_running_loop()
+
+    return asyncio.get_event_loop()
+
+
+async def _none():
+    '''
+    placeholder for a field which is not selected
+    '''
+
+    return None
+
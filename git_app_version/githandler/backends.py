@@ -0,0 +1,682 @@
+# -*- coding: utf-8 -*-
+'''
+    Git repository access backends
+
+    references, objects, the commit-graph and the describe tag index are
+    always read in process, a backend provides what can not be :
+    complex revisions resolution and commit reading, describe and
+    references containment when no in process fast path applies,
+    and configuration values
+
+    * gitpython : GitPython Repo and git commands, the historical behavior
+    * subprocess : bare git subprocesses, without GitPython Repo
+    * python : pure Python, no git process is ever spawned
+'''
+from __future__ import unicode_literals
+
+import io
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+
+from git_app_version.helper.budget import BudgetExceeded
+from git_app_version.helper.timing import NULL_TIMINGS
+from git_app_version.githandler.catfile import POOL
+from git_app_version.githandler.commit import CommitSnapshot
+from git_app_version.githandler.commitgraph import CommitGraph, reachable_tips
+from git_app_version.githandler.describe import Describer
+from git_app_version.githandler.errors import (
+    command_error, not_repository_errors
+)
+from git_app_version.githandler.objects import ObjectReader
+from git_app_version.githandler.refs import RefDatabase
+
+CACHE_DIRNAME = 'git-app-version'
+
+BACKEND_AUTO = 'auto'
+BACKEND_GITPYTHON = 'gitpython'
+BACKEND_SUBPROCESS = 'subprocess'
+BACKEND_PYTHON = 'python'
+
+# revision suffixes understood by the python backend, see `git help revisions`
+REGEX_REVISION = re.compile(
+    r'^(?P<base>[^~^]+)(?P<suffixes>(?:~\d*|\^\d*|\^\{(?:commit)?\})*)$'
+)
+REGEX_SUFFIX = re.compile(r'\^\{(?:commit)?\}|(~|\^)(\d*)')
+REGEX_ABBREV_SHA1 = re.compile(r'^[0-9a-fA-F]{4,40}$')
+
+
+def find_git_dir(path):
+    '''
+    get the git directory of a working tree or a bare repository path,
+    parent directories are not searched, like GitPython Repo(path)
+
+    raise GitPython NoSuchPathError or InvalidGitRepositoryError
+    '''
+
+    path = os.path.abspath(os.path.expanduser(path))
+    if not os.path.exists(path):
+        raise not_repository_errors()[1](path)
+
+    if is_git_dir(path):
+        return path
+
+    dotgit = os.path.join(path, '.git')
+    if os.path.isfile(dotgit):
+        with io.open(dotgit, 'r', encoding='utf-8') as fpt:
+            content = fpt.read().strip()
+        if content.startswith('gitdir:'):
+            dotgit = os.path.normpath(
+                os.path.join(path, content[len('gitdir:'):].strip())
+            )
+
+    if is_git_dir(dotgit):
+        return dotgit
+
+    raise not_repository_errors()[0](path)
+
+
+def is_git_dir(path):
+    '''
+    check if a directory looks like a git directory
+    '''
+
+    if not os.path.isfile(os.path.join(path, 'HEAD')):
+        return False
+
+    return os.path.isfile(os.path.join(path, 'commondir')) or (
+        os.path.isdir(os.path.join(path, 'objects'))
+        and os.path.isdir(os.path.join(path, 'refs'))
+    )
+
+
+def config_paths(git_dir):
+    '''
+    get git configuration files by increasing priority :
+    system, global and repository ones
+    '''
+
+    paths = []
+    if not os.environ.get('GIT_CONFIG_NOSYSTEM'):
+        paths.append('/etc/gitconfig')
+    xdg_home = os.environ.get('XDG_CONFIG_HOME') or os.path.join(
+        os.path.expanduser('~'), '.config'
+    )
+    paths.append(os.path.join(xdg_home, 'git', 'config'))
+    paths.append(os.path.join(os.path.expanduser('~'), '.gitconfig'))
+    paths.append(os.path.join(RefDatabase(git_dir).common_dir, 'config'))
+
+    return paths
+
+
+def read_config_value(paths, section, option, default=None):
+    '''
+    get the last value of a configuration variable from git configuration
+    files, included files are ignored, True for a variable without value
+    '''
+
+    value = default
+    for path in paths:
+        try:
+            with io.open(path, 'r', encoding='utf-8') as fpt:
+                lines = fpt.read().splitlines()
+        except (IOError, OSError):
+            continue
+
+        current = None
+        for line in lines:
+            line = line.strip()
+            if not line or line[0] in '#;':
+                continue
+            if line.startswith('['):
+                current = line[1:line.find(']')].strip().lower()
+                line = line[line.find(']') + 1:].strip()
+                if not line:
+                    continue
+            if current != section.lower():
+                continue
+
+            name, sep, raw = line.partition('=')
+            if name.strip().lower() != option.lower():
+                continue
+            value = _config_string(raw) if sep else True
+
+    return value
+
+
+def _config_string(raw):
+    '''
+    get a configuration value without comments and quotes
+    '''
+
+    value = []
+    quoted = False
+    for char in raw.strip():
+        if char == '"':
+            quoted = not quoted
+        elif char in '#;' and not quoted:
+            break
+        else:
+            value.append(char)
+
+    return ''.join(value).strip()
+
+
+def run_git(git_dir, args, budget=None, timings=NULL_TIMINGS):
+    '''
+    run a timed git subprocess, get (return code, standard output)
+
+    the command and its children are killed when the optional
+    helper.budget.Budget runs out and BudgetExceeded is raised
+    '''
+
+    timeout = None
+    kwargs = {}
+    if budget is not None:
+        budget.check()
+        timeout = budget.remaining()
+        if timeout is not None:
+            # its own process group, to kill its children as well
+            if sys.version_info >= (3, 2):
+                kwargs['start_new_session'] = True
+            else:  # pragma: no cover
+                kwargs['preexec_fn'] = os.setsid
+
+    with timings.command(('git', ) + tuple(args)):
+        process = subprocess.Popen(
+            ['git', '--git-dir', git_dir] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            **kwargs
+        )
+        killed = []
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(
+                timeout, _kill_group, (process, killed)
+            )
+            timer.start()
+        try:
+            stdout, _ = process.communicate()
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    if killed:
+        raise BudgetExceeded(
+            u'time budget of {}s exceeded'.format(budget.timeout)
+        )
+
+    return process.returncode, stdout.decode('utf-8', 'replace')
+
+
+def _kill_group(process, killed):
+    '''
+    kill a process started in its own process group with its children
+    '''
+
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+        killed.append(process.pid)
+    except OSError:
+        pass
+
+
+class _NoCommitGraph(object):
+    '''
+    commit-graph stand-in of repositories without one :
+    every commit has an infinite generation
+    '''
+
+    @staticmethod
+    def lookup(hexsha):
+        '''
+        no commit is in the graph
+        '''
+
+        return None
+
+
+class Backend(object):
+    '''
+    repository access shared by all backends : in process references,
+    objects, commit-graph and tag index readers
+    '''
+
+    name = None
+    # True when no git process is ever spawned
+    in_process = False
+
+    def __init__(self, git_dir, timings=None):
+        self.git_dir = git_dir
+        self.timings = NULL_TIMINGS if timings is None else timings
+        self.refs = RefDatabase(git_dir)
+        self.objects = ObjectReader(git_dir)
+        self.describer = Describer(
+            self.refs,
+            self.objects,
+            cache_dir=os.path.join(self.refs.common_dir, CACHE_DIRNAME)
+        )
+        self._graph = None
+        self._repo = None
+
+    @property
+    def repo(self):
+        '''
+        GitPython Repo, only created on first use
+        '''
+
+        if self._repo is None:
+            from git import Repo
+            self._repo = Repo(self.git_dir)
+
+        return self._repo
+
+    def commit_graph(self):
+        '''
+        get the repository commit-graph with generation numbers,
+        None if there is none
+        '''
+
+        state = CommitGraph.state(self.git_dir)
+        if state is None:
+            return None
+
+        if self._graph is None or self._graph.key != state[1]:
+            graph = CommitGraph.open(self.git_dir, state)
+            if graph is not None and not graph.has_generations():
+                graph.close()
+                graph = None
+            if self._graph is not None:
+                self._graph.close()
+            self._graph = graph
+
+        return self._graph
+
+    def peel_tip(self, name, hexsha, graph=None):
+        '''
+        get the commit SHA1 hash a reference points to,
+        None when it is not a commit
+
+        tags are peeled from packed-refs when possible,
+        objects in the commit-graph are known to be commits
+        '''
+
+        if not name.startswith('refs/tags/'):
+            return hexsha
+
+        peeled = self.refs.peeled(name)
+        if peeled is not None:
+            return peeled
+
+        if graph is not None and graph.lookup(hexsha) is not None:
+            return hexsha
+
+        peeled = self.objects.peel(hexsha)
+        if peeled is None or peeled[1] != 'commit':
+            return None
+
+        return peeled[0]
+
+    def ref_tips(self, namespaces, graph=None):
+        '''
+        get {reference full name: commit SHA1 hash} of the non symbolic
+        references of namespaces, e.g. ['refs/remotes/', 'refs/tags/']
+        '''
+
+        tips = {}
+        for prefix in namespaces:
+            for name, hexsha in self.refs.list_refs(prefix, symbolic=False):
+                hexsha = self.peel_tip(name, hexsha, graph)
+                if hexsha is not None:
+                    tips[name] = hexsha
+
+        return tips
+
+    def read_commit(self, rev):
+        '''
+        resolve any revision and get its commit snapshot,
+        None when it can not be resolved
+        '''
+
+        raise NotImplementedError()
+
+    def read_commits(self, revs):
+        '''
+        yield (revision, CommitSnapshot or None) of many revisions in order
+        '''
+
+        for rev in revs:
+            yield rev, self.read_commit(rev)
+
+    def describe(self, rev, abbrev=None, budget=None):
+        '''
+        get `git describe --tag --always` output, an empty string
+        when it fails
+
+        budget is an optional helper.budget.Budget,
+        BudgetExceeded is raised when it runs out
+        '''
+
+        raise NotImplementedError()
+
+    def containing(self, rev, namespaces, budget=None):
+        '''
+        get full names of the references of namespaces which contain
+        a commit, result of `git for-each-ref --contains=<rev>`
+
+        raise GitPython GitCommandError when the revision can not be
+        resolved,
+        BudgetExceeded when the optional budget runs out
+        '''
+
+        raise NotImplementedError()
+
+    def config_value(self, section, option, default=None):
+        '''
+        get a configuration value
+        '''
+
+        raise NotImplementedError()
+
+    def close(self):
+        '''
+        release the commit-graph and the GitPython Repo if any
+        '''
+
+        if self._graph is not None:
+            self._graph.close()
+            self._graph = None
+        if self._repo is not None:
+            self._repo.close()
+
+
+class CatFileBackend(Backend):
+    '''
+    backend resolving complex revisions by pooled `git cat-file --batch`
+    processes, see catfile.POOL
+    '''
+
+    def read_commit(self, rev):
+        '''
+        resolve any revision and get its commit snapshot through a pooled
+        `git cat-file --batch` process, None when it can not be resolved
+        '''
+
+        with POOL.worker(self.git_dir) as catfile:
+            with self.timings.command(['git', 'cat-file', '--batch']):
+                obj = catfile.read_commit(rev)
+
+        return None if obj is None else CommitSnapshot.from_raw(*obj)
+
+    def read_commits(self, revs):
+        '''
+        yield (revision, CommitSnapshot or None) of many revisions in order
+        through one pooled `git cat-file --batch` process
+        '''
+
+        with POOL.worker(self.git_dir) as catfile:
+            for rev in revs:
+                with self.timings.command(['git', 'cat-file', '--batch']):
+                    obj = catfile.read_commit(rev)
+                yield rev, None if obj is None else CommitSnapshot.from_raw(
+                    *obj
+                )
+
+
+class GitPythonBackend(CatFileBackend):
+    '''
+    GitPython Repo and git commands
+    '''
+
+    name = BACKEND_GITPYTHON
+
+    def __init__(self, path, timings=None):
+        from git import Repo
+        repo = Repo(path)
+        super(GitPythonBackend, self).__init__(repo.git_dir, timings)
+        self._repo = repo
+
+    def git(self, command, args, budget=None):
+        '''
+        run a timed git command through GitPython,
+        killed when the optional helper.budget.Budget runs out
+
+        raise BudgetExceeded when the command was killed
+        or the budget had already run out
+        '''
+
+        kwargs = {}
+        if budget is not None:
+            budget.check()
+            kwargs['kill_after_timeout'] = budget.remaining()
+
+        try:
+            with self.timings.command(('git', command) + tuple(args)):
+                return getattr(self.repo.git, command)(*args, **kwargs)
+        except command_error():
+            if budget is not None:
+                budget.check()
+            raise
+
+    def read_commit(self, rev):
+        '''
+        resolve any revision and get its commit snapshot,
+        GitPython reports revisions which can not be resolved
+        '''
+
+        snapshot = super(GitPythonBackend, self).read_commit(rev)
+        if snapshot is not None:
+            return snapshot
+
+        return CommitSnapshot.from_commit(self.repo.commit(rev))
+
+    def describe(self, rev, abbrev=None, budget=None):
+        try:
+            return self.git(
+                'describe', ('--tag', '--always', rev), budget
+            ).strip()
+        except command_error():
+            return ''
+
+    def containing(self, rev, namespaces, budget=None):
+        return self.git(
+            'for-each-ref',
+            ('--format=%(refname)', '--contains=' + rev) + tuple(namespaces),
+            budget
+        ).splitlines()
+
+    def config_value(self, section, option, default=None):
+        return self.repo.config_reader().get_value(section, option, default)
+
+
+class SubprocessBackend(CatFileBackend):
+    '''
+    bare git subprocesses, without GitPython
+    '''
+
+    name = BACKEND_SUBPROCESS
+
+    def __init__(self, path, timings=None):
+        super(SubprocessBackend, self).__init__(find_git_dir(path), timings)
+
+    def git(self, args, budget=None):
+        '''
+        run a timed git command, get (return code, standard output),
+        see run_git()
+        '''
+
+        return run_git(self.git_dir, args, budget, self.timings)
+
+    def describe(self, rev, abbrev=None, budget=None):
+        returncode, stdout = self.git(
+            ('describe', '--tag', '--always', rev), budget
+        )
+
+        return stdout.strip() if returncode == 0 else ''
+
+    def containing(self, rev, namespaces, budget=None):
+        args = ('for-each-ref', '--format=%(refname)', '--contains=' + rev) \
+            + tuple(namespaces)
+        returncode, stdout = self.git(args, budget)
+        if returncode != 0:
+            raise command_error(('git', ) + args, returncode)
+
+        return stdout.splitlines()
+
+    def config_value(self, section, option, default=None):
+        returncode, stdout = self.git(
+            ('config', '--get', '{}.{}'.format(section, option))
+        )
+
+        return stdout.strip() if returncode == 0 else default
+
+
+class PurePythonBackend(Backend):
+    '''
+    pure Python, no git process is spawned :
+    history walks ignore grafts and replace refs,
+    revisions are limited to references, full or abbreviated
+    SHA1 hashes followed by ~<n>, ^<n> and ^{commit} suffixes
+    '''
+
+    name = BACKEND_PYTHON
+    in_process = True
+
+    def __init__(self, path, timings=None):
+        super(PurePythonBackend, self).__init__(find_git_dir(path), timings)
+
+    def resolve(self, rev):
+        '''
+        get the commit SHA1 hash of a revision, None when it can not be
+        resolved
+        '''
+
+        match = REGEX_REVISION.match(rev)
+        if match is None:
+            return None
+
+        base = match.group('base')
+        hexsha = self.refs.resolve_revision('HEAD' if base == '@' else base)
+        if hexsha is None and REGEX_ABBREV_SHA1.match(base):
+            hexsha = self.objects.expand(base)
+        if hexsha is None:
+            return None
+
+        peeled = self.objects.peel(hexsha)
+        if peeled is None or peeled[1] != 'commit':
+            return None
+        hexsha = peeled[0]
+
+        for suffix in REGEX_SUFFIX.finditer(match.group('suffixes')):
+            operator, number = suffix.group(1), suffix.group(2)
+            if operator is None:
+                continue
+            count = int(number) if number else 1
+            if operator == '^':
+                hexsha = self._parent(hexsha, count)
+            else:
+                for _ in range(count):
+                    hexsha = self._parent(hexsha, 1)
+                    if hexsha is None:
+                        break
+            if hexsha is None:
+                return None
+
+        return hexsha
+
+    def _parent(self, hexsha, number):
+        '''
+        get the SHA1 hash of the nth parent of a commit,
+        the commit itself for the 0th one, None if there is none
+        '''
+
+        if number == 0:
+            return hexsha
+
+        data = self.objects.read_parents(hexsha)
+        if data is None or len(data[0]) < number:
+            return None
+
+        return data[0][number - 1]
+
+    def read_commit(self, rev):
+        hexsha = self.resolve(rev)
+
+        return None if hexsha is None else self.objects.read_commit(hexsha)
+
+    def describe(self, rev, abbrev=None, budget=None):
+        hexsha = self.resolve(rev)
+        if hexsha is None:
+            return ''
+
+        return self.describer.describe(
+            hexsha, abbrev, budget, exhaustive=True
+        ) or ''
+
+    def containing(self, rev, namespaces, budget=None):
+        hexsha = self.resolve(rev)
+        if hexsha is None:
+            raise command_error(
+                ('for-each-ref', '--contains=' + rev), 129,
+                u'malformed object name {}'.format(rev)
+            )
+
+        graph = self.commit_graph() or _NoCommitGraph()
+        names = reachable_tips(
+            graph, self.objects, hexsha, self.ref_tips(namespaces, graph),
+            budget
+        )
+
+        return sorted(names or [])
+
+    def config_value(self, section, option, default=None):
+        return read_config_value(
+            config_paths(self.git_dir), section, option, default
+        )
+
+    def cheaper_than_git(self):
+        '''
+        check if in process reading should beat git subprocesses :
+        the commit-graph spares whole history walks and
+        the history has no grafts or replace refs
+        '''
+
+        return self.commit_graph() is not None and self.describer.supported()
+
+
+BACKENDS = {
+    BACKEND_GITPYTHON: GitPythonBackend,
+    BACKEND_SUBPROCESS: SubprocessBackend,
+    BACKEND_PYTHON: PurePythonBackend,
+}
+BACKEND_NAMES = (
+    BACKEND_AUTO, BACKEND_GITPYTHON, BACKEND_SUBPROCESS, BACKEND_PYTHON
+)
+
+
+def create_backend(path, name=BACKEND_GITPYTHON, timings=None):
+    '''
+    get a backend by name for a repository path,
+    'auto' picks the pure Python backend when it should be cheaper than
+    git subprocesses, see PurePythonBackend.cheaper_than_git(),
+    the subprocess backend otherwise : this is a heuristic on the
+    repository layout, no backend is timed
+
+    raise ValueError for an unknown backend name
+    '''
+
+    if name == BACKEND_AUTO:
+        backend = PurePythonBackend(path, timings)
+        if backend.cheaper_than_git():
+            return backend
+        backend.close()
+        name = BACKEND_SUBPROCESS
+
+    if name not in BACKENDS:
+        raise ValueError(u'unknown backend : {}'.format(name))
+
+    return BACKENDS[name](path, timings)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+'''
+    Persistent results cache
+
+    one JSON file per entry, least recently used entries are evicted
+'''
+from __future__ import unicode_literals
+
+import hashlib
+import io
+import json
+import os
+
+DEFAULT_MAX_ENTRIES = 256
+ENTRY_EXTENSION = '.json'
+
+
+class ResultCache(object):
+    '''
+    size bounded LRU cache stored in a directory
+    '''
+
+    def __init__(self, directory, max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    @staticmethod
+    def make_key(*parts):
+        '''
+        build a cache key from several strings
+        '''
+
+        return hashlib.sha1('\0'.join(parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        '''
+        get an entry file path
+        '''
+
+        return os.path.join(self.directory, key + ENTRY_EXTENSION)
+
+    def get(self, key):
+        '''
+        get a cached value or None, marking the entry as recently used
+        '''
+
+        path = self._path(key)
+        try:
+            with io.open(path, 'r', encoding='utf-8') as fpt:
+                value = json.load(fpt)
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+
+        return value
+
+    def set(self, key, value):
+        '''
+        store a value and evict least recently used entries,
+        write errors are ignored
+        '''
+
+        import tempfile
+
+        try:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory, 0o755)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+            with io.open(fd, 'w', encoding='utf-8') as fpt:
+                fpt.write(json.dumps(value, ensure_ascii=False))
+            os.rename(tmp_path, self._path(key))
+            self.evict()
+        except (IOError, OSError):
+            return
+
+    def evict(self):
+        '''
+        remove least recently used entries above max_entries
+        '''
+
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ENTRY_EXTENSION):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except (IOError, OSError):
+                continue
+
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except (IOError, OSError):
+                continue
+
+    def clear(self):
+        '''
+        remove all entries
+        '''
+
+        if not os.path.exists(self.directory):
+            return
+
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_EXTENSION):
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+'''
+    Persistent `git cat-file --batch` process
+
+    resolve and read many objects through a single long lived git process,
+    processes are shared by all GitHandler instances and threads of a Python
+    process through a bounded pool, see POOL
+'''
+from __future__ import unicode_literals
+
+import atexit
+import os
+import re
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_IDLE_TIMEOUT = 60.0
+# <SHA1 hash> <type> <size>, anything else is <rev> missing or ambiguous
+REGEX_HEADER = re.compile(r'^([0-9a-f]{40}) (\S+) (\d+)$')
+
+
+class CatFile(object):
+    '''
+    long lived `git cat-file --batch` or `--batch-check` process
+    '''
+
+    def __init__(self, git_dir, check=False):
+        self.git_dir = git_dir
+        self.check = check
+        # a request was interrupted, unread output may be left
+        self._pending = False
+        self._process = subprocess.Popen(
+            [
+                'git', '--git-dir', git_dir, 'cat-file',
+                '--batch-check' if check else '--batch'
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE
+        )
+
+    def request(self, rev):
+        '''
+        get (SHA1 hash, type, content) of an object, content is the size
+        for a --batch-check process, None if the object does not exist
+        '''
+
+        if '\n' in rev:
+            return None
+
+        self._pending = True
+        self._process.stdin.write(rev.encode('utf-8') + b'\n')
+        self._process.stdin.flush()
+
+        header = self._process.stdout.readline()
+        if not header:
+            raise IOError('git cat-file process stopped')
+
+        # a revision with spaces gives a missing line of more than 3 words
+        match = REGEX_HEADER.match(header.decode('utf-8', 'replace').strip())
+        if not match:
+            self._pending = False
+            return None
+
+        hexsha, obj_type, size = \
+            match.group(1), match.group(2), int(match.group(3))
+        if not self.check:
+            size = self._process.stdout.read(size)
+            self._process.stdout.read(1)
+        self._pending = False
+
+        return hexsha, obj_type, size
+
+    def read_commit(self, rev):
+        '''
+        get (SHA1 hash, raw content) of the commit a revision points to,
+        None if it does not exist
+        '''
+
+        obj = self.request(rev + '^{commit}')
+        if obj is None or obj[1] != 'commit':
+            return None
+
+        return obj[0], obj[2]
+
+    def alive(self):
+        '''
+        check if the git process is still running
+        '''
+
+        return self._process.poll() is None
+
+    def reusable(self):
+        '''
+        check if the process can serve other requests
+        '''
+
+        return not self._pending and self.alive()
+
+    def close(self):
+        '''
+        stop the git process
+        '''
+
+        if self._process.poll() is None:
+            self._process.stdin.close()
+            self._process.wait()
+        self._process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CatFilePool(object):
+    '''
+    bounded pool of persistent cat-file processes by git directory and mode,
+    shared by threads : a process serves one thread at a time
+
+    at most max_workers processes run, when the bound is reached the least
+    recently used idle process is stopped, or the caller waits for a busy
+    one to be released, processes idle for idle_timeout seconds are stopped
+    by a background thread
+    '''
+
+    def __init__(
+        self,
+        max_workers=DEFAULT_MAX_WORKERS,
+        idle_timeout=DEFAULT_IDLE_TIMEOUT
+    ):
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        # [(key, CatFile, release time)] least recently used first
+        self._idle = []
+        self._busy = 0
+        self._reaper = None
+        self._pid = os.getpid()
+
+    def size(self):
+        '''
+        get (busy, idle) numbers of processes
+        '''
+
+        with self._cond:
+            return self._busy, len(self._idle)
+
+    @contextmanager
+    def worker(self, git_dir, check=False):
+        '''
+        borrow a `git cat-file --batch` (or `--batch-check`) process
+        of a repository for a with block
+        '''
+
+        catfile = self._acquire(os.path.abspath(git_dir), check)
+        try:
+            yield catfile
+        finally:
+            self._release(catfile)
+
+    def _acquire(self, git_dir, check):
+        key = (git_dir, check)
+        with self._cond:
+            self._check_fork()
+            while True:
+                for index in range(len(self._idle) - 1, -1, -1):
+                    if self._idle[index][0] == key:
+                        catfile = self._idle.pop(index)[1]
+                        if catfile.reusable():
+                            self._busy += 1
+                            return catfile
+                        catfile.close()
+                        break
+
+                if self._busy + len(self._idle) < self.max_workers:
+                    break
+                if self._idle:
+                    self._idle.pop(0)[1].close()
+                    break
+                self._cond.wait()
+
+            self._busy += 1
+
+        try:
+            return CatFile(git_dir, check)
+        except Exception:
+            with self._cond:
+                self._busy -= 1
+                self._cond.notify_all()
+            raise
+
+    def _release(self, catfile):
+        with self._cond:
+            if os.getpid() != self._pid:
+                return
+            self._busy -= 1
+            if catfile.reusable():
+                self._idle.append(
+                    ((catfile.git_dir, catfile.check), catfile, time.time())
+                )
+                self._start_reaper()
+            else:
+                catfile.close()
+            # the reaper thread may be waiting too
+            self._cond.notify_all()
+
+    def _start_reaper(self):
+        '''
+        start the idle processes reaper thread if it is not running
+        '''
+
+        if self._reaper is None:
+            self._reaper = threading.Thread(
+                target=self._reap_loop, name='git-cat-file-reaper'
+            )
+            self._reaper.daemon = True
+            self._reaper.start()
+
+    def _reap_loop(self):
+        with self._cond:
+            while self._idle:
+                self._cond.wait(max(self.idle_timeout / 2, 0.01))
+                self._reap()
+            self._reaper = None
+
+    def _reap(self):
+        deadline = time.time() - self.idle_timeout
+        expired = [item for item in self._idle if item[2] <= deadline]
+        self._idle = [item for item in self._idle if item[2] > deadline]
+        for _, catfile, _ in expired:
+            catfile.close()
+        if expired:
+            self._cond.notify_all()
+
+    def reap(self):
+        '''
+        stop processes idle for idle_timeout seconds
+        '''
+
+        with self._cond:
+            self._reap()
+
+    def close(self):
+        '''
+        stop all idle processes, busy ones are stopped when released
+        '''
+
+        with self._cond:
+            for _, catfile, _ in self._idle:
+                catfile.close()
+            self._idle = []
+            self._cond.notify_all()
+
+    def _check_fork(self):
+        '''
+        forget processes of the parent process in a forked child
+        '''
+
+        if os.getpid() != self._pid:
+            self._idle = []
+            self._busy = 0
+            self._reaper = None
+            self._pid = os.getpid()
+
+    def after_fork(self):
+        '''
+        reset the pool in a forked child process, the parent keeps
+        using its processes
+        '''
+
+        self._cond = threading.Condition()
+        self._check_fork()
+
+
+POOL = CatFilePool()
+atexit.register(POOL.close)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=POOL.after_fork)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+'''
+    Git commit snapshot
+'''
+from __future__ import unicode_literals
+
+import re
+from collections import namedtuple
+from datetime import datetime
+
+import pytz
+
+REGEX_IDENTITY = re.compile(r'^(.*) <(.*)> (\d+) ([+-])(\d{2})(\d{2})$')
+
+
+class CommitSnapshot(
+    namedtuple(
+        'CommitSnapshot', (
+            'hexsha', 'message', 'author_name', 'author_email',
+            'committer_name', 'committer_email', 'authored_datetime',
+            'committed_datetime'
+        )
+    )
+):
+    '''
+    immutable snapshot of a resolved git commit
+    '''
+    __slots__ = ()
+
+    @classmethod
+    def from_commit(cls, commit):
+        '''
+        build a snapshot from a GitPython commit object
+        '''
+
+        return cls(
+            hexsha=commit.hexsha,
+            message=commit.message.strip(),
+            author_name=commit.author.name,
+            author_email=commit.author.email,
+            committer_name=commit.committer.name,
+            committer_email=commit.committer.email,
+            authored_datetime=commit.authored_datetime,
+            committed_datetime=commit.committed_datetime
+        )
+
+    @classmethod
+    def from_raw(cls, hexsha, data):
+        '''
+        build a snapshot from a raw commit object content
+        '''
+
+        headers, message = parse_commit(data)
+        author_name, author_email, authored_datetime = parse_identity(
+            headers['author'][0]
+        )
+        committer_name, committer_email, committed_datetime = parse_identity(
+            headers['committer'][0]
+        )
+
+        return cls(
+            hexsha=hexsha,
+            message=message.strip(),
+            author_name=author_name,
+            author_email=author_email,
+            committer_name=committer_name,
+            committer_email=committer_email,
+            authored_datetime=authored_datetime,
+            committed_datetime=committed_datetime
+        )
+
+    @property
+    def abbrev_commit(self):
+        '''
+        shorten SHA1 hash
+        '''
+
+        return self.hexsha[0:7]
+
+
+def parse_commit(data):
+    '''
+    split a raw commit object content into its headers and its message
+
+    headers are returned as a dict of value lists,
+    multi-line values (e.g. gpgsig) are joined with new lines
+    '''
+
+    header, _, message = data.partition(b'\n\n')
+
+    raw_headers = []
+    for line in header.split(b'\n'):
+        if line.startswith(b' ') and raw_headers:
+            raw_headers[-1][1].append(line[1:])
+            continue
+
+        key, _, value = line.partition(b' ')
+        raw_headers.append((key.decode('ascii', 'replace'), [value]))
+
+    encoding = 'utf-8'
+    for key, values in raw_headers:
+        if key == 'encoding':
+            encoding = values[0].decode('ascii', 'replace')
+    try:
+        b''.decode(encoding)
+    except LookupError:
+        encoding = 'utf-8'
+
+    headers = {}
+    for key, values in raw_headers:
+        headers.setdefault(key, []).append(
+            b'\n'.join(values).decode(encoding, 'replace')
+        )
+
+    return headers, message.decode(encoding, 'replace')
+
+
+def parse_identity(value):
+    '''
+    parse an author or committer header value
+    to a (name, email, datetime) tuple
+    '''
+
+    match = REGEX_IDENTITY.match(value)
+    if not match:
+        return value, '', None
+
+    name, email, timestamp, sign, hours, minutes = match.groups()
+    offset = int(hours) * 60 + int(minutes)
+    if sign == '-':
+        offset = -offset
+
+    date = datetime.fromtimestamp(int(timestamp), pytz.FixedOffset(offset))
+
+    return name, email, date
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+'''
+    Git commit-graph reader
+
+    read objects/info/commit-graph or a split commit-graph chain
+    and answer reachability questions with generation numbers pruning
+'''
+from __future__ import unicode_literals
+
+import binascii
+import heapq
+import io
+import mmap
+import os
+import struct
+
+from git_app_version.githandler.refs import read_commondir
+
+SIGNATURE = b'CGPH'
+CHUNK_OID_FANOUT = b'OIDF'
+CHUNK_OID_LOOKUP = b'OIDL'
+CHUNK_COMMIT_DATA = b'CDAT'
+CHUNK_EXTRA_EDGES = b'EDGE'
+
+PARENT_NONE = 0x70000000
+PARENT_EXTRA_EDGES = 0x80000000
+LAST_EDGE = 0x80000000
+GENERATION_INFINITY = 0xffffffff
+
+HASH_LENGTH = 20
+COMMIT_DATA_LENGTH = HASH_LENGTH + 16
+
+
+class CommitGraphFile(object):
+    '''
+    single commit-graph file, positions are global to the chain
+    '''
+
+    def __init__(self, path, base_count=0):
+        self.path = path
+        self.base_count = base_count
+        with open(path, 'rb') as fpt:
+            self._data = mmap.mmap(fpt.fileno(), 0, access=mmap.ACCESS_READ)
+
+        signature, version, hash_version, num_chunks, _ = struct.unpack_from(
+            b'>4sBBBB', self._data, 0
+        )
+        if signature != SIGNATURE or version != 1 or hash_version != 1:
+            raise ValueError('unsupported commit-graph file')
+
+        self._chunks = {}
+        for i in range(num_chunks):
+            chunk_id, offset = struct.unpack_from(
+                b'>4sQ', self._data, 8 + 12 * i
+            )
+            self._chunks[chunk_id] = offset
+
+        for chunk_id in (CHUNK_OID_FANOUT, CHUNK_OID_LOOKUP,
+                         CHUNK_COMMIT_DATA):
+            if chunk_id not in self._chunks:
+                raise ValueError('missing commit-graph chunk')
+
+        self._fanout = struct.unpack_from(
+            b'>256I', self._data, self._chunks[CHUNK_OID_FANOUT]
+        )
+        self.num_commits = self._fanout[255]
+
+    def lookup(self, binsha):
+        '''
+        get the global position of a commit or None
+        '''
+
+        first = struct.unpack_from(b'B', binsha, 0)[0]
+        low = self._fanout[first - 1] if first else 0
+        high = self._fanout[first]
+        lookup = self._chunks[CHUNK_OID_LOOKUP]
+
+        while low < high:
+            middle = (low + high) // 2
+            start = lookup + HASH_LENGTH * middle
+            name = self._data[start:start + HASH_LENGTH]
+            if name < binsha:
+                low = middle + 1
+            elif name > binsha:
+                high = middle
+            else:
+                return self.base_count + middle
+
+        return None
+
+    def hexsha(self, pos):
+        '''
+        get the SHA1 hash of a commit from its global position
+        '''
+
+        start = self._chunks[CHUNK_OID_LOOKUP] + HASH_LENGTH * (
+            pos - self.base_count
+        )
+
+        return binascii.hexlify(self._data[start:start + HASH_LENGTH]
+                                ).decode('ascii')
+
+    def commit_data(self, pos):
+        '''
+        get (parents global positions, generation, commit timestamp)
+        '''
+
+        start = self._chunks[CHUNK_COMMIT_DATA] + COMMIT_DATA_LENGTH * (
+            pos - self.base_count
+        ) + HASH_LENGTH
+        parent1, parent2, gen_high, date_low = struct.unpack_from(
+            b'>IIII', self._data, start
+        )
+
+        parents = []
+        if parent1 != PARENT_NONE:
+            parents.append(parent1)
+        if parent2 & PARENT_EXTRA_EDGES:
+            edges = self._chunks[CHUNK_EXTRA_EDGES] + 4 * (
+                parent2 & ~PARENT_EXTRA_EDGES
+            )
+            while True:
+                edge = struct.unpack_from(b'>I', self._data, edges)[0]
+                parents.append(edge & ~LAST_EDGE)
+                if edge & LAST_EDGE:
+                    break
+                edges += 4
+        elif parent2 != PARENT_NONE:
+            parents.append(parent2)
+
+        generation = gen_high >> 2
+        timestamp = ((gen_high & 3) << 32) | date_low
+
+        return tuple(parents), generation, timestamp
+
+    def close(self):
+        '''
+        release the memory map
+        '''
+
+        self._data.close()
+
+
+class CommitGraph(object):
+    '''
+    commit-graph file or split commit-graph chain
+    '''
+
+    def __init__(self, files, key=None):
+        self.files = files
+        self.key = key
+        self.num_commits = sum(graph.num_commits for graph in files)
+
+    @staticmethod
+    def state(git_dir):
+        '''
+        get (commit-graph file paths, files mtimes) of a repository,
+        None if there is no commit-graph
+        '''
+
+        info_dir = os.path.join(read_commondir(git_dir), 'objects', 'info')
+        chain_path = os.path.join(
+            info_dir, 'commit-graphs', 'commit-graph-chain'
+        )
+
+        try:
+            with io.open(chain_path, 'r', encoding='utf-8') as fpt:
+                paths = [
+                    os.path.join(
+                        info_dir, 'commit-graphs',
+                        'graph-{}.graph'.format(line)
+                    ) for line in fpt.read().split()
+                ]
+        except (IOError, OSError):
+            paths = [os.path.join(info_dir, 'commit-graph')]
+
+        try:
+            key = tuple(os.stat(path).st_mtime for path in paths)
+        except (IOError, OSError):
+            return None
+
+        return paths, key
+
+    @classmethod
+    def open(cls, git_dir, state=None):
+        '''
+        open the commit-graph of a repository, None if there is none
+        or if it can not be read
+        '''
+
+        state = state or cls.state(git_dir)
+        if state is None:
+            return None
+
+        paths, key = state
+        files = []
+        base_count = 0
+        try:
+            for path in paths:
+                graph = CommitGraphFile(path, base_count)
+                files.append(graph)
+                base_count += graph.num_commits
+        except (IOError, OSError, ValueError, struct.error):
+            for graph in files:
+                graph.close()
+            return None
+
+        return cls(files, key)
+
+    def _file(self, pos):
+        '''
+        get the file holding a global position
+        '''
+
+        for graph in self.files:
+            if pos < graph.base_count + graph.num_commits:
+                return graph
+
+        raise IndexError(pos)
+
+    def lookup(self, hexsha):
+        '''
+        get the global position of a commit or None
+        '''
+
+        binsha = binascii.unhexlify(hexsha)
+        for graph in reversed(self.files):
+            pos = graph.lookup(binsha)
+            if pos is not None:
+                return pos
+
+        return None
+
+    def hexsha(self, pos):
+        '''
+        get the SHA1 hash of a commit from its global position
+        '''
+
+        return self._file(pos).hexsha(pos)
+
+    def commit_data(self, pos):
+        '''
+        get (parents global positions, generation, commit timestamp)
+        '''
+
+        return self._file(pos).commit_data(pos)
+
+    def has_generations(self):
+        '''
+        check if generation numbers were computed when writing the graph
+        '''
+
+        return self.num_commits == 0 or self.commit_data(0)[1] != 0
+
+    def close(self):
+        '''
+        release all memory maps
+        '''
+
+        for graph in self.files:
+            graph.close()
+
+
+def reachable_tips(graph, objects, target, tips, budget=None):
+    '''
+    get names of tips from which the target commit is reachable,
+    walking from all the tips at once in decreasing generation order
+    and pruning commits with a generation not greater than the target one,
+    commits missing from the graph have an infinite generation
+
+    graph is a CommitGraph, objects an ObjectReader used for commits
+    missing from the graph, tips a {name: SHA1 hash} dict,
+    budget an optional helper.budget.Budget checked while walking
+
+    return None if a commit can not be read,
+    raise BudgetExceeded when the budget runs out
+    '''
+
+    names = sorted(tips)
+    if not names:
+        return []
+
+    def node(hexsha):
+        pos = graph.lookup(hexsha)
+        return hexsha if pos is None else pos
+
+    def commit_data(key):
+        if isinstance(key, int):
+            return graph.commit_data(key)
+        data = objects.read_parents(key)
+        if data is None:
+            return None
+        return tuple(node(parent) for parent in data[0]), \
+            GENERATION_INFINITY, data[1]
+
+    target_key = node(target)
+    target_data = commit_data(target_key)
+    if target_data is None:
+        return None
+    target_generation = target_data[1]
+
+    all_bits = (1 << len(names)) - 1
+    masks = {}
+    done = {}
+    generations = {target_key: target_generation}
+    heap = []
+
+    for i, name in enumerate(names):
+        key = node(tips[name])
+        data = commit_data(key)
+        if data is None:
+            continue
+        generations[key] = data[1]
+        masks[key] = masks.get(key, 0) | (1 << i)
+        heapq.heappush(heap, (-data[1], str(key), key))
+
+    while heap and masks.get(target_key, 0) != all_bits:
+        if budget is not None:
+            budget.check()
+        key = heapq.heappop(heap)[2]
+        new_bits = masks[key] & ~done.get(key, 0)
+        if not new_bits or key == target_key:
+            continue
+        done[key] = done.get(key, 0) | new_bits
+
+        data = commit_data(key)
+        if data is None:
+            return None
+
+        for parent in data[0]:
+            if parent != target_key:
+                if parent not in generations:
+                    parent_data = commit_data(parent)
+                    if parent_data is None:
+                        return None
+                    generations[parent] = parent_data[1]
+                if generations[parent] <= target_generation and \
+                        generations[parent] != GENERATION_INFINITY:
+                    continue
+
+            masks[parent] = masks.get(parent, 0) | new_bits
+            heapq.heappush(heap, (-generations[parent], str(parent), parent))
+
+    target_mask = masks.get(target_key, 0)
+
+    return [name for i, name in enumerate(names) if target_mask & (1 << i)]
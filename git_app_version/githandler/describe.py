@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+'''
+    In process `git describe --tags --always`
+
+    tags are indexed by the commit they point to, the index is cached on disk
+    and rebuilt only when packed-refs or refs/tags change
+'''
+from __future__ import unicode_literals
+
+import io
+import json
+import os
+
+from git_app_version.githandler.commit import parse_commit
+
+MAX_CANDIDATES = 10
+DEFAULT_MAX_WALK = 100000
+CACHE_FILENAME = 'describe-tags.json'
+
+PRIO_ANNOTATED = 2
+PRIO_LIGHTWEIGHT = 1
+
+
+class WalkLimitExceeded(Exception):
+    '''
+    the ancestry walk visited more commits than allowed
+    '''
+
+
+def _insert_by_date(queue, hexsha, dates):
+    '''
+    insert a commit in a list sorted by decreasing commit date,
+    after the commits having the same date
+    '''
+
+    date = dates[hexsha]
+    pos = len(queue)
+    for i, item in enumerate(queue):
+        if dates[item] < date:
+            pos = i
+            break
+    queue.insert(pos, hexsha)
+
+
+class Describer(object):
+    '''
+    describe commits from the nearest tag like `git describe --tags --always`
+    '''
+
+    def __init__(
+        self, refs, objects, cache_dir=None, max_walk=DEFAULT_MAX_WALK
+    ):
+        self.refs = refs
+        self.objects = objects
+        self.cache_dir = cache_dir
+        self.max_walk = max_walk
+
+        self._tags_key = None
+        self._tags = None
+
+    def supported(self):
+        '''
+        check if the repository history can be walked in process,
+        shallow clones, grafts and replace refs are left to git
+        '''
+
+        if os.path.exists(os.path.join(self.refs.common_dir, 'shallow')) \
+                or os.path.exists(
+                    os.path.join(self.refs.common_dir, 'info', 'grafts')
+                ):
+            return False
+
+        return not self.refs.list_refs('refs/replace/')
+
+    def tag_index(self, budget=None):
+        '''
+        get tags indexed by commit SHA1 hash : {commit: [name, prio, date]}
+        '''
+
+        key = self.refs.fingerprint('refs/tags/')
+        if key == self._tags_key:
+            return self._tags
+
+        tags = self._load_cache(key)
+        if tags is None:
+            tags = self._build_tag_index(budget)
+            self._save_cache(key, tags)
+
+        self._tags_key = key
+        self._tags = tags
+
+        return tags
+
+    def _build_tag_index(self, budget=None):
+        '''
+        read every tag, keeping one tag per commit with git describe rules :
+        annotated tags first, then the newest annotated tag,
+        then the first tag by name
+        '''
+
+        tags = {}
+        for name, hexsha in self.refs.list_refs('refs/tags/'):
+            if budget is not None:
+                budget.check()
+            obj = self.objects.read(hexsha)
+            if obj is None:
+                continue
+
+            prio = PRIO_LIGHTWEIGHT
+            date = 0
+            if obj[0] == 'tag':
+                prio = PRIO_ANNOTATED
+                headers, _ = parse_commit(obj[1])
+                date = _tagger_timestamp(headers)
+
+            target = self.refs.peeled(name)
+            if target is None:
+                peeled = self.objects.peel(hexsha)
+                if peeled is None:
+                    continue
+                target, obj_type, _ = peeled
+            else:
+                obj_type = 'commit' if self.objects.read_parents(
+                    target
+                ) is not None else None
+
+            if obj_type != 'commit':
+                continue
+
+            current = tags.get(target)
+            if current is None or current[1] < prio or (
+                current[1] == prio == PRIO_ANNOTATED and current[2] < date
+            ):
+                tags[target] = [name[len('refs/tags/'):], prio, date]
+
+        return tags
+
+    def _cache_path(self):
+        '''
+        get the tag index cache file path
+        '''
+
+        if not self.cache_dir:
+            return None
+
+        return os.path.join(self.cache_dir, CACHE_FILENAME)
+
+    def _load_cache(self, key):
+        '''
+        load the tag index from the cache file if it matches key
+        '''
+
+        path = self._cache_path()
+        if path is None:
+            return None
+
+        try:
+            with io.open(path, 'r', encoding='utf-8') as fpt:
+                cache = json.load(fpt)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if not isinstance(cache, dict) or cache.get('key') != key:
+            return None
+
+        return cache.get('tags')
+
+    def _save_cache(self, key, tags):
+        '''
+        write the tag index cache file atomically, ignoring write errors
+        '''
+
+        import tempfile
+
+        path = self._cache_path()
+        if path is None:
+            return
+
+        try:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir, 0o755)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            with io.open(fd, 'w', encoding='utf-8') as fpt:
+                fpt.write(
+                    json.dumps({
+                        'key': key,
+                        'tags': tags
+                    }, ensure_ascii=False)
+                )
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            return
+
+    def describe(self, hexsha, abbrev=None, budget=None, exhaustive=False):
+        '''
+        get `git describe --tags --always` output for a commit,
+        or None when it has to be left to git
+
+        budget is an optional helper.budget.Budget,
+        BudgetExceeded is raised when it runs out,
+        exhaustive walks without limit, ignoring shallow clones,
+        grafts and replace refs
+        '''
+
+        if not exhaustive and not self.supported():
+            return None
+
+        tags = self.tag_index(budget)
+
+        if hexsha in tags:
+            return tags[hexsha][0]
+
+        try:
+            result = self._walk(
+                hexsha, tags, budget, None if exhaustive else self.max_walk
+            )
+        except WalkLimitExceeded:
+            return None
+
+        if result is None:
+            return None
+
+        abbrev_commit = self.objects.abbrev(hexsha, abbrev)
+        if not result:
+            return abbrev_commit
+
+        name, depth = result
+
+        return '{}-{}-g{}'.format(name, depth, abbrev_commit)
+
+    def _walk(self, hexsha, tags, budget=None, max_walk=None):
+        '''
+        port of git describe ancestry walk : find up to MAX_CANDIDATES tags
+        by commit date order and keep the one with the fewest commits
+        not reachable from it, loading at most max_walk commits
+
+        return (tag name, depth), an empty tuple if no tag is reachable
+        or None if a commit can not be read
+        '''
+
+        dates = {}
+        parents = {}
+        flags = {}
+
+        def load(commit):
+            if commit not in parents:
+                if budget is not None:
+                    budget.check()
+                data = self.objects.read_parents(commit)
+                if data is None:
+                    return False
+                parents[commit], dates[commit] = data
+                if max_walk is not None and len(parents) > max_walk:
+                    raise WalkLimitExceeded(commit)
+
+            return True
+
+        if not load(hexsha):
+            return None
+
+        seen_bit = 1
+        flags[hexsha] = seen_bit
+        queue = [hexsha]
+        candidates = []
+        annotated_count = 0
+        seen_commits = 0
+        gave_up_on = None
+
+        while queue:
+            commit = queue.pop(0)
+            seen_commits += 1
+
+            name = tags.get(commit)
+            if name is not None:
+                if len(candidates) < MAX_CANDIDATES:
+                    flag = 1 << (len(candidates) + 1)
+                    candidates.append({
+                        'name': name[0],
+                        'depth': seen_commits - 1,
+                        'flag': flag,
+                        'order': len(candidates)
+                    })
+                    flags[commit] |= flag
+                    if name[1] == PRIO_ANNOTATED:
+                        annotated_count += 1
+                else:
+                    gave_up_on = commit
+                    break
+
+            for candidate in candidates:
+                if not flags[commit] & candidate['flag']:
+                    candidate['depth'] += 1
+
+            if annotated_count and not queue:
+                break
+
+            if not self._push_parents(commit, queue, flags, dates, parents,
+                                      load):
+                return None
+
+        if not candidates:
+            return ()
+
+        candidates.sort(key=lambda item: (item['depth'], item['order']))
+        best = candidates[0]
+
+        if gave_up_on is not None:
+            _insert_by_date(queue, gave_up_on, dates)
+
+        while queue:
+            commit = queue.pop(0)
+            if flags[commit] & best['flag']:
+                if all(flags[item] & best['flag'] for item in queue):
+                    break
+            else:
+                best['depth'] += 1
+
+            if not self._push_parents(commit, queue, flags, dates, parents,
+                                      load):
+                return None
+
+        return best['name'], best['depth']
+
+    @staticmethod
+    def _push_parents(commit, queue, flags, dates, parents, load):
+        '''
+        queue unseen parents of a commit and propagate its flags to them
+        '''
+
+        for parent in parents[commit]:
+            if not load(parent):
+                return False
+            if parent not in flags:
+                flags[parent] = 0
+                _insert_by_date(queue, parent, dates)
+            flags[parent] |= flags[commit]
+
+        return True
+
+
+def _tagger_timestamp(headers):
+    '''
+    get the tagger timestamp of an annotated tag headers
+    '''
+
+    try:
+        return int(headers['tagger'][0].rsplit(' ', 2)[1])
+    except (KeyError, IndexError, ValueError):
+        return 0
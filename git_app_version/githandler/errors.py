@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+'''
+    GitPython exceptions, only imported when needed
+
+    importing GitPython takes longer than a whole run reading the repository
+    in process : exceptions are imported when they are raised,
+    `except not_repository_errors():` clauses are only evaluated
+    while an exception is handled
+'''
+from __future__ import unicode_literals
+
+
+def not_repository_errors():
+    '''
+    get the exceptions raised for a path which is not a git repository
+    '''
+
+    from git.exc import InvalidGitRepositoryError, NoSuchPathError
+
+    return InvalidGitRepositoryError, NoSuchPathError
+
+
+def unknown_revision_errors():
+    '''
+    get the exceptions raised for a revision which can not be resolved
+    '''
+
+    from gitdb.exc import BadName
+
+    return ValueError, BadName
+
+
+def command_error(*args):
+    '''
+    get GitCommandError, or an instance of it when arguments are given
+    '''
+
+    from git.exc import GitCommandError
+
+    return GitCommandError(*args) if args else GitCommandError
@@ -0,0 +1,646 @@
+# -*- coding: utf-8 -*-
+'''
+    Git objects database reader
+
+    read loose objects and packed objects (through the pack index fanout
+    table and a memory mapped pack file) without spawning any git process
+'''
+from __future__ import unicode_literals
+
+import binascii
+import io
+import mmap
+import os
+import struct
+import zlib
+
+from git_app_version.githandler.commit import CommitSnapshot, parse_commit
+from git_app_version.githandler.refs import read_commondir
+
+OBJ_COMMIT = 1
+OBJ_TREE = 2
+OBJ_BLOB = 3
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+
+TYPE_NAMES = {
+    OBJ_COMMIT: 'commit',
+    OBJ_TREE: 'tree',
+    OBJ_BLOB: 'blob',
+    OBJ_TAG: 'tag',
+}
+
+IDX_V2_MAGIC = b'\377tOc'
+MAX_PEEL_DEPTH = 10
+# longer delta chains are corrupted packs, e.g. a delta based on itself
+MAX_DELTA_DEPTH = 10000
+DELTA_BASE_CACHE_SIZE = 256
+READ_ERRORS = (zlib.error, struct.error, ValueError, IOError, OSError)
+
+
+def _byte(buf, pos):
+    '''
+    get a byte value as an integer (python 2 and 3 compatible)
+    '''
+
+    return struct.unpack_from(b'B', buf, pos)[0]
+
+
+def _delta_size(delta, pos):
+    '''
+    read a delta header variable length size
+    '''
+
+    size = 0
+    shift = 0
+    while True:
+        byte = delta[pos]
+        pos += 1
+        size |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return size, pos
+
+
+def apply_delta(base, delta):
+    '''
+    rebuild an object content from its base content and a git delta
+    '''
+
+    delta = bytearray(delta)
+    _, pos = _delta_size(delta, 0)
+    result_size, pos = _delta_size(delta, pos)
+
+    result = bytearray()
+    while pos < len(delta):
+        opcode = delta[pos]
+        pos += 1
+        if opcode & 0x80:
+            copy_offset = 0
+            copy_size = 0
+            for i in range(4):
+                if opcode & (1 << i):
+                    copy_offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if opcode & (0x10 << i):
+                    copy_size |= delta[pos] << (8 * i)
+                    pos += 1
+            if not copy_size:
+                copy_size = 0x10000
+            result += base[copy_offset:copy_offset + copy_size]
+        elif opcode:
+            result += delta[pos:pos + opcode]
+            pos += opcode
+        else:
+            raise ValueError('invalid delta opcode')
+
+    if len(result) != result_size:
+        raise ValueError('invalid delta result size')
+
+    return bytes(result)
+
+
+def read_alternates(objects_dir):
+    '''
+    get alternate objects directories of an objects directory
+    '''
+
+    path = os.path.join(objects_dir, 'info', 'alternates')
+    try:
+        with io.open(path, 'r', encoding='utf-8') as fpt:
+            lines = fpt.read().splitlines()
+    except (IOError, OSError):
+        return []
+
+    alternates = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if not os.path.isabs(line):
+            line = os.path.join(objects_dir, line)
+        alternates.append(os.path.normpath(line))
+
+    return alternates
+
+
+class PackIndex(object):
+    '''
+    pack index (.idx) file reader, version 1 and 2
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as fpt:
+            self._data = mmap.mmap(fpt.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._data[0:4] == IDX_V2_MAGIC:
+            self.version = struct.unpack_from(b'>I', self._data, 4)[0]
+            if self.version != 2:
+                raise ValueError('unsupported pack index version')
+            fanout_offset = 8
+        else:
+            self.version = 1
+            fanout_offset = 0
+
+        self._fanout = struct.unpack_from(b'>256I', self._data, fanout_offset)
+        self.num_objects = self._fanout[255]
+
+        table = fanout_offset + 256 * 4
+        if self.version == 2:
+            self._names = table
+            self._offsets = table + 24 * self.num_objects
+            self._large_offsets = self._offsets + 4 * self.num_objects
+        else:
+            self._names = table + 4
+            self._offsets = table
+
+    def _name(self, pos):
+        '''
+        get the binary SHA1 hash at a position of the sorted names table
+        '''
+
+        if self.version == 2:
+            start = self._names + 20 * pos
+        else:
+            start = self._names + 24 * pos
+
+        return self._data[start:start + 20]
+
+    def _offset(self, pos):
+        '''
+        get the pack offset of the object at a position
+        '''
+
+        if self.version == 1:
+            return struct.unpack_from(
+                b'>I', self._data, self._offsets + 24 * pos
+            )[0]
+
+        offset = struct.unpack_from(
+            b'>I', self._data, self._offsets + 4 * pos
+        )[0]
+        if offset & 0x80000000:
+            offset = struct.unpack_from(
+                b'>Q', self._data,
+                self._large_offsets + 8 * (offset & 0x7fffffff)
+            )[0]
+
+        return offset
+
+    def bisect(self, binsha):
+        '''
+        get the position of the first name not lower than binsha
+        '''
+
+        first = _byte(binsha, 0)
+        low = self._fanout[first - 1] if first else 0
+        high = self._fanout[first]
+
+        while low < high:
+            middle = (low + high) // 2
+            if self._name(middle) < binsha:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def find(self, binsha):
+        '''
+        get the pack offset of an object or None if it is not in the pack
+        '''
+
+        pos = self.bisect(binsha)
+        if pos < self.num_objects and self._name(pos) == binsha:
+            return self._offset(pos)
+
+        return None
+
+    def neighbors(self, binsha):
+        '''
+        get the names sorted just before and just after binsha
+        '''
+
+        pos = self.bisect(binsha)
+        names = []
+        if pos > 0:
+            names.append(self._name(pos - 1))
+        if pos < self.num_objects and self._name(pos) == binsha:
+            pos += 1
+        if pos < self.num_objects:
+            names.append(self._name(pos))
+
+        return names
+
+    def iter_names(self, binsha):
+        '''
+        yield the names not lower than binsha in order
+        '''
+
+        for pos in range(self.bisect(binsha), self.num_objects):
+            yield self._name(pos)
+
+    def close(self):
+        '''
+        release the memory map
+        '''
+
+        self._data.close()
+
+
+class Pack(object):
+    '''
+    memory mapped pack file with its index
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.index = PackIndex(path[:-len('.pack')] + '.idx')
+        with open(path, 'rb') as fpt:
+            self._data = mmap.mmap(fpt.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def entry_header(self, offset):
+        '''
+        get (type, size, data offset) of a pack entry
+        '''
+
+        byte = _byte(self._data, offset)
+        offset += 1
+        obj_type = (byte >> 4) & 7
+        size = byte & 0x0f
+        shift = 4
+        while byte & 0x80:
+            byte = _byte(self._data, offset)
+            offset += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+
+        return obj_type, size, offset
+
+    def ofs_delta_base(self, entry_offset, offset):
+        '''
+        get (base entry offset, data offset) of an OFS_DELTA entry
+        '''
+
+        byte = _byte(self._data, offset)
+        offset += 1
+        distance = byte & 0x7f
+        while byte & 0x80:
+            byte = _byte(self._data, offset)
+            offset += 1
+            distance = ((distance + 1) << 7) | (byte & 0x7f)
+
+        return entry_offset - distance, offset
+
+    def ref_delta_base(self, offset):
+        '''
+        get (base binary SHA1 hash, data offset) of a REF_DELTA entry
+        '''
+
+        return self._data[offset:offset + 20], offset + 20
+
+    def inflate(self, offset, size):
+        '''
+        decompress size bytes of zlib data starting at offset
+        '''
+
+        decompressor = zlib.decompressobj()
+        chunks = []
+        length = 0
+        chunk_size = max(size, 4096)
+        while length < size:
+            chunk = self._data[offset:offset + chunk_size]
+            if not chunk:
+                raise ValueError('truncated pack entry')
+            offset += chunk_size
+            data = decompressor.decompress(chunk)
+            chunks.append(data)
+            length += len(data)
+
+        return b''.join(chunks)[:size]
+
+    def close(self):
+        '''
+        release the memory maps
+        '''
+
+        self._data.close()
+        self.index.close()
+
+
+class ObjectReader(object):
+    '''
+    in process reader of git objects, loose or packed
+    '''
+
+    def __init__(self, git_dir):
+        objects_dir = os.path.join(read_commondir(git_dir), 'objects')
+        self.objects_dirs = [objects_dir] + read_alternates(objects_dir)
+
+        self._packs = {}
+        self._packs_keys = {}
+        self._delta_bases = {}
+
+    def _pack_list(self, refresh=False):
+        '''
+        get memory mapped packs, scanning again pack directories
+        which content has changed when refresh is set
+        '''
+
+        packs = []
+        for objects_dir in self.objects_dirs:
+            pack_dir = os.path.join(objects_dir, 'pack')
+            try:
+                key = os.stat(pack_dir).st_mtime
+            except (IOError, OSError):
+                continue
+
+            if refresh or pack_dir not in self._packs_keys:
+                if self._packs_keys.get(pack_dir) != key:
+                    self._scan_packs(pack_dir)
+                    self._packs_keys[pack_dir] = key
+
+            packs.extend(
+                pack for path, pack in sorted(self._packs.items())
+                if os.path.dirname(path) == pack_dir
+            )
+
+        return packs
+
+    def _scan_packs(self, pack_dir):
+        '''
+        open packs having both .pack and .idx files in a directory
+        '''
+
+        for entry in os.listdir(pack_dir):
+            if not entry.endswith('.pack'):
+                continue
+
+            path = os.path.join(pack_dir, entry)
+            if path in self._packs or not os.path.exists(
+                path[:-len('.pack')] + '.idx'
+            ):
+                continue
+
+            try:
+                self._packs[path] = Pack(path)
+            except READ_ERRORS:
+                continue
+
+    def _read_loose(self, hexsha):
+        '''
+        get (type, content) of a loose object or None
+        '''
+
+        for objects_dir in self.objects_dirs:
+            path = os.path.join(objects_dir, hexsha[0:2], hexsha[2:])
+            try:
+                with open(path, 'rb') as fpt:
+                    raw = zlib.decompress(fpt.read())
+            except (IOError, OSError):
+                continue
+
+            header, _, content = raw.partition(b'\0')
+            obj_type = header.split(b' ', 1)[0].decode('ascii')
+
+            return obj_type, content
+
+        return None
+
+    def _read_packed(self, binsha):
+        '''
+        get (type, content) of a packed object or None
+        '''
+
+        location = self._find_packed(binsha)
+        if location is None:
+            return None
+
+        return self._read_pack_entry(*location)
+
+    def _find_packed(self, binsha):
+        '''
+        get (pack, offset) of a packed object or None
+        '''
+
+        for refresh in (False, True):
+            for pack in self._pack_list(refresh):
+                offset = pack.index.find(binsha)
+                if offset is not None:
+                    return pack, offset
+
+        return None
+
+    def _read_pack_entry(self, pack, offset):
+        '''
+        get (type, content) of a pack entry, resolving delta chains :
+        deltas are collected down to the chain base, then applied
+        from the base up, without one stack frame per delta
+        '''
+
+        deltas = []
+        while True:
+            cache_key = (pack.path, offset)
+            if cache_key in self._delta_bases:
+                base = self._delta_bases[cache_key]
+                break
+
+            if len(deltas) > MAX_DELTA_DEPTH:
+                raise ValueError('delta chain too long')
+
+            obj_type, size, data_offset = pack.entry_header(offset)
+            if obj_type == OBJ_OFS_DELTA:
+                base_offset, data_offset = pack.ofs_delta_base(
+                    offset, data_offset
+                )
+                deltas.append((pack, offset, data_offset, size))
+                offset = base_offset
+            elif obj_type == OBJ_REF_DELTA:
+                base_binsha, data_offset = pack.ref_delta_base(data_offset)
+                deltas.append((pack, offset, data_offset, size))
+                base = self._read_loose(
+                    binascii.hexlify(base_binsha).decode('ascii')
+                )
+                location = None if base is not None \
+                    else self._find_packed(base_binsha)
+                if location is None:
+                    break
+                pack, offset = location
+            else:
+                base = TYPE_NAMES[obj_type], pack.inflate(data_offset, size)
+                break
+
+        if base is None:
+            raise ValueError('missing delta base')
+
+        for pack, offset, data_offset, size in reversed(deltas):
+            base = (
+                base[0], apply_delta(base[1], pack.inflate(data_offset, size))
+            )
+            if len(self._delta_bases) >= DELTA_BASE_CACHE_SIZE:
+                self._delta_bases.clear()
+            self._delta_bases[(pack.path, offset)] = base
+
+        return base
+
+    def _read(self, binsha):
+        '''
+        get (type, content) of an object from its binary SHA1 hash
+        '''
+
+        hexsha = binascii.hexlify(binsha).decode('ascii')
+
+        return self._read_loose(hexsha) or self._read_packed(binsha)
+
+    def read(self, hexsha):
+        '''
+        get (type, content) of an object or None if it can not be read
+        '''
+
+        try:
+            return self._read(binascii.unhexlify(hexsha))
+        except READ_ERRORS + (TypeError, KeyError):
+            return None
+
+    def peel(self, hexsha):
+        '''
+        follow annotated tags and get (SHA1 hash, type, content)
+        of the object finally targeted, or None
+        '''
+
+        for _ in range(MAX_PEEL_DEPTH):
+            obj = self.read(hexsha)
+            if obj is None:
+                return None
+
+            obj_type, content = obj
+            if obj_type != 'tag':
+                return hexsha, obj_type, content
+
+            headers, _ = parse_commit(content)
+            hexsha = headers['object'][0]
+
+        return None
+
+    def read_parents(self, hexsha):
+        '''
+        get (parents SHA1 hashes, commit timestamp) of a commit
+        or None if the commit can not be read
+        '''
+
+        obj = self.read(hexsha)
+        if obj is None or obj[0] != 'commit':
+            return None
+
+        header = obj[1].split(b'\n\n', 1)[0]
+        parents = []
+        timestamp = 0
+        for line in header.split(b'\n'):
+            if line.startswith(b'parent '):
+                parents.append(line[7:].decode('ascii'))
+            elif line.startswith(b'committer '):
+                try:
+                    timestamp = int(line.rsplit(b' ', 2)[1])
+                except (IndexError, ValueError):
+                    timestamp = 0
+
+        return tuple(parents), timestamp
+
+    def approximate_object_count(self):
+        '''
+        get the number of packed objects, as git does to size abbrev hashes
+        '''
+
+        return sum(pack.index.num_objects for pack in self._pack_list(True))
+
+    def abbrev(self, hexsha, min_length=None):
+        '''
+        get the shortest unique abbreviation of an object SHA1 hash,
+        at least min_length long or sized from the object count like git
+        '''
+
+        if min_length is None:
+            count = self.approximate_object_count()
+            min_length = max(7, (count.bit_length() + 1) // 2)
+
+        binsha = binascii.unhexlify(hexsha)
+        others = []
+        for pack in self._pack_list():
+            others.extend(
+                binascii.hexlify(name).decode('ascii')
+                for name in pack.index.neighbors(binsha)
+            )
+        for objects_dir in self.objects_dirs:
+            try:
+                entries = os.listdir(os.path.join(objects_dir, hexsha[0:2]))
+            except (IOError, OSError):
+                continue
+            others.extend(
+                hexsha[0:2] + entry for entry in entries
+                if len(entry) == 38 and entry != hexsha[2:]
+            )
+
+        length = min_length
+        for other in others:
+            common = 0
+            while common < 40 and other[common] == hexsha[common]:
+                common += 1
+            length = max(length, common + 1)
+
+        return hexsha[0:min(length, 40)]
+
+    def expand(self, prefix):
+        '''
+        get the full SHA1 hash of the only object starting with
+        an hexadecimal prefix, None when there is none or several
+        '''
+
+        prefix = prefix.lower()
+        found = set()
+        for objects_dir in self.objects_dirs:
+            try:
+                entries = os.listdir(os.path.join(objects_dir, prefix[0:2]))
+            except (IOError, OSError):
+                continue
+            found.update(
+                prefix[0:2] + entry for entry in entries
+                if len(entry) == 38 and entry.startswith(prefix[2:])
+            )
+
+        lowest = binascii.unhexlify(prefix.ljust(40, '0'))
+        for pack in self._pack_list():
+            for binsha in pack.index.iter_names(lowest):
+                name = binascii.hexlify(binsha).decode('ascii')
+                if not name.startswith(prefix) or len(found) > 1:
+                    break
+                found.add(name)
+
+        return found.pop() if len(found) == 1 else None
+
+    def read_commit(self, hexsha):
+        '''
+        get a commit snapshot, peeling annotated tags,
+        or None if the commit can not be read
+        '''
+
+        obj = self.peel(hexsha)
+        if obj is None or obj[1] != 'commit':
+            return None
+
+        try:
+            return CommitSnapshot.from_raw(obj[0], obj[2])
+        except (KeyError, IndexError):
+            return None
+
+    def close(self):
+        '''
+        release all memory mapped packs
+        '''
+
+        for pack in self._packs.values():
+            pack.close()
+        self._packs = {}
+        self._packs_keys = {}
+        self._delta_bases = {}
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+'''
+    Git references database reader
+
+    read loose and packed references directly from the git directory
+    without spawning any git process
+'''
+from __future__ import unicode_literals
+
+import hashlib
+import io
+import os
+import re
+
+SYMREF_PREFIX = 'ref: '
+MAX_SYMREF_DEPTH = 5
+
+# references stored in the worktree git directory instead of the common one
+PER_WORKTREE_PREFIXES = ('refs/bisect/', 'refs/worktree/', 'refs/rewritten/')
+
+# rev-parse lookup rules, see `git help revisions`
+REV_PARSE_RULES = (
+    '{}', 'refs/{}', 'refs/tags/{}', 'refs/heads/{}', 'refs/remotes/{}',
+    'refs/remotes/{}/HEAD'
+)
+
+REGEX_SHA1 = re.compile(r'^[0-9a-f]{40}$')
+# top level names read by the '{}' rule : HEAD, FETCH_HEAD, ORIG_HEAD ...
+# other files of the git directory (config, description) are not references
+REGEX_PSEUDO_REF = re.compile(r'^[A-Z_]+$')
+
+
+def read_commondir(git_dir):
+    '''
+    get the common git directory of a (linked worktree) git directory
+    '''
+
+    path = os.path.join(git_dir, 'commondir')
+    try:
+        with io.open(path, 'r', encoding='utf-8') as fpt:
+            common_dir = fpt.read().strip()
+    except (IOError, OSError):
+        return git_dir
+
+    if not os.path.isabs(common_dir):
+        common_dir = os.path.join(git_dir, common_dir)
+
+    return os.path.normpath(common_dir)
+
+
+def _stat_key(path):
+    '''
+    get a cheap signature of a file state or None if it does not exist
+    '''
+
+    try:
+        stat = os.stat(path)
+    except (IOError, OSError):
+        return None
+
+    return (stat.st_mtime, stat.st_size, stat.st_ino)
+
+
+class RefDatabase(object):
+    '''
+    in process reader of packed-refs and loose refs files
+
+    every file read is kept in memory and only read again
+    when its mtime, size or inode has changed
+    '''
+
+    def __init__(self, git_dir):
+        self.git_dir = os.path.abspath(git_dir)
+        self.common_dir = read_commondir(self.git_dir)
+
+        self._packed_key = None
+        self._packed = {}
+        self._peeled = {}
+        self._dirs = {}
+        self._files = {}
+
+    def _ref_path(self, name):
+        '''
+        get the loose file path of a reference
+        '''
+
+        base_dir = self.common_dir
+        if not name.startswith('refs/') or name.startswith(
+            PER_WORKTREE_PREFIXES
+        ):
+            base_dir = self.git_dir
+
+        return os.path.join(base_dir, *name.split('/'))
+
+    def _load_packed_refs(self):
+        '''
+        parse packed-refs file if it has changed
+        '''
+
+        path = os.path.join(self.common_dir, 'packed-refs')
+        key = _stat_key(path)
+        if key == self._packed_key:
+            return
+
+        packed = {}
+        peeled = {}
+        if key is not None:
+            last_name = None
+            with io.open(path, 'r', encoding='utf-8') as fpt:
+                for line in fpt:
+                    line = line.rstrip('\n')
+                    if not line or line.startswith('#'):
+                        continue
+                    if line.startswith('^'):
+                        if last_name is not None:
+                            peeled[last_name] = line[1:]
+                        continue
+
+                    hexsha, last_name = line.split(' ', 1)
+                    packed[last_name] = hexsha
+
+        self._packed = packed
+        self._peeled = peeled
+        self._packed_key = key
+
+    def _read_loose(self, name):
+        '''
+        read a loose reference file content, None if it does not exist
+        '''
+
+        path = self._ref_path(name)
+        key = _stat_key(path)
+        if key is None:
+            self._files.pop(path, None)
+            return None
+
+        cached = self._files.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        try:
+            with io.open(path, 'r', encoding='utf-8') as fpt:
+                content = fpt.read().strip()
+        except (IOError, OSError):
+            return None
+
+        self._files[path] = (key, content)
+
+        return content
+
+    def _list_loose(self, base_dir, prefix):
+        '''
+        list loose reference names below a directory
+        '''
+
+        names = []
+        path = os.path.join(base_dir, *prefix.rstrip('/').split('/'))
+        key = _stat_key(path)
+        if key is None:
+            return names
+
+        cached = self._dirs.get(path)
+        if cached is not None and cached[0] == key:
+            entries = cached[1]
+        else:
+            entries = []
+            for entry in sorted(os.listdir(path)):
+                if entry.endswith('.lock'):
+                    continue
+                entries.append(
+                    (entry, os.path.isdir(os.path.join(path, entry)))
+                )
+            self._dirs[path] = (key, entries)
+
+        for entry, is_dir in entries:
+            name = prefix + entry
+            if is_dir:
+                names.extend(self._list_loose(base_dir, name + '/'))
+            else:
+                names.append(name)
+
+        return names
+
+    def read_ref(self, name):
+        '''
+        get raw reference value : a SHA1 hash, a 'ref: <target>' string
+        or None if the reference does not exist
+        '''
+
+        content = self._read_loose(name)
+        if content is not None:
+            return content
+
+        if name.startswith('refs/'):
+            self._load_packed_refs()
+            return self._packed.get(name)
+
+        return None
+
+    def is_symbolic(self, name):
+        '''
+        check if a reference is a symbolic reference
+        '''
+
+        value = self.read_ref(name)
+
+        return value is not None and value.startswith(SYMREF_PREFIX)
+
+    def resolve(self, name):
+        '''
+        get the SHA1 hash targeted by a reference, following symbolic refs,
+        None when the reference does not hold a SHA1 hash
+        '''
+
+        for _ in range(MAX_SYMREF_DEPTH):
+            value = self.read_ref(name)
+            if value is None:
+                return None
+
+            if not value.startswith(SYMREF_PREFIX):
+                return value if REGEX_SHA1.match(value) else None
+
+            name = value[len(SYMREF_PREFIX):].strip()
+
+        return None
+
+    def resolve_revision(self, rev):
+        '''
+        get the SHA1 hash of a full SHA1 hash or a reference short name
+
+        return None for any other revision syntax
+        '''
+
+        if REGEX_SHA1.match(rev):
+            return rev
+
+        for rule in REV_PARSE_RULES:
+            if rule == '{}' and not rev.startswith('refs/') \
+                    and not REGEX_PSEUDO_REF.match(rev):
+                continue
+            hexsha = self.resolve(rule.format(rev))
+            if hexsha is not None:
+                return hexsha
+
+        return None
+
+    def head(self):
+        '''
+        get HEAD commit SHA1 hash
+        '''
+
+        return self.resolve('HEAD')
+
+    def peeled(self, name):
+        '''
+        get the peeled SHA1 hash of a tag from packed-refs if known
+        '''
+
+        self._load_packed_refs()
+
+        return self._peeled.get(name)
+
+    def list_refs(self, prefix='refs/', symbolic=True):
+        '''
+        get all references starting with prefix and their SHA1 hash
+        sorted by name
+        '''
+
+        self._load_packed_refs()
+
+        names = set(name for name in self._packed if name.startswith(prefix))
+        base_dir = self.git_dir if prefix.startswith(
+            PER_WORKTREE_PREFIXES
+        ) else self.common_dir
+        names.update(self._list_loose(base_dir, prefix))
+
+        refs = []
+        for name in sorted(names):
+            if not symbolic and self.is_symbolic(name):
+                continue
+            hexsha = self.resolve(name)
+            if hexsha is not None:
+                refs.append((name, hexsha))
+
+        return refs
+
+    def fingerprint(self, prefix='refs/'):
+        '''
+        get a hash of packed-refs and loose references files state
+        below prefix, changing whenever one of these references may change
+        '''
+
+        base_dir = self.git_dir if prefix.startswith(
+            PER_WORKTREE_PREFIXES
+        ) else self.common_dir
+
+        state = [
+            ('packed-refs',
+             _stat_key(os.path.join(self.common_dir, 'packed-refs')))
+        ]
+        for name in self._list_loose(base_dir, prefix):
+            state.append((name, _stat_key(self._ref_path(name))))
+
+        return hashlib.sha1(repr(state).encode('utf-8')).hexdigest()
+
+    def branches(self):
+        '''
+        get local branches and their SHA1 hash
+        '''
+
+        return self._short_refs('refs/heads/')
+
+    def remote_branches(self, symbolic=True):
+        '''
+        get remote branches and their SHA1 hash
+        '''
+
+        return self._short_refs('refs/remotes/', symbolic)
+
+    def tags(self):
+        '''
+        get tags and the SHA1 hash of the object they point to
+        '''
+
+        return self._short_refs('refs/tags/')
+
+    def _short_refs(self, prefix, symbolic=True):
+        '''
+        get references as a dict with names stripped of prefix
+        '''
+
+        return dict(
+            (name[len(prefix):], hexsha)
+            for name, hexsha in self.list_refs(prefix, symbolic)
+        )
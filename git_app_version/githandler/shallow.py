@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+'''
+    Version and branches of shallow clones
+
+    history walks are pointless or misleading in a shallow clone,
+    version and branches are read from cheap sources instead :
+    tags pointing at the commit, CI environment variables and FETCH_HEAD
+'''
+from __future__ import unicode_literals
+
+import io
+import os
+import re
+
+SOURCE_TAG = 'tag'
+SOURCE_ENV = 'env'
+SOURCE_FETCH_HEAD = 'fetch_head'
+SOURCE_REFS = 'refs'
+SOURCE_ABBREV = 'abbrev_commit'
+SOURCE_NONE = 'none'
+
+DEFAULT_REMOTE = 'origin'
+
+# (commit, tag, branch) environment variables set by CI services,
+# values may be full references like refs/heads/<branch>
+CI_VARIABLES = (
+    ('GITHUB_SHA', 'GITHUB_REF', 'GITHUB_REF'),  # GitHub Actions
+    ('CI_COMMIT_SHA', 'CI_COMMIT_TAG', 'CI_COMMIT_BRANCH'),  # GitLab CI
+    ('TRAVIS_COMMIT', 'TRAVIS_TAG', 'TRAVIS_BRANCH'),  # Travis CI
+    ('CIRCLE_SHA1', 'CIRCLE_TAG', 'CIRCLE_BRANCH'),  # CircleCI
+    ('BUILDKITE_COMMIT', 'BUILDKITE_TAG', 'BUILDKITE_BRANCH'),  # Buildkite
+    ('BITBUCKET_COMMIT', 'BITBUCKET_TAG', 'BITBUCKET_BRANCH'),  # Bitbucket
+    ('DRONE_COMMIT_SHA', 'DRONE_TAG', 'DRONE_BRANCH'),  # Drone
+    ('BUILD_SOURCEVERSION', 'BUILD_SOURCEBRANCH',
+     'BUILD_SOURCEBRANCH'),  # Azure Pipelines
+    ('GIT_COMMIT', 'TAG_NAME', 'GIT_BRANCH'),  # Jenkins
+)
+
+REGEX_FETCH_HEAD = re.compile(
+    r'^([0-9a-f]{40})\t(not-for-merge)?\t(branch|tag) \'(.+)\' of (.+)$'
+)
+
+
+def is_shallow(common_dir):
+    '''
+    check if a repository is a shallow clone
+    '''
+
+    return os.path.exists(os.path.join(common_dir, 'shallow'))
+
+
+def read_fetch_head(git_dir):
+    '''
+    read FETCH_HEAD branches and tags : [(object, kind, name)],
+    kind being 'branch' or 'tag',
+    annotated tags objects are not peeled
+    '''
+
+    try:
+        with io.open(
+            os.path.join(git_dir, 'FETCH_HEAD'), encoding='utf-8'
+        ) as fpt:
+            lines = fpt.read().splitlines()
+    except (IOError, OSError):
+        return []
+
+    entries = []
+    for line in lines:
+        match = REGEX_FETCH_HEAD.match(line)
+        if match:
+            entries.append((match.group(1), match.group(3), match.group(4)))
+
+    return entries
+
+
+def _short_ref(value, prefix):
+    '''
+    get a short name from a full reference, None if it has another prefix
+    '''
+
+    if value.startswith('refs/'):
+        if not value.startswith(prefix):
+            return None
+        return value[len(prefix):]
+
+    return value
+
+
+class ShallowResolver(object):
+    '''
+    get version and remote branches of a commit without walking history
+
+    each result is a (value, source) tuple
+    '''
+
+    def __init__(self, refs, describer, environ=None):
+        self.refs = refs
+        self.describer = describer
+        self.environ = os.environ if environ is None else environ
+        self._results = {}
+        self._state = None
+
+    def _memo(self):
+        '''
+        get the memoized results, dropped when references or FETCH_HEAD
+        changed, e.g. after a fetch in a long lived handler
+        '''
+
+        try:
+            fetch_head = os.stat(os.path.join(self.refs.git_dir, 'FETCH_HEAD'))
+            fetch_head = (
+                fetch_head.st_mtime, fetch_head.st_size, fetch_head.st_ino
+            )
+        except (IOError, OSError):
+            fetch_head = None
+
+        state = (self.refs.fingerprint('refs/'), fetch_head)
+        if state != self._state:
+            self._state = state
+            self._results = {}
+
+        return self._results
+
+    def _ci_values(self, hexsha, index):
+        '''
+        get CI environment variable values describing the commit
+        '''
+
+        values = []
+        for variables in CI_VARIABLES:
+            value = self.environ.get(variables[index], '').strip()
+            commit = self.environ.get(variables[0], '').strip()
+            if value and (not commit or commit == hexsha):
+                values.append(value)
+
+        return values
+
+    def _ci_tags(self, hexsha):
+        '''
+        get tag names given by CI environment variables
+        '''
+
+        return [
+            name for name in (
+                _short_ref(value, 'refs/tags/')
+                for value in self._ci_values(hexsha, 1)
+            ) if name
+        ]
+
+    def version(self, hexsha, abbrev_commit):
+        '''
+        get (version, source) of a commit :
+        a tag pointing at it, a CI tag, a FETCH_HEAD tag
+        or the abbrev commit
+        '''
+
+        results = self._memo()
+        key = ('version', hexsha)
+        if key in results:
+            return results[key]
+
+        result = (abbrev_commit, SOURCE_ABBREV)
+
+        tags = self.describer.tag_index()
+        if hexsha in tags:
+            result = (tags[hexsha][0], SOURCE_TAG)
+        else:
+            ci_tags = self._ci_tags(hexsha)
+            fetched = [
+                name for name, commit in self._fetched(hexsha, 'tag')
+            ]
+            if ci_tags:
+                result = (ci_tags[0], SOURCE_ENV)
+            elif fetched:
+                result = (fetched[0], SOURCE_FETCH_HEAD)
+
+        results[key] = result
+
+        return result
+
+    def branches(self, hexsha):
+        '''
+        get (remote branches, source) of a commit :
+        remote branches pointing at it, CI branches or FETCH_HEAD branches
+
+        branches without a remote prefix get the 'origin/' prefix
+        '''
+
+        results = self._memo()
+        key = ('branches', hexsha)
+        if key in results:
+            return results[key]
+
+        remote_refs = self.refs.remote_branches(symbolic=False)
+        result = (
+            sorted(
+                name for name, commit in remote_refs.items()
+                if commit == hexsha
+            ), SOURCE_REFS
+        )
+
+        if not result[0]:
+            # some services set the branch variable to the tag name
+            ci_tags = self._ci_tags(hexsha)
+            ci_branches = self._remote_names(
+                name for name in (
+                    _short_ref(value, 'refs/heads/')
+                    for value in self._ci_values(hexsha, 2)
+                ) if name not in ci_tags
+            )
+            fetched = self._remote_names(
+                name for name, _ in self._fetched(hexsha, 'branch')
+            )
+            if ci_branches:
+                result = (ci_branches, SOURCE_ENV)
+            elif fetched:
+                result = (fetched, SOURCE_FETCH_HEAD)
+            else:
+                result = ([], SOURCE_NONE)
+
+        results[key] = result
+
+        return result
+
+    def _fetched(self, hexsha, kind):
+        '''
+        get FETCH_HEAD (name, commit) entries of a kind pointing at a commit
+        '''
+
+        entries = []
+        for target, entry_kind, name in read_fetch_head(self.refs.git_dir):
+            if entry_kind != kind:
+                continue
+            if target != hexsha and kind == 'tag':
+                peeled = self.describer.objects.peel(target)
+                target = peeled[0] if peeled is not None else None
+            if target == hexsha:
+                entries.append((name, target))
+
+        return entries
+
+    def _remote_names(self, names):
+        '''
+        prefix branch names with the default remote, remove duplicates
+        '''
+
+        remotes = set(
+            name.split('/', 1)[0]
+            for name in self.refs.remote_branches(symbolic=False)
+        )
+        remotes.add(DEFAULT_REMOTE)
+
+        branches = []
+        for name in names:
+            if not name:
+                continue
+            if name.split('/', 1)[0] not in remotes or '/' not in name:
+                name = '{}/{}'.format(DEFAULT_REMOTE, name)
+            if name not in branches:
+                branches.append(name)
+
+        return sorted(branches)
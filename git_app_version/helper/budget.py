@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+    time budget helpers
+"""
+from __future__ import unicode_literals
+
+from timeit import default_timer
+
+
+class BudgetExceeded(Exception):
+    '''
+    an operation ran over its time budget
+    '''
+
+
+class Budget(object):
+    '''
+    time budget shared by the operations of a run,
+    a None timeout never runs out
+    '''
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.start = default_timer()
+
+    def elapsed(self):
+        '''
+        get seconds since the budget started
+        '''
+
+        return default_timer() - self.start
+
+    def remaining(self):
+        '''
+        get seconds left, None without timeout
+        '''
+
+        if self.timeout is None:
+            return None
+
+        return max(self.timeout - self.elapsed(), 0.0)
+
+    def expired(self):
+        '''
+        check if the budget ran out
+        '''
+
+        return self.timeout is not None and self.elapsed() >= self.timeout
+
+    def check(self):
+        '''
+        raise BudgetExceeded when the budget ran out
+        '''
+
+        if self.expired():
+            raise BudgetExceeded(
+                u'time budget of {}s exceeded'.format(self.timeout)
+            )
@@ -6,11 +6,13 @@
 """
 from __future__ import unicode_literals
 
+import re
 from datetime import datetime
 
-import iso8601
 import pytz
 
+REGEX_TIMESTAMP = re.compile(r'^\s*-?\d+\s*$')
+
 
 def utcnow():
     """
@@ -23,6 +25,8 @@ def datetime_from_iso8601(isodate, utc=False):
     """
         convert ISO 8601 date string to datetime
     """
+    import iso8601
+
     try:
         date = iso8601.parse_date(isodate)
         if utc:
@@ -33,13 +37,34 @@ def datetime_from_iso8601(isodate, utc=False):
         return None
 
 
+def datetime_from_timestamp(timestamp):
+    """
+        convert timestamp to UTC datetime
+    """
+    try:
+        return datetime.fromtimestamp(int(timestamp), pytz.utc)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def datetime_from_string(value):
+    """
+        convert a timestamp or an ISO 8601 date string to UTC datetime,
+        dates without time zone are UTC
+    """
+    if REGEX_TIMESTAMP.match(value):
+        return datetime_from_timestamp(value)
+
+    return datetime_from_iso8601(value, utc=True)
+
+
 def iso8601_from_datetime(date):
     """
         convert datetime to ISO 8601 date string
     """
     try:
         return date.strftime('%Y-%m-%dT%H:%M:%S%z')
-    except (AttributeError, iso8601.ParseError):
+    except AttributeError:
         return ''
 
 
@@ -50,5 +75,5 @@ def timestamp_from_datetime(date):
     try:
         utc_date = date.replace(tzinfo=None) - date.utcoffset()
         return str(int((utc_date - datetime(1970, 1, 1)).total_seconds()))
-    except (AttributeError, iso8601.ParseError):
+    except AttributeError:
         return ''
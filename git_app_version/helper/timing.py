@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+    timing helpers
+"""
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer
+
+KIND_PHASE = 'phase'
+KIND_GIT = 'git'
+KIND_DUMP = 'dump'
+
+
+class Timings(object):
+    '''
+    collect durations of named operations : phases of GitHandler.get_infos,
+    git commands with their arguments and file dumps
+    '''
+
+    def __init__(self):
+        self.records = []
+
+    def add(self, kind, name, seconds):
+        '''
+        record a duration in seconds
+        '''
+
+        self.records.append((kind, name, seconds))
+
+    @contextmanager
+    def measure(self, kind, name):
+        '''
+        record the duration of a with block
+        '''
+
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.add(kind, name, default_timer() - start)
+
+    def phase(self, name):
+        '''
+        record the duration of a phase
+        '''
+
+        return self.measure(KIND_PHASE, name)
+
+    def command(self, argv):
+        '''
+        record the duration of a git command
+        '''
+
+        return self.measure(KIND_GIT, ' '.join(argv))
+
+    def dump(self, fileformat):
+        '''
+        record the duration of a file dump
+        '''
+
+        return self.measure(KIND_DUMP, fileformat)
+
+    def extend(self, records):
+        '''
+        add records collected elsewhere, e.g. in another process
+        '''
+
+        self.records.extend(tuple(record) for record in records)
+
+    def summary(self):
+        '''
+        get [(kind, name, calls, total seconds)] in first call order
+        '''
+
+        totals = OrderedDict()
+        for kind, name, seconds in self.records:
+            calls, total = totals.get((kind, name), (0, 0.0))
+            totals[(kind, name)] = (calls + 1, total + seconds)
+
+        return [
+            (kind, name, calls, total)
+            for (kind, name), (calls, total) in totals.items()
+        ]
+
+    def as_dict(self):
+        '''
+        get a JSON serializable report
+        '''
+
+        return {
+            'records': [
+                {'kind': kind, 'name': name, 'seconds': seconds}
+                for kind, name, seconds in self.records
+            ],
+            'summary': [
+                {'kind': kind, 'name': name, 'calls': calls, 'seconds': total}
+                for kind, name, calls, total in self.summary()
+            ],
+        }
+
+
+class NullTimings(Timings):
+    '''
+    timings which record nothing, used when profiling is disabled
+    '''
+
+    def add(self, kind, name, seconds):
+        pass
+
+    @contextmanager
+    def measure(self, kind, name):
+        yield
+
+
+NULL_TIMINGS = NullTimings()
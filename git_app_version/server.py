@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+'''
+    `git-app-version serve` daemon
+
+    GitHandler instances, with their reference, object, tag and commit-graph
+    indexes, are kept warm per repository and JSON requests are answered
+    over a Unix domain socket, one JSON line per request and per response
+'''
+from __future__ import unicode_literals
+
+import json
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from git_app_version import client
+from git_app_version.fanout import NOT_GIT_REPOSITORY, collect_infos
+from git_app_version.githandler import BACKEND_GITPYTHON, GitHandler
+from git_app_version.githandler.errors import not_repository_errors
+
+try:
+    import socketserver
+except ImportError:  # pragma: no cover
+    import SocketServer as socketserver
+
+MAX_HANDLERS = 32
+POLL_INTERVAL = 0.5
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    '''
+    read one JSON request line and write one JSON response line
+    '''
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            response = self.server.dispatch(json.loads(line.decode('utf-8')))
+        except ValueError as exc:
+            response = {'error': u'invalid request : {}'.format(exc)}
+
+        self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+
+
+class VersionServer(socketserver.ThreadingMixIn,
+                    socketserver.UnixStreamServer):
+    '''
+    threaded Unix socket server keeping one GitHandler per repository,
+    requests on the same repository are serialized
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, idle_timeout=None):
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.last_request = time.time()
+        self.stopped = False
+        self._handlers = OrderedDict()
+        self._lock = threading.Lock()
+
+        remove_stale_socket(socket_path)
+        # the socket is created by bind() : only the user can ever connect
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(
+                self, socket_path, RequestHandler
+            )
+        finally:
+            os.umask(umask)
+
+    def get_handler(
+        self,
+        repository,
+        cache=False,
+        cache_size=256,
+        backend=BACKEND_GITPYTHON
+    ):
+        '''
+        get a warm (GitHandler, lock) of a repository,
+        least recently used handlers are dropped
+        '''
+
+        key = (repository, bool(cache), cache_size, backend)
+        evicted = []
+        with self._lock:
+            if key in self._handlers:
+                item = self._handlers.pop(key)
+            else:
+                item = (
+                    GitHandler(
+                        repository,
+                        cache=cache,
+                        cache_size=cache_size,
+                        backend=backend
+                    ),
+                    threading.Lock()
+                )
+            self._handlers[key] = item
+            while len(self._handlers) > MAX_HANDLERS:
+                evicted.append(self._handlers.popitem(last=False)[1])
+
+        # dropped handlers may still be answering a request
+        for handler, lock in evicted:
+            with lock:
+                handler.close()
+
+        return item
+
+    def dispatch(self, request):
+        '''
+        answer a request : ping, shutdown or collect
+        '''
+
+        self.last_request = time.time()
+        command = request.get('command', 'collect')
+
+        if command == 'ping':
+            return {'pong': True, 'pid': os.getpid()}
+
+        if command == 'shutdown':
+            self.stopped = True
+            return {'stopped': True}
+
+        if command != 'collect':
+            return {'error': u'unknown command {}'.format(command)}
+
+        repository = request.get('repository') or ''
+        try:
+            handler, lock = self.get_handler(
+                repository,
+                cache=request.get('cache', False),
+                cache_size=request.get('cache_size', 256),
+                backend=request.get('backend') or BACKEND_GITPYTHON
+            )
+            with lock:
+                # answers depend on the client environment, not the daemon one
+                handler.environ = request.get('environ') or {}
+                results = collect_infos(
+                    handler, request.get('commits'), request.get('fields'),
+                    request.get('time_budget'), request.get('deploy_date')
+                )
+        except not_repository_errors():
+            return {'error': NOT_GIT_REPOSITORY.format(repository)}
+        except Exception as exc:  # pylint: disable=broad-except
+            # the daemon must survive a broken request
+            return {'error': u'{}: {}'.format(repository, exc)}
+
+        return {'results': results}
+
+    def idle(self):
+        '''
+        check if no request was received for idle_timeout seconds
+        '''
+
+        return bool(self.idle_timeout) and (
+            time.time() - self.last_request > self.idle_timeout
+        )
+
+    def serve_until_stopped(self):
+        '''
+        handle requests until a shutdown request or the idle timeout
+        '''
+
+        self.timeout = POLL_INTERVAL
+        try:
+            while not self.stopped and not self.idle():
+                self.handle_request()
+        finally:
+            self.server_close()
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def remove_stale_socket(socket_path):
+    '''
+    remove the socket file of a dead daemon,
+    raise socket.error if a daemon is still running
+    '''
+
+    if not os.path.exists(socket_path):
+        return
+
+    if client.ping(socket_path, timeout=1.0):
+        raise socket.error(
+            u'a daemon is already listening on {}'.format(socket_path)
+        )
+
+    os.unlink(socket_path)
+
+
+def serve(socket_path=None, idle_timeout=None):
+    '''
+    run the daemon until a shutdown request or the idle timeout
+    '''
+
+    server = VersionServer(
+        socket_path or client.default_socket_path(), idle_timeout
+    )
+    server.serve_until_stopped()
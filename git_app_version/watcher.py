@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+'''
+    Watch HEAD and references of a git repository
+
+    inotify is used through ctypes on Linux, imported on first use,
+    other systems fall back to polling file states
+'''
+from __future__ import unicode_literals
+
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+from git_app_version.githandler.refs import read_commondir
+
+DEFAULT_DEBOUNCE = 0.5
+DEFAULT_POLL_INTERVAL = 1.0
+# bursts of changes (e.g. a rebase) delay a regeneration at most this factor
+# of the debounce delay
+MAX_DEBOUNCE_FACTOR = 20
+
+HEAD_FILES = ('HEAD', 'ORIG_HEAD')
+COMMON_FILES = ('packed-refs', )
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+    | IN_DELETE | IN_DELETE_SELF
+)
+
+EVENT_HEADER = struct.Struct(str('iIII'))
+
+
+def watched_files(git_dir):
+    '''
+    get {directory: file names} of watched files : HEAD and ORIG_HEAD
+    of the (worktree) git dir, and packed-refs of the common dir,
+    and the refs directory
+    '''
+
+    git_dir = os.path.abspath(git_dir)
+    common_dir = read_commondir(git_dir)
+
+    files = {git_dir: set(HEAD_FILES)}
+    files.setdefault(common_dir, set()).update(COMMON_FILES)
+
+    return files, os.path.join(common_dir, 'refs')
+
+
+class PollingWatcher(object):
+    '''
+    detect changes by comparing file states every poll interval
+    '''
+
+    def __init__(self, git_dir, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.files, self.refs_dir = watched_files(git_dir)
+        self.poll_interval = poll_interval
+        self._state = self.state()
+
+    def state(self):
+        '''
+        get (path, mtime, size) of every watched file
+        '''
+
+        paths = [
+            os.path.join(directory, name)
+            for directory, names in self.files.items() for name in names
+        ]
+        for root, dirs, names in os.walk(self.refs_dir):
+            dirs.sort()
+            paths.extend(
+                os.path.join(root, name) for name in names
+                if not name.endswith('.lock')
+            )
+
+        state = []
+        for path in sorted(paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            state.append((path, stat.st_mtime, stat.st_size, stat.st_ino))
+
+        return state
+
+    def wait(self, timeout):
+        '''
+        wait for a change, return False when nothing changed before timeout
+        '''
+
+        deadline = time.time() + timeout
+        while True:
+            state = self.state()
+            if state != self._state:
+                self._state = state
+                return True
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+    def close(self):
+        '''
+        release resources
+        '''
+
+
+class InotifyWatcher(object):
+    '''
+    detect changes with Linux inotify,
+    new directories in refs are watched as they are created
+    '''
+
+    def __init__(self, git_dir, libc=None):
+        self.files, self.refs_dir = watched_files(git_dir)
+        self._libc = libc or load_libc()
+        self._watches = {}
+
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(get_errno(), 'inotify_init1 failed')
+
+        try:
+            for directory in self.files:
+                self._add_watch(directory)
+            self._add_tree(self.refs_dir)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(
+            self.fd, directory.encode(sys.getfilesystemencoding()),
+            WATCH_MASK
+        )
+        if wd < 0:
+            code = get_errno()
+            if code == errno.ENOENT:
+                return
+            raise OSError(code, 'inotify_add_watch failed', directory)
+
+        self._watches[wd] = directory
+
+    def _add_tree(self, directory):
+        for root, dirs, _ in os.walk(directory):
+            dirs.sort()
+            self._add_watch(root)
+
+    def _relevant(self, wd, mask, name):
+        '''
+        check if an event is a watched file change
+        '''
+
+        if mask & IN_Q_OVERFLOW:
+            return True
+
+        directory = self._watches.get(wd)
+        if directory is None or mask & IN_IGNORED:
+            return False
+
+        path = os.path.join(directory, name) if name else directory
+        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            self._add_tree(path)
+            return True
+
+        if directory == self.refs_dir or directory.startswith(
+            self.refs_dir + os.sep
+        ):
+            return not name.endswith('.lock')
+
+        return name in self.files.get(directory, ())
+
+    def _read_events(self):
+        try:
+            data = os.read(self.fd, 65536)
+        except OSError as exc:
+            if exc.errno in (errno.EAGAIN, errno.EINTR):
+                return False
+            raise
+
+        changed = False
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(
+                sys.getfilesystemencoding()
+            )
+            offset += length
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            changed = self._relevant(wd, mask, name) or changed
+
+        return changed
+
+    def wait(self, timeout):
+        '''
+        wait for a change, return False when nothing changed before timeout
+        '''
+
+        deadline = time.time() + timeout
+        while True:
+            remaining = max(deadline - time.time(), 0)
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if readable and self._read_events():
+                return True
+            if time.time() >= deadline:
+                return False
+
+    def close(self):
+        '''
+        close the inotify file descriptor
+        '''
+
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def get_errno():
+    '''
+    get errno of the last C library call
+    '''
+
+    import ctypes
+
+    return ctypes.get_errno()
+
+
+def load_libc():
+    '''
+    load the C library with inotify functions,
+    raise OSError when inotify is unavailable
+    '''
+
+    if not sys.platform.startswith('linux'):
+        raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+
+    import ctypes
+    import ctypes.util
+
+    libc = ctypes.CDLL(
+        ctypes.util.find_library('c') or 'libc.so.6', use_errno=True
+    )
+    if not hasattr(libc, 'inotify_init1'):
+        raise OSError(errno.ENOSYS, 'inotify is unavailable')
+
+    return libc
+
+
+def create_watcher(
+    git_dir, poll_interval=DEFAULT_POLL_INTERVAL, inotify=True
+):
+    '''
+    get an inotify watcher, or a polling watcher when inotify is
+    unavailable or not wanted
+    '''
+
+    if inotify:
+        try:
+            return InotifyWatcher(git_dir)
+        except (OSError, AttributeError):
+            pass
+
+    return PollingWatcher(git_dir, poll_interval)
+
+
+def report_error(exc):
+    '''
+    write a callback failure on standard error
+    '''
+
+    sys.stderr.write('{}\n'.format(exc))
+
+
+def watch(
+    watcher, callback, debounce=DEFAULT_DEBOUNCE, stop=None,
+    on_error=report_error
+):
+    '''
+    call callback after each change, once a burst of changes settled
+    for debounce seconds
+
+    stop is an optional threading.Event ending the loop,
+    callback failures, e.g. HEAD read in the middle of a rebase,
+    are given to on_error and watching goes on
+    '''
+
+    while stop is None or not stop.is_set():
+        if not watcher.wait(DEFAULT_POLL_INTERVAL):
+            continue
+
+        deadline = time.time() + debounce * MAX_DEBOUNCE_FACTOR
+        while time.time() < deadline and watcher.wait(debounce):
+            pass
+
+        try:
+            callback()
+        except Exception as exc:  # pylint: disable=broad-except
+            on_error(exc)
@@ -131,7 +131,7 @@ setup(
     # pip to create the appropriate form of executable for the target platform.
     entry_points={
         'console_scripts': [
-            'git-app-version=git_app_version.__main__:dump',
+            'git-app-version=git_app_version.__main__:cli',
         ],
     },
 )
@@ -82,6 +82,18 @@ def default_init(version='0.1.2',
     init a empty git repository with basic config and create 2 commit and 1 tag fixture
     '''
     repo = init(email=email, username=username, repo_dir=repo_dir)
+
+    return default_commits(repo, version=version, author=author, date=date,
+                           tag_date=tag_date)
+
+
+def default_commits(repo, version='0.1.2',
+                    author='User Test <user@example.com>',
+                    date='2016-11-20T12:41:30+0000',
+                    tag_date='2016-11-20T12:42:30+0000'):
+    '''
+    create the 2 commits and 1 tag fixture of default_init in a repository
+    '''
     commit(repo=repo, message='initial commit', author=author, date=date)
     tag(repo=repo, version=version, author=author, date=tag_date)
 
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+from test_helpers import git_utils
+
+collect_ignore = []
+if sys.version_info < (3, 5):
+    # asyncio coroutines need the async / await syntax
+    collect_ignore.append('githandler/test_aio.py')
+
+
+@pytest.fixture()
+def git_repo(tmpdir_factory):
+    '''
+    empty repository, the current directory during the test,
+    modules override it to add their history
+    '''
+    cwd = os.getcwd()
+    new_cwd_path = str(tmpdir_factory.mktemp('git_repo'))
+    os.chdir(new_cwd_path)
+
+    yield git_utils.init(repo_dir=new_cwd_path)
+    os.chdir(cwd)
+
+
+@pytest.fixture()
+def git_repo_local(tmpdir_factory, git_repo_remote):
+    '''
+    clone of the git_repo_remote fixture of the module,
+    the current directory during the test
+    '''
+    cwd = os.getcwd()
+    new_cwd_path = str(tmpdir_factory.mktemp('git_repo_local'))
+    os.chdir(new_cwd_path)
+
+    yield git_utils.clone(git_repo_remote, new_cwd_path)
+    os.chdir(cwd)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import pytest
+import pytz
+from mock import patch
+
+from git_app_version.githandler import GitHandler
+from git_app_version.githandler.aio import AsyncGitHandler, get_infos
+from git_app_version.helper.budget import Budget, BudgetExceeded
+from test_helpers import git_utils
+
+
+@pytest.fixture()
+def git_repo_remote(git_repo):
+    repo = git_repo
+    git_utils.commit(repo, message='commit 1')
+    git_utils.tag(repo, 'v0.1.2')
+    git_utils.branch(repo, 'release', 'master')
+    git_utils.commit(repo, message='commit 2')
+
+    return repo
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@patch('git_app_version.helper.date.datetime')
+@pytest.mark.parametrize('backend', ['gitpython', 'subprocess', 'python'])
+@pytest.mark.parametrize('in_process', [True, False])
+def test_get_infos_same_as_sync(mock_dt, git_repo_local, in_process, backend):
+    mock_dt.now.return_value = pytz.utc.localize(datetime(2016, 12, 20))
+    expected = GitHandler(git_repo_local.working_dir).get_infos()
+
+    handler = AsyncGitHandler(git_repo_local.working_dir, backend=backend)
+    if not in_process:
+        git_repo_local.git.commit_graph('write', '--reachable')
+        handler.handler.describe_in_process = lambda commit, budget=None: None
+        handler.handler.containing_in_process = lambda *args: None
+
+    assert run(handler.get_infos()) == expected
+    assert expected['branches'] == ['master']
+    assert get_infos(git_repo_local.working_dir) == expected
+
+
+def test_get_version_and_branches(git_repo_local):
+    handler = AsyncGitHandler(git_repo_local.working_dir)
+    handler.handler.describe_in_process = lambda commit, budget=None: None
+
+    assert run(handler.get_version('HEAD~1')) == 'v0.1.2'
+    assert run(handler.get_version('unknown', default='foo')) == 'foo'
+    assert run(handler.get_branches('unknown')) == []
+
+
+def test_in_process_calls_leave_the_loop(git_repo_local):
+    handler = AsyncGitHandler(git_repo_local.working_dir, backend='python')
+    threads = []
+    get_version = handler.handler.get_version
+
+    def record_thread(*args):
+        threads.append(threading.current_thread())
+        return get_version(*args)
+
+    handler.handler.get_version = record_thread
+
+    assert run(handler.get_version('HEAD~1')) == 'v0.1.2'
+    assert threads and threads[0] is not threading.current_thread()
+    handler.close()
+
+
+def test_handler_used_by_one_thread(git_repo_local):
+    handler = AsyncGitHandler(git_repo_local.working_dir)
+    handler.handler.describe_in_process = lambda commit, budget=None: None
+    threads = set()
+
+    def record_thread(method):
+        def wrapper(*args, **kwargs):
+            threads.add(threading.current_thread())
+            return method(*args, **kwargs)
+        return wrapper
+
+    for name in (
+        'get_commit', 'get_deploy_date', 'get_cached_infos',
+        'shallow_resolver', 'containing_in_process', 'parse_containing',
+        'build_cached_infos', 'format_infos'
+    ):
+        setattr(
+            handler.handler, name,
+            record_thread(getattr(handler.handler, name))
+        )
+
+    assert run(handler.get_infos())['branches'] == ['master']
+    assert len(threads) == 1
+    assert threading.current_thread() not in threads
+    handler.close()
+
+
+def test_queries_run_concurrently(git_repo_local):
+    handler = AsyncGitHandler(git_repo_local.working_dir)
+    handler.handler.describe_in_process = lambda commit, budget=None: None
+    handler.handler.containing_in_process = lambda *args: None
+
+    async def slow_git(*args, **kwargs):
+        await asyncio.sleep(0.3)
+        return 0, 'refs/remotes/origin/master\n' \
+            if args[0] == 'for-each-ref' else 'v1.0\n'
+
+    handler._git = slow_git
+
+    start = time.time()
+    infos = run(handler.get_infos())
+
+    assert time.time() - start < 0.55
+    assert infos['version'] == 'v1.0'
+    assert infos['branches'] == ['master']
+
+
+def test_sync_get_infos_runs_git_concurrently(git_repo_local):
+    handler = GitHandler(git_repo_local.working_dir)
+    handler.describe_in_process = lambda commit, budget=None: None
+    handler.containing_in_process = lambda *args: None
+
+    async def slow_git(self, *args, **kwargs):
+        await asyncio.sleep(0.3)
+        return 0, 'refs/remotes/origin/master\n' \
+            if args[0] == 'for-each-ref' else 'v1.0\n'
+
+    with patch.object(AsyncGitHandler, '_git', slow_git):
+        start = time.time()
+        infos = handler.get_infos()
+
+        assert time.time() - start < 0.55
+        assert infos['version'] == 'v1.0'
+        assert infos['branches'] == ['master']
+
+        # in an event loop, the git commands run one after the other
+        async def in_loop():
+            return handler.get_infos(fields=['version', 'branches'])
+
+        infos = run(in_loop())
+        assert infos['version'].startswith('v0.1.2-1-g')
+        assert infos['branches'] == ['master']
+
+
+def test_get_infos_fields(git_repo_local):
+    handler = AsyncGitHandler(git_repo_local.working_dir)
+
+    async def forbidden_git(*args, **kwargs):
+        raise AssertionError('git must not run')
+
+    handler._git = forbidden_git
+    handler.handler.containing_in_process = lambda *args: None
+
+    infos = run(handler.get_infos(fields=['version']))
+    assert list(infos) == ['version']
+    assert infos['version'].startswith('v0.1.2-1-g')
+
+
+def test_git_killed_by_budget(git_repo_local):
+    handler = AsyncGitHandler(git_repo_local.working_dir)
+
+    start = time.time()
+    with pytest.raises(BudgetExceeded):
+        run(handler._git('-c', 'alias.slow=!sleep 5', 'slow',
+                         budget=Budget(0.2)))
+    assert time.time() - start < 2
+
+
+def test_get_infos_time_budget(git_repo_local):
+    handler = AsyncGitHandler(git_repo_local.working_dir)
+    handler.handler.containing_in_process = lambda *args: None
+
+    async def slow_git(*args, **kwargs):
+        await asyncio.sleep(0.5)
+        kwargs['budget'].check()
+        return 0, 'origin/master\n'
+
+    handler._git = slow_git
+
+    infos = run(handler.get_infos(time_budget=0.2))
+    assert infos['version'].startswith('v0.1.2-1-g')
+    assert infos['branches'] == []
+    assert 'branches_source' not in infos
+    assert infos['degraded_fields'] == ['branches', 'top_branches']
+
+    infos = run(handler.get_infos(
+        fields=['branches_source'], time_budget=0.2
+    ))
+    assert infos == {
+        'branches_source': 'timeout',
+        'degraded_fields': ['branches_source'],
+    }
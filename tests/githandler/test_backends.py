@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import time
+
+import pytest
+from git.exc import InvalidGitRepositoryError, NoSuchPathError
+from mock import patch
+
+from git_app_version.githandler import GitHandler
+from git_app_version.githandler.backends import (
+    PurePythonBackend, SubprocessBackend, create_backend, find_git_dir,
+    read_config_value, run_git
+)
+from git_app_version.helper.budget import Budget, BudgetExceeded
+from test_helpers import git_utils
+
+
+@pytest.fixture()
+def git_repo(git_repo):
+    repo = git_repo
+    git_utils.commit(repo, message='commit 1')
+    git_utils.tag(repo, 'v0.1.2')
+    git_utils.commit(repo, message='commit 2')
+    git_utils.branch(repo, 'feature', 'HEAD~1')
+    git_utils.commit(repo, message='commit 3')
+
+    return repo
+
+
+def test_find_git_dir(git_repo, tmpdir):
+    git_dir = os.path.realpath(git_repo.git_dir)
+    assert os.path.realpath(find_git_dir(git_repo.working_dir)) == git_dir
+    assert os.path.realpath(find_git_dir(git_repo.git_dir)) == git_dir
+
+    worktree = str(tmpdir.join('worktree'))
+    git_repo.git.worktree('add', worktree, 'feature')
+    assert os.path.realpath(find_git_dir(worktree)) == os.path.realpath(
+        os.path.join(git_dir, 'worktrees', 'worktree')
+    )
+
+    # parent directories are not searched, like GitPython
+    os.mkdir(os.path.join(git_repo.working_dir, 'sub'))
+    with pytest.raises(InvalidGitRepositoryError):
+        find_git_dir(os.path.join(git_repo.working_dir, 'sub'))
+    with pytest.raises(NoSuchPathError):
+        find_git_dir(str(tmpdir.join('missing')))
+
+
+def test_read_config_value(tmpdir):
+    first = tmpdir.join('first')
+    first.write('[core]\n\tabbrev = 8\n[user]\n\tname = test\n')
+    second = tmpdir.join('second')
+    second.write(
+        '# comment\n[Core]\n  Abbrev = "12" ; twelve\n  bare\n'
+        '[core "sub"]\n\tabbrev = 20\n'
+    )
+    paths = [str(first), str(second), str(tmpdir.join('missing'))]
+
+    assert read_config_value(paths[0:1], 'core', 'abbrev') == '8'
+    assert read_config_value(paths, 'core', 'abbrev') == '12'
+    assert read_config_value(paths, 'core', 'bare') is True
+    assert read_config_value(paths, 'core', 'other', 'auto') == 'auto'
+
+
+def test_config_value(git_repo):
+    git_repo.git.config('core.abbrev', '9')
+
+    for backend in ('gitpython', 'subprocess', 'python'):
+        handler = GitHandler(git_repo.working_dir, backend=backend)
+        assert str(handler.backend.config_value('core', 'abbrev')) == '9'
+        assert handler.get_version('HEAD~1') == 'v0.1.2-1-g' + \
+            git_repo.commit('HEAD~1').hexsha[0:9]
+
+
+@pytest.mark.parametrize('rev', [
+    'HEAD', 'HEAD~0', 'HEAD~2', 'HEAD^', 'HEAD^^', 'HEAD^0', 'master~1^',
+    'v0.1.2^{commit}', 'v0.1.2^{}~0', '@~1', 'feature',
+    'refs/heads/feature'
+])
+def test_python_resolve(git_repo, rev):
+    backend = PurePythonBackend(git_repo.working_dir)
+
+    assert backend.resolve(rev) == git_repo.git.rev_parse(rev + '^{commit}')
+
+
+def test_python_resolve_abbrev(git_repo):
+    hexsha = git_repo.commit('HEAD~1').hexsha
+    backend = PurePythonBackend(git_repo.working_dir)
+
+    assert backend.resolve(hexsha[0:7]) == hexsha
+    assert backend.resolve(hexsha[0:7] + '~1') == \
+        git_repo.commit('HEAD~2').hexsha
+    assert backend.resolve('HEAD~4') is None
+    assert backend.resolve('HEAD^2') is None
+    assert backend.resolve('HEAD@{1}') is None
+    assert backend.resolve('unknown') is None
+
+
+def test_python_never_forks(git_repo):
+    expected = GitHandler(git_repo.working_dir).get_infos(
+        'HEAD~1', fields=['version', 'branches', 'local_branches']
+    )
+    handler = GitHandler(git_repo.working_dir, backend='python')
+    # without commit-graph and tag index fast paths
+    handler.describe_in_process = lambda commit, budget=None: None
+
+    with patch('subprocess.Popen') as mock_popen:
+        assert handler.get_infos(
+            'HEAD~1', fields=['version', 'branches', 'local_branches']
+        ) == expected
+        assert list(handler.get_commits(['HEAD~1', 'unknown']))[1] == \
+            ('unknown', None)
+        assert mock_popen.call_count == 0
+
+
+def test_create_backend_auto(git_repo):
+    backend = create_backend(git_repo.working_dir, 'auto')
+    assert isinstance(backend, SubprocessBackend)
+
+    git_repo.git.commit_graph('write', '--reachable')
+    backend = create_backend(git_repo.working_dir, 'auto')
+    assert isinstance(backend, PurePythonBackend)
+
+    git_repo.git.replace('HEAD~1', 'HEAD~2')
+    backend = create_backend(git_repo.working_dir, 'auto')
+    assert isinstance(backend, SubprocessBackend)
+
+    with pytest.raises(ValueError):
+        create_backend(git_repo.working_dir, 'dulwich')
+
+
+def test_run_git_killed_by_budget(git_repo):
+    assert run_git(git_repo.git_dir, ['rev-parse', 'HEAD'], Budget(60)) == (
+        0, git_repo.commit('HEAD').hexsha + '\n'
+    )
+
+    start = time.time()
+    with pytest.raises(BudgetExceeded):
+        run_git(
+            git_repo.git_dir, ['-c', 'alias.slow=!sleep 5', 'slow'],
+            Budget(0.2)
+        )
+    assert time.time() - start < 2
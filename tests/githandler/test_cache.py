@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import time
+
+from git_app_version.githandler.cache import ResultCache
+
+
+def test_get_set(tmpdir):
+    cache = ResultCache(str(tmpdir.join('cache')))
+    key = ResultCache.make_key('abc', 'def')
+
+    assert cache.get(key) is None
+
+    cache.set(key, {'version': 'v1.0', 'branches': ['master']})
+    assert cache.get(key) == {'version': 'v1.0', 'branches': ['master']}
+    assert key != ResultCache.make_key('ab', 'cdef')
+
+
+def test_lru_eviction(tmpdir):
+    cache = ResultCache(str(tmpdir), max_entries=2)
+
+    cache.set('a', 1)
+    cache.set('b', 2)
+    past = time.time() - 60
+    os.utime(str(tmpdir.join('a.json')), (past, past - 10))
+    os.utime(str(tmpdir.join('b.json')), (past, past))
+
+    # 'a' becomes the most recently used entry
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_clear(tmpdir):
+    cache = ResultCache(str(tmpdir))
+    cache.set('a', 1)
+    cache.clear()
+
+    assert cache.get('a') is None
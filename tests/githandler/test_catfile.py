@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import threading
+import time
+
+import pytest
+from mock import patch
+
+from git_app_version.githandler.catfile import CatFile, CatFilePool
+from test_helpers import git_utils
+
+
+@pytest.fixture()
+def git_repo(git_repo):
+    return git_utils.default_commits(git_repo)
+
+
+def test_batch(git_repo):
+    head = git_repo.commit('HEAD')
+
+    with CatFile(git_repo.git_dir) as catfile:
+        hexsha, obj_type, content = catfile.request('HEAD')
+        assert hexsha == head.hexsha
+        assert obj_type == 'commit'
+        assert content.startswith(b'tree ' + head.tree.hexsha.encode())
+
+        assert catfile.read_commit('0.1.2')[0] == head.hexsha
+        assert catfile.read_commit('HEAD~1')[0] == head.parents[0].hexsha
+        assert catfile.read_commit('HEAD^{tree}') is None
+        assert catfile.request('unknown') is None
+        assert catfile.request('foo\nbar') is None
+        assert catfile.request('foo bar') is None
+        assert catfile.read_commit('foo bar baz') is None
+        assert catfile.read_commit('HEAD')[0] == head.hexsha
+        assert catfile.alive()
+
+    assert not catfile.alive()
+
+
+def test_batch_check(git_repo):
+    with CatFile(git_repo.git_dir, check=True) as catfile:
+        hexsha, obj_type, size = catfile.request('0.1.2')
+        assert hexsha == git_repo.tags[0].tag.hexsha
+        assert obj_type == 'tag'
+        assert size > 0
+
+
+def test_pool_reuse(git_repo):
+    pool = CatFilePool()
+    head = git_repo.commit('HEAD').hexsha
+
+    with pool.worker(git_repo.git_dir) as first:
+        assert first.read_commit('HEAD')[0] == head
+        assert pool.size() == (1, 0)
+    assert pool.size() == (0, 1)
+
+    with pool.worker(git_repo.git_dir) as second:
+        assert second is first
+    with pool.worker(git_repo.git_dir, check=True) as check:
+        assert check is not first
+    assert pool.size() == (0, 2)
+
+    pool.close()
+    assert pool.size() == (0, 0)
+    assert not first.alive()
+
+
+def test_pool_broken_worker(git_repo):
+    pool = CatFilePool()
+
+    with pytest.raises(RuntimeError):
+        with pool.worker(git_repo.git_dir) as catfile:
+            catfile._pending = True
+            raise RuntimeError()
+
+    assert pool.size() == (0, 0)
+    assert not catfile.alive()
+
+
+def test_pool_bounded(tmpdir_factory, git_repo):
+    other = git_utils.default_init(
+        repo_dir=str(tmpdir_factory.mktemp('other'))
+    )
+    pool = CatFilePool(max_workers=1)
+
+    with pool.worker(git_repo.git_dir) as first:
+        pass
+    # the idle worker of another repository is stopped
+    with pool.worker(other.git_dir) as second:
+        assert not first.alive()
+        assert second.alive()
+        assert pool.size() == (1, 0)
+
+        acquired = threading.Event()
+
+        def borrow():
+            with pool.worker(git_repo.git_dir):
+                acquired.set()
+
+        thread = threading.Thread(target=borrow)
+        thread.start()
+        assert not acquired.wait(0.2)
+
+    thread.join(5)
+    assert acquired.is_set()
+    assert pool.size() == (0, 1)
+    pool.close()
+
+
+def test_pool_reap(git_repo):
+    pool = CatFilePool(idle_timeout=0.1)
+
+    with pool.worker(git_repo.git_dir) as catfile:
+        pass
+    pool.reap()
+    assert pool.size() == (0, 1)
+
+    deadline = time.time() + 5
+    while pool.size() != (0, 0) and time.time() < deadline:
+        time.sleep(0.05)
+    assert pool.size() == (0, 0)
+    assert not catfile.alive()
+
+
+def test_pool_after_fork(git_repo):
+    pool = CatFilePool()
+
+    with pool.worker(git_repo.git_dir) as catfile:
+        pass
+    with patch('os.getpid', return_value=-1):
+        pool.after_fork()
+    assert pool.size() == (0, 0)
+    # the parent process keeps its workers
+    assert catfile.alive()
+    catfile.close()
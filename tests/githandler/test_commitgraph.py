@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import random
+import subprocess
+
+import pytest
+
+from git_app_version.githandler.commitgraph import CommitGraph, reachable_tips
+from git_app_version.githandler.objects import ObjectReader
+from git_app_version.githandler.refs import RefDatabase
+from test_helpers import git_utils
+
+
+@pytest.fixture()
+def git_repo(git_repo):
+    '''
+    random history with merges, every local branch is also a remote branch
+    '''
+    rand = random.Random(42)
+    repo = git_repo
+    git_utils.commit(repo, message='c0')
+    branches = ['master']
+    for i in range(1, 60):
+        repo.git.checkout(rand.choice(branches))
+        other = rand.choice(branches)
+        if rand.random() < 0.2 and other != repo.active_branch.name:
+            repo.git.merge('--no-ff', '-q', '-m', 'm{}'.format(i), other)
+        else:
+            git_utils.commit(repo, message='c{}'.format(i))
+        if rand.random() < 0.15:
+            branches.append('b{}'.format(i))
+            git_utils.branch(repo, branches[-1])
+
+    # octopus merge, stored in the EDGE chunk
+    repo.git.checkout('master')
+    for name in ('x', 'y', 'z'):
+        git_utils.branch(repo, name, 'master')
+        repo.git.checkout(name)
+        git_utils.commit(repo, message=name)
+        repo.git.checkout('master')
+    repo.git.merge('--no-ff', '-q', '-m', 'octopus', 'x', 'y', 'z')
+    assert len(repo.commit('master').parents) == 4
+
+    for branch in branches:
+        repo.git.update_ref(
+            'refs/remotes/origin/' + branch, 'refs/heads/' + branch
+        )
+
+    return repo
+
+
+def assert_same_as_git(repo, graph):
+    objects = ObjectReader(repo.git_dir)
+    tips = RefDatabase(repo.git_dir).remote_branches(symbolic=False)
+
+    for hexsha in repo.git.rev_list('--all').splitlines():
+        expected = [
+            line.strip() for line in repo.git.branch(
+                '--no-color', '--remote', '--contains=' + hexsha
+            ).splitlines()
+        ]
+        assert reachable_tips(graph, objects, hexsha, tips) == expected
+
+
+def test_no_commit_graph(git_repo):
+    assert CommitGraph.open(git_repo.git_dir) is None
+
+
+def test_reachable_tips(git_repo):
+    git_repo.git.commit_graph('write', '--reachable')
+    graph = CommitGraph.open(git_repo.git_dir)
+
+    assert graph.num_commits == len(git_repo.git.rev_list('--all').split())
+    assert graph.has_generations()
+
+    assert_same_as_git(git_repo, graph)
+
+
+def test_reachable_tips_split_graph(git_repo):
+    base = subprocess.Popen(
+        ['git', 'commit-graph', 'write', '--stdin-commits', '--split'],
+        cwd=git_repo.working_dir,
+        stdin=subprocess.PIPE
+    )
+    base.communicate(git_repo.commit('master~3').hexsha.encode('ascii'))
+    git_repo.git.commit_graph('write', '--reachable', '--split=no-merge')
+
+    graph = CommitGraph.open(git_repo.git_dir)
+    assert len(graph.files) == 2
+
+    assert_same_as_git(git_repo, graph)
+
+
+def test_reachable_tips_with_commits_missing_from_graph(git_repo):
+    git_repo.git.commit_graph('write', '--reachable')
+    for i in range(3):
+        git_utils.commit(git_repo, message='new {}'.format(i))
+    git_repo.git.update_ref('refs/remotes/origin/new', 'HEAD')
+
+    graph = CommitGraph.open(git_repo.git_dir)
+    assert graph.lookup(git_repo.commit('HEAD').hexsha) is None
+
+    assert_same_as_git(git_repo, graph)
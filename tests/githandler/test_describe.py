@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+
+import pytest
+from mock import patch
+
+from git_app_version.githandler.describe import CACHE_FILENAME, Describer
+from git_app_version.githandler.objects import ObjectReader
+from git_app_version.githandler.refs import RefDatabase
+from test_helpers import git_utils
+
+
+@pytest.fixture()
+def git_repo(git_repo):
+    '''
+    history with merges, annotated and lightweight tags
+
+    master  : c1 - c2(v1.0) - c3 ------ m1 - c6(v2.0, v2.0-light) - c7
+    feature :        \\- c4(f1) - c5 -/
+    '''
+    repo = git_repo
+    dates = iter(
+        '2017-01-{:02d}T10:00:00+0000'.format(day) for day in range(1, 20)
+    )
+
+    git_utils.commit(repo, message='c1', date=next(dates))
+    git_utils.commit(repo, message='c2', date=next(dates))
+    repo.create_tag('v1.0', message='v1.0')
+    git_utils.branch(repo, 'feature', 'master')
+    git_utils.commit(repo, message='c3', date=next(dates))
+    repo.git.checkout('feature')
+    git_utils.commit(repo, message='c4', date=next(dates))
+    repo.create_tag('f1')
+    git_utils.commit(repo, message='c5', date=next(dates))
+    repo.git.checkout('master')
+    repo.git.merge('--no-ff', '-m', 'm1', 'feature')
+    git_utils.commit(repo, message='c6', date=next(dates))
+    repo.create_tag('v2.0-light')
+    repo.create_tag('v2.0', message='v2.0')
+    git_utils.commit(repo, message='c7', date=next(dates))
+
+    return repo
+
+
+def get_describer(repo, cache_dir=None):
+    return Describer(
+        RefDatabase(repo.git_dir),
+        ObjectReader(repo.git_dir),
+        cache_dir=cache_dir
+    )
+
+
+def assert_same_as_git(repo, describer):
+    for hexsha in repo.git.rev_list('--all').splitlines():
+        expected = repo.git.describe('--tags', '--always', hexsha)
+        assert describer.describe(hexsha) == expected
+
+
+@pytest.mark.parametrize('packed', [False, True])
+def test_describe_same_as_git(git_repo, packed):
+    if packed:
+        git_repo.git.gc('--quiet')
+
+    assert_same_as_git(git_repo, get_describer(git_repo))
+
+
+def test_describe_without_tags(tmpdir):
+    repo = git_utils.init(repo_dir=str(tmpdir))
+    commit = git_utils.commit(repo, message='c1')
+
+    assert get_describer(repo).describe(commit.hexsha) == \
+        repo.git.describe('--tags', '--always', commit.hexsha)
+
+
+def test_describe_walk_limit(git_repo):
+    describer = get_describer(git_repo)
+    describer.max_walk = 1
+
+    assert describer.describe(git_repo.commit('HEAD').hexsha) is None
+    assert describer.describe(git_repo.commit('HEAD~1').hexsha) == 'v2.0'
+
+
+def test_describe_shallow_is_left_to_git(git_repo):
+    describer = get_describer(git_repo)
+    with open(os.path.join(git_repo.git_dir, 'shallow'), 'w') as fpt:
+        fpt.write(git_repo.commit('HEAD~2').hexsha + '\n')
+
+    assert describer.describe(git_repo.commit('HEAD').hexsha) is None
+
+
+def test_tag_index_cache(git_repo, tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    hexsha = git_repo.commit('HEAD').hexsha
+
+    assert get_describer(git_repo, cache_dir).describe(hexsha) == \
+        git_repo.git.describe('--tags', '--always', hexsha)
+    assert os.path.exists(os.path.join(cache_dir, CACHE_FILENAME))
+
+    describer = get_describer(git_repo, cache_dir)
+    with patch.object(describer, '_build_tag_index') as mock_build:
+        describer.tag_index()
+        assert mock_build.call_count == 0
+
+    git_repo.create_tag('v3.0', message='v3.0')
+    describer = get_describer(git_repo, cache_dir)
+    assert describer.describe(hexsha) == 'v3.0'
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from git_app_version.githandler.commit import CommitSnapshot
+from git_app_version.githandler.objects import ObjectReader, apply_delta
+from test_helpers import git_utils
+
+
+@pytest.fixture()
+def git_repo(git_repo):
+    repo = git_repo
+    git_utils.commit(
+        repo,
+        message='commit 1\n\nwith a body',
+        author='Sébastien Dupond <seb@example.com>',
+        date='2016-12-10T00:33:33-05:30'
+    )
+    git_utils.tag(repo, 'v0.1.2')
+
+    return repo
+
+
+def commit_file(repo, name, content, message):
+    with open(os.path.join(repo.working_dir, name), 'w') as fpt:
+        fpt.write(content)
+    repo.index.add([name])
+    repo.index.commit(message)
+
+
+@pytest.mark.parametrize('packed', [False, True])
+def test_read_commit(git_repo, packed):
+    if packed:
+        git_repo.git.gc('--quiet')
+
+    reader = ObjectReader(git_repo.git_dir)
+
+    for rev in ('HEAD', 'HEAD~1'):
+        commit = git_repo.commit(rev)
+        snapshot = reader.read_commit(commit.hexsha)
+        assert snapshot == CommitSnapshot.from_commit(commit)
+        assert snapshot.authored_datetime.utcoffset() == \
+            commit.authored_datetime.utcoffset()
+
+    assert reader.read_commit('0' * 40) is None
+    reader.close()
+
+
+@pytest.mark.parametrize('packed', [False, True])
+def test_peel_annotated_tag(git_repo, packed):
+    if packed:
+        git_repo.git.gc('--quiet')
+
+    reader = ObjectReader(git_repo.git_dir)
+    tag = git_repo.tags[0].tag
+
+    assert reader.read(tag.hexsha)[0] == 'tag'
+    assert reader.read_commit(tag.hexsha).hexsha == \
+        git_repo.commit('HEAD').hexsha
+
+
+def test_read_deltified_objects(git_repo):
+    lines = ['line {}\n'.format(i) for i in range(2000)]
+    for i in range(5):
+        lines[i * 100] = 'changed {}\n'.format(i)
+        commit_file(git_repo, 'file.txt', ''.join(lines), 'edit {}'.format(i))
+    git_repo.git.gc('--quiet', '--aggressive')
+
+    verify = git_repo.git.verify_pack(
+        '-v',
+        os.path.join(
+            git_repo.git_dir, 'objects', 'pack',
+            [
+                name for name in os.listdir(
+                    os.path.join(git_repo.git_dir, 'objects', 'pack')
+                ) if name.endswith('.idx')
+            ][0]
+        )
+    )
+    deltified = [
+        line.split()[0] for line in verify.splitlines()
+        if len(line.split()) == 7 and line.split()[1] == 'blob'
+    ]
+    assert deltified
+
+    reader = ObjectReader(git_repo.git_dir)
+    for hexsha in deltified:
+        obj_type, content = reader.read(hexsha)
+        assert obj_type == 'blob'
+        assert content == git_repo.odb.stream(
+            bytes(bytearray.fromhex(hexsha))
+        ).read()
+
+
+def test_read_deep_delta_chain(git_repo, tmpdir):
+    lines = ['line {} of the file\n'.format(i) for i in range(400)]
+    paths = []
+    for i in range(200):
+        # each version is closest to the previous one : a long delta chain
+        lines[i] = 'changed {}\n'.format(i)
+        paths.append(str(tmpdir.join('version{}'.format(i))))
+        with open(paths[-1], 'w') as fpt:
+            fpt.write(''.join(lines))
+    hexshas = git_repo.git.hash_object('-w', *paths).split()
+
+    pack_dir = os.path.join(git_repo.git_dir, 'objects', 'pack')
+    process = subprocess.Popen(
+        [
+            'git', '--git-dir', git_repo.git_dir, 'pack-objects', '-q',
+            '--depth=1000', '--window=1000', os.path.join(pack_dir, 'pack')
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE
+    )
+    process.communicate('\n'.join(hexshas).encode('ascii'))
+    assert process.returncode == 0
+    git_repo.git.prune_packed()
+    verify = git_repo.git.verify_pack('-v', os.path.join(pack_dir, [
+        name for name in os.listdir(pack_dir) if name.endswith('.idx')
+    ][0]))
+    depth, hexsha = max(
+        (int(line.split()[5]), line.split()[0])
+        for line in verify.splitlines() if len(line.split()) == 7
+    )
+    assert depth > 50
+
+    frame, frames = sys._getframe(), 0
+    while frame is not None:
+        frame, frames = frame.f_back, frames + 1
+    limit = sys.getrecursionlimit()
+    # the chain is deeper than the stack frames left
+    sys.setrecursionlimit(frames + 40)
+    try:
+        obj_type, content = ObjectReader(git_repo.git_dir).read(hexsha)
+    finally:
+        sys.setrecursionlimit(limit)
+
+    assert obj_type == 'blob'
+    assert content == git_repo.odb.stream(
+        bytes(bytearray.fromhex(hexsha))
+    ).read()
+
+
+@pytest.mark.parametrize('packed', [False, True])
+def test_expand(git_repo, packed):
+    if packed:
+        git_repo.git.gc('--quiet')
+    hexsha = git_repo.commit('HEAD').hexsha
+
+    reader = ObjectReader(git_repo.git_dir)
+
+    assert reader.expand(hexsha[0:7]) == hexsha
+    assert reader.expand(hexsha[0:7].upper()) == hexsha
+    assert reader.expand(hexsha) == hexsha
+    assert reader.expand('0000000') is None
+    # every object starts with one of these
+    assert reader.expand('') is None
+    reader.close()
+
+
+def test_apply_delta():
+    base = b'hello world'
+    # source size 11, target size 11, copy 6 bytes from 0, insert 'there'
+    delta = b'\x0b\x0b\x90\x06\x05there'
+
+    assert apply_delta(base, delta) == b'hello there'
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import subprocess
+
+import pytest
+
+from git_app_version.githandler.refs import RefDatabase, read_commondir
+from test_helpers import git_utils
+
+
+@pytest.fixture()
+def git_repo_remote(git_repo):
+    repo = git_repo
+    git_utils.commit(repo, message='commit 1')
+    git_utils.tag(repo, 'v0.1.2')
+    git_utils.branch(repo, 'release', 'master')
+    git_utils.commit(repo, message='commit 2')
+
+    return repo
+
+
+def test_packed_and_symbolic_refs(git_repo_local):
+    refs = RefDatabase(git_repo_local.git_dir)
+    head = git_repo_local.commit('HEAD').hexsha
+    release = git_repo_local.commit('origin/release').hexsha
+
+    assert refs.head() == head
+    assert refs.remote_branches() == {
+        'origin/HEAD': head,
+        'origin/master': head,
+        'origin/release': release
+    }
+    assert refs.remote_branches(symbolic=False) == {
+        'origin/master': head,
+        'origin/release': release
+    }
+    assert refs.is_symbolic('refs/remotes/origin/HEAD')
+    assert refs.branches() == {'master': head}
+    assert refs.tags() == {'v0.1.2': git_repo_local.tags[0].tag.hexsha}
+    assert refs.peeled('refs/tags/v0.1.2') == release
+
+
+def test_resolve_revision(git_repo_local):
+    refs = RefDatabase(git_repo_local.git_dir)
+    head = git_repo_local.commit('HEAD').hexsha
+    release = git_repo_local.commit('origin/release').hexsha
+
+    assert refs.resolve_revision('HEAD') == head
+    assert refs.resolve_revision('master') == head
+    assert refs.resolve_revision('origin/release') == release
+    assert refs.resolve_revision('origin') == head
+    assert refs.resolve_revision(head) == head
+    assert refs.resolve_revision('HEAD~1') is None
+    assert refs.resolve_revision('unknown') is None
+
+
+def test_resolve_revision_git_dir_files(git_repo_local):
+    release = git_repo_local.commit('origin/release').hexsha
+    git_utils.branch(git_repo_local, 'description', 'origin/release')
+    refs = RefDatabase(git_repo_local.git_dir)
+
+    assert refs.resolve_revision('description') == release
+    assert refs.resolve_revision('config') is None
+    assert refs.resolve('config') is None
+
+
+def test_loose_refs_are_reloaded(git_repo_local):
+    refs = RefDatabase(git_repo_local.git_dir)
+    release = git_repo_local.commit('origin/release').hexsha
+
+    assert refs.branches() == {'master': refs.head()}
+
+    git_utils.branch(git_repo_local, 'feature/foo', 'origin/release')
+    assert refs.branches()['feature/foo'] == release
+
+    git_repo_local.git.update_ref('refs/heads/feature/foo', 'HEAD')
+    assert refs.resolve('refs/heads/feature/foo') == refs.head()
+
+    git_repo_local.git.pack_refs('--all')
+    assert refs.branches()['feature/foo'] == refs.head()
+
+
+def test_detached_head(git_repo_local):
+    refs = RefDatabase(git_repo_local.git_dir)
+    release = git_repo_local.commit('origin/release').hexsha
+
+    git_repo_local.git.checkout(release)
+
+    assert not refs.is_symbolic('HEAD')
+    assert refs.head() == release
+
+
+def test_worktree(git_repo_local, tmpdir):
+    worktree_path = str(tmpdir.join('worktree'))
+    subprocess.check_call(
+        ['git', 'worktree', 'add', '-q', worktree_path, 'origin/release'],
+        cwd=git_repo_local.working_dir
+    )
+    git_dir = os.path.join(git_repo_local.git_dir, 'worktrees', 'worktree')
+
+    assert read_commondir(git_dir) == os.path.normpath(
+        git_repo_local.git_dir
+    )
+
+    refs = RefDatabase(git_dir)
+    assert refs.head() == git_repo_local.commit('origin/release').hexsha
+    assert refs.branches() == {'master': git_repo_local.commit('HEAD').hexsha}
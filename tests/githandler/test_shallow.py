@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+
+import pytest
+from git import Repo
+from mock import patch
+
+from git_app_version.githandler import GitHandler
+from git_app_version.githandler.describe import Describer
+from git_app_version.githandler.objects import ObjectReader
+from git_app_version.githandler.refs import RefDatabase
+from git_app_version.githandler.shallow import (
+    ShallowResolver, is_shallow, read_fetch_head
+)
+from test_helpers import git_utils
+
+
+@pytest.fixture()
+def git_repo_remote(git_repo):
+    '''
+    master  : c1 - c2(v1.0) - c3
+    release :        \\- c4
+    '''
+    repo = git_repo
+    git_utils.commit(repo, message='c1')
+    git_utils.commit(repo, message='c2')
+    repo.create_tag('v1.0', message='v1.0')
+    git_utils.branch(repo, 'release', 'master')
+    git_utils.commit(repo, message='c3')
+    repo.git.checkout('release')
+    git_utils.commit(repo, message='c4')
+    repo.git.checkout('master')
+
+    return repo
+
+
+def shallow_clone(remote, path, *args):
+    Repo.clone_from(
+        'file://' + remote.working_dir, path, multi_options=list(args),
+        depth=1, no_tags=True
+    )
+    return Repo(path)
+
+
+@pytest.fixture()
+def git_repo_shallow(tmpdir_factory, git_repo_remote):
+    return shallow_clone(
+        git_repo_remote, str(tmpdir_factory.mktemp('git_repo_shallow'))
+    )
+
+
+def resolver(repo, environ=None):
+    refs = RefDatabase(repo.git_dir)
+    describer = Describer(refs, ObjectReader(repo.git_dir))
+
+    return ShallowResolver(refs, describer, environ=environ or {})
+
+
+def test_is_shallow(git_repo_remote, git_repo_shallow):
+    assert not is_shallow(git_repo_remote.git_dir)
+    assert is_shallow(git_repo_shallow.git_dir)
+
+
+def test_read_fetch_head(git_repo_shallow, git_repo_remote):
+    git_repo_shallow.git.fetch(
+        '--depth=1', 'origin', 'release', 'tag', 'v1.0'
+    )
+
+    assert sorted(read_fetch_head(git_repo_shallow.git_dir)) == sorted([
+        (git_repo_remote.commit('release').hexsha, 'branch', 'release'),
+        (git_repo_remote.git.rev_parse('v1.0'), 'tag', 'v1.0'),
+    ])
+    assert read_fetch_head(git_repo_remote.git_dir) == []
+
+
+def test_version_from_tag(git_repo_remote, tmpdir):
+    repo = shallow_clone(git_repo_remote, str(tmpdir), '--branch=v1.0')
+    hexsha = repo.commit('HEAD').hexsha
+
+    assert resolver(repo).version(hexsha, hexsha[0:7]) == ('v1.0', 'tag')
+
+
+@pytest.mark.parametrize(
+    'environ,expected', [
+        ({}, (None, 'abbrev_commit')),
+        ({'CI_COMMIT_TAG': 'v2.0'}, ('v2.0', 'env')),
+        ({'GITHUB_REF': 'refs/tags/v2.0'}, ('v2.0', 'env')),
+        ({'GITHUB_REF': 'refs/heads/master'}, (None, 'abbrev_commit')),
+        ({'TRAVIS_TAG': 'v2.0', 'TRAVIS_COMMIT': 'HEAD'}, ('v2.0', 'env')),
+        ({'TRAVIS_TAG': 'v2.0', 'TRAVIS_COMMIT': 'other'},
+         (None, 'abbrev_commit')),
+    ]
+)
+def test_version_from_environ(git_repo_shallow, environ, expected):
+    hexsha = git_repo_shallow.commit('HEAD').hexsha
+    environ = dict(
+        (key, hexsha if value == 'HEAD' else value)
+        for key, value in environ.items()
+    )
+
+    assert resolver(git_repo_shallow, environ).version(
+        hexsha, hexsha[0:7]
+    ) == (expected[0] or hexsha[0:7], expected[1])
+
+
+def test_version_from_fetch_head(git_repo_remote, git_repo_shallow):
+    git_repo_shallow.git.fetch(
+        '--depth=1', '--no-tags', 'origin', 'refs/tags/v1.0'
+    )
+    hexsha = git_repo_remote.commit('v1.0').hexsha
+
+    assert resolver(git_repo_shallow).version(hexsha, hexsha[0:7]) == (
+        'v1.0', 'fetch_head'
+    )
+
+
+def test_branches(git_repo_remote, git_repo_shallow):
+    hexsha = git_repo_shallow.commit('HEAD').hexsha
+    environ = {'CI_COMMIT_SHA': hexsha, 'CI_COMMIT_BRANCH': 'feature/foo'}
+
+    assert resolver(git_repo_shallow, environ).branches(hexsha) == (
+        ['origin/master'], 'refs'
+    )
+
+    git_repo_shallow.git.fetch('--depth=1', 'origin', 'release')
+    release = git_repo_remote.commit('release').hexsha
+    assert resolver(git_repo_shallow).branches(release) == (
+        ['origin/release'], 'fetch_head'
+    )
+
+    other = git_repo_remote.commit('master~1').hexsha
+    environ['CI_COMMIT_SHA'] = other
+    assert resolver(git_repo_shallow, environ).branches(other) == (
+        ['origin/feature/foo'], 'env'
+    )
+    assert resolver(git_repo_shallow, {
+        'GIT_BRANCH': 'origin/develop',
+        'TRAVIS_BRANCH': 'v1.0',
+        'TRAVIS_TAG': 'v1.0',
+    }).branches(other) == (['origin/develop'], 'env')
+    assert resolver(git_repo_shallow).branches(other) == ([], 'none')
+
+
+def test_results_follow_fetches(git_repo_remote, git_repo_shallow):
+    shallow = resolver(git_repo_shallow)
+    hexsha = git_repo_shallow.commit('HEAD').hexsha
+
+    assert shallow.version(hexsha, hexsha[0:7]) == (
+        hexsha[0:7], 'abbrev_commit'
+    )
+    assert shallow.branches(hexsha) == (['origin/master'], 'refs')
+
+    git_utils.branch(git_repo_remote, 'hotfix', 'master')
+    git_repo_remote.create_tag('v1.1', message='v1.1')
+    git_repo_shallow.git.fetch('--depth=1', 'origin', 'tag', 'v1.1')
+    git_repo_shallow.git.fetch(
+        '--depth=1', 'origin', 'hotfix:refs/remotes/origin/hotfix'
+    )
+
+    assert shallow.version(hexsha, hexsha[0:7]) == ('v1.1', 'tag')
+    assert shallow.branches(hexsha) == (
+        ['origin/hotfix', 'origin/master'], 'refs'
+    )
+
+
+def test_get_infos_without_history_walk(git_repo_shallow):
+    handler = GitHandler(git_repo_shallow.working_dir, cache=True)
+    hexsha = git_repo_shallow.commit('HEAD').hexsha
+
+    with patch.object(handler.describer, '_walk') as mock_walk, \
+            patch('git.cmd.Git.execute') as mock_execute, \
+            patch.dict(os.environ, {'CI_COMMIT_TAG': 'v1.1'}):
+        infos = handler.get_infos(fields=[
+            'version', 'version_source', 'branches', 'top_branches',
+            'branches_source', 'full_commit'
+        ])
+        assert mock_walk.call_count == 0
+        assert mock_execute.call_count == 0
+
+    assert infos['version'] == 'v1.1'
+    assert infos['version_source'] == 'env'
+    assert infos['branches'] == ['master']
+    assert infos['top_branches'] == ['master']
+    assert infos['branches_source'] == 'refs'
+    assert infos['full_commit'] == hexsha
+    assert not os.path.exists(
+        os.path.join(git_repo_shallow.git_dir, 'git-app-version', 'results')
+    )
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+from git_app_version.helper.budget import Budget, BudgetExceeded
+
+
+def test_unlimited():
+    budget = Budget()
+
+    assert budget.remaining() is None
+    assert not budget.expired()
+    budget.check()
+
+
+def test_limited():
+    budget = Budget(60)
+
+    assert 0 < budget.remaining() <= 60
+    assert not budget.expired()
+    budget.check()
+
+
+def test_expired():
+    budget = Budget(0)
+
+    assert budget.remaining() == 0
+    assert budget.expired()
+    with pytest.raises(BudgetExceeded):
+        budget.check()
@@ -94,3 +94,22 @@ def test_timestamp_from_datetime(dt, input_tz, expected):
         dt = tz.localize(dt)
 
     assert expected == date_helper.timestamp_from_datetime(dt)
+
+
+@pytest.mark.parametrize(
+    "value,expected", [
+        ('1456918425', datetime(2016, 3, 2, 11, 33, 45)),
+        (' 0 ', datetime(1970, 1, 1, 0, 0, 0)),
+        ('2016-03-02T12:33:45+0100', datetime(2016, 3, 2, 11, 33, 45)),
+        ('2016-03-02T11:33:45', datetime(2016, 3, 2, 11, 33, 45)),
+        ('2016-03-02', datetime(2016, 3, 2, 0, 0, 0)),
+        ('now', None),
+        ('', None),
+        ('9' * 30, None),
+    ]
+)
+def test_datetime_from_string(value, expected):
+    if expected is not None:
+        expected = pytz.utc.localize(expected)
+
+    assert expected == date_helper.datetime_from_string(value)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+
+import pytest
+from mock import patch
+
+from git_app_version.helper.timing import NULL_TIMINGS, Timings
+
+
+@patch('git_app_version.helper.timing.default_timer')
+def test_timings(mock_timer):
+    mock_timer.side_effect = [0.0, 0.5, 1.0, 1.25, 2.0, 2.5, 3.0, 4.0]
+    timings = Timings()
+
+    with timings.phase('describe'):
+        pass
+    with timings.command(['git', 'describe', '--tag']):
+        pass
+    with timings.phase('describe'):
+        pass
+    with pytest.raises(ValueError):
+        with timings.dump('json'):
+            raise ValueError()
+
+    assert timings.records == [
+        ('phase', 'describe', 0.5),
+        ('git', 'git describe --tag', 0.25),
+        ('phase', 'describe', 0.5),
+        ('dump', 'json', 1.0),
+    ]
+    assert timings.summary() == [
+        ('phase', 'describe', 2, 1.0),
+        ('git', 'git describe --tag', 1, 0.25),
+        ('dump', 'json', 1, 1.0),
+    ]
+
+    report = json.loads(json.dumps(timings.as_dict()))
+    assert len(report['records']) == 4
+    assert report['summary'][0] == {
+        'kind': 'phase', 'name': 'describe', 'calls': 2, 'seconds': 1.0
+    }
+
+    other = Timings()
+    other.extend([['phase', 'format', 0.1]])
+    assert other.records == [('phase', 'format', 0.1)]
+
+
+def test_null_timings():
+    with NULL_TIMINGS.phase('describe'):
+        pass
+    NULL_TIMINGS.add('phase', 'describe', 1.0)
+
+    assert NULL_TIMINGS.records == []
@@ -13,6 +13,7 @@ import yaml
 from backports import configparser, csv
 
 from git_app_version.dumper import FileDumper as AppDumper
+from git_app_version.helper.timing import Timings
 
 try:
     from yaml import CLoader as Loader, CDumper as Dumper
@@ -521,3 +522,98 @@ def test_dump(
         csv_quote=csv_quote,
         csv_eol=csv_eol
     )
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_dump_all(output_dir, workers):
+    data = {
+        'version': 'v1.1.0-3-g439e52',
+        'abbrev_commit': '40aaf83',
+        'author_name': u'Sébastien Dupond',
+        'branches': ['master', 'feature/my_feature'],
+    }
+    timings = Timings()
+
+    targets = AppDumper(timings).dump_all(
+        data=data,
+        fileformats=['sh', 'yaml', 'json', 'yml', 'csv', 'ini', 'xml'],
+        target='version',
+        cwd=output_dir,
+        namespace='app',
+        workers=workers
+    )
+
+    assert targets == [
+        output_dir + '/version.' + extension
+        for extension in ('sh', 'yml', 'json', 'csv', 'ini', 'xml')
+    ]
+    assert [name for _, name, _ in timings.records] == [
+        'sh', 'yaml', 'json', 'csv', 'ini', 'xml'
+    ]
+    for target in targets:
+        with open(target, 'r', encoding='utf-8') as f:
+            content = f.read()
+        fileformat = target.rsplit('.', 1)[1]
+        assert content == read_single_dump(data, fileformat, output_dir)
+
+
+def read_single_dump(data, fileformat, output_dir):
+    target = AppDumper().dump(
+        data=data,
+        fileformat=fileformat,
+        target='single',
+        cwd=output_dir,
+        namespace='app'
+    )
+    with open(target, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_dump_all_formats(output_dir):
+    targets = AppDumper().dump_all(
+        data={'version': 'v1.1.0'},
+        fileformats=['all'],
+        target='version',
+        cwd=output_dir
+    )
+
+    assert [target.rsplit('.', 1)[1] for target in targets] == [
+        'json', 'yml', 'xml', 'ini', 'csv', 'sh'
+    ]
+    assert all(os.path.exists(target) for target in targets)
+
+
+def test_dump_skip_unchanged(output_dir):
+    data = {'version': 'v1.1.0', 'branches': ['master']}
+    dumper = AppDumper(skip_unchanged=True)
+
+    targets = dumper.dump_all(
+        data=data, fileformats=['json', 'sh'], target='version',
+        cwd=output_dir
+    )
+    assert dumper.changed == targets
+    os.chmod(targets[0], 0o600)
+    os.utime(targets[0], (1000000000, 1000000000))
+    os.utime(targets[1], (1000000000, 1000000000))
+
+    data['version'] = 'v1.2.0'
+    dumper.dump_all(
+        data=data, fileformats=['json', 'sh'], target='version',
+        cwd=output_dir
+    )
+    assert dumper.changed == targets
+    assert os.stat(targets[0]).st_mode & 0o777 == 0o600
+    assert os.stat(targets[1]).st_mtime != 1000000000
+    os.utime(targets[1], (1000000000, 1000000000))
+
+    assert dumper.dump(
+        data=data, fileformat='sh', target='version', cwd=output_dir
+    ) == targets[1]
+    assert dumper.changed == []
+    assert os.stat(targets[1]).st_mtime == 1000000000
+    assert sorted(os.listdir(output_dir)) == ['version.json', 'version.sh']
+
+    AppDumper().dump(
+        data=data, fileformat='sh', target='version', cwd=output_dir
+    )
+    assert os.stat(targets[1]).st_mtime != 1000000000
@@ -2,14 +2,21 @@
 from __future__ import unicode_literals
 
 import os
+import time
 from datetime import datetime
 
 import pytest
 import pytz
-from git.exc import InvalidGitRepositoryError
+from git.exc import (
+    GitCommandError, InvalidGitRepositoryError, NoSuchPathError
+)
+from gitdb.exc import BadName
 from mock import patch
 
-from git_app_version.githandler import GitHandler
+import git_app_version.helper.date as dthelper
+from git_app_version.githandler import CommitSnapshot, GitHandler
+from git_app_version.helper.budget import Budget, BudgetExceeded
+from git_app_version.helper.timing import Timings
 from test_helpers import git_utils
 
 
@@ -79,21 +86,29 @@ def git_repo_local(tmpdir_factory, git_repo_remote):
     os.chdir(cwd)
 
 
+@pytest.fixture(params=['gitpython', 'subprocess', 'python'])
+def backend(request):
+    return request.param
+
+
 @pytest.fixture()
-def handler(git_repo):
-    return GitHandler(git_repo.working_dir)
+def handler(git_repo, backend):
+    return GitHandler(git_repo.working_dir, backend=backend)
 
 
 @pytest.fixture()
-def handler_local(git_repo_local):
-    return GitHandler(git_repo_local.working_dir)
+def handler_local(git_repo_local, backend):
+    return GitHandler(git_repo_local.working_dir, backend=backend)
 
 
-def test_not_git_repository(tmpdir):
+def test_not_git_repository(tmpdir, backend):
     not_git_dir = tmpdir.mkdir('not_git')
 
     with pytest.raises(InvalidGitRepositoryError):
-        GitHandler(str(not_git_dir))
+        GitHandler(str(not_git_dir), backend=backend)
+
+    with pytest.raises(NoSuchPathError):
+        GitHandler(str(not_git_dir.join('missing')), backend=backend)
 
 
 @patch('git_app_version.helper.date.datetime')
@@ -114,6 +129,42 @@ def test_get_deploy_date(mock_dt, mock_dt_now, expected, handler):
     assert expectedDate == handler.get_deploy_date()
 
 
+@pytest.mark.parametrize(
+    "deploy_date,environ,expected", [
+        ('commit', None, datetime(2016, 12, 17, 5, 40, 21)),
+        ('1456918425', None, datetime(2016, 3, 2, 11, 33, 45)),
+        (
+            '2016-03-02T12:33:45+0100', '0',
+            datetime(2016, 3, 2, 11, 33, 45)
+        ),
+        (None, '1456918425', datetime(2016, 3, 2, 11, 33, 45)),
+    ]
+)
+def test_get_deploy_date_reproducible(
+    monkeypatch, handler_local, deploy_date, environ, expected
+):
+    if environ is None:
+        monkeypatch.delenv('SOURCE_DATE_EPOCH', raising=False)
+    else:
+        monkeypatch.setenv('SOURCE_DATE_EPOCH', environ)
+
+    infos = handler_local.get_infos(
+        fields=['deploy_date', 'deploy_timestamp'], deploy_date=deploy_date
+    )
+
+    assert infos == {
+        'deploy_date': expected.strftime('%Y-%m-%dT%H:%M:%S+0000'),
+        'deploy_timestamp': dthelper.timestamp_from_datetime(
+            pytz.utc.localize(expected)
+        ),
+    }
+
+
+def test_get_deploy_date_invalid(handler):
+    with pytest.raises(ValueError):
+        handler.get_deploy_date(deploy_date='yesterday')
+
+
 def test_getters(git_repo_local, handler_local):
     name = 'Paul Dupond'
     email = 'paul.dupond@example.com'
@@ -141,6 +192,169 @@ def test_getters(git_repo_local, handler_local):
     assert handler_local.get_commit_date() == author_dt_tz
 
 
+def test_get_commit(git_repo_local, handler_local):
+    commit = git_repo_local.commit('HEAD')
+
+    snapshot = handler_local.get_commit()
+
+    assert isinstance(snapshot, CommitSnapshot)
+    assert snapshot.hexsha == commit.hexsha
+    assert snapshot.abbrev_commit == commit.hexsha[0:7]
+    assert snapshot.message == 'commit 3'
+    assert snapshot.author_name == 'Paul Dupond'
+    assert snapshot.committer_email == 'user@example.com'
+    assert handler_local.get_commit(snapshot) is snapshot
+
+    with pytest.raises(AttributeError):
+        snapshot.hexsha = 'foo'
+
+
+def test_getters_with_snapshot(git_repo_local, handler_local):
+    commit = git_repo_local.commit('HEAD~1')
+    snapshot = handler_local.get_commit('HEAD~1')
+
+    with patch.object(handler_local.backend, 'read_commit') as mock_commit:
+        assert handler_local.get_full_commit(snapshot) == commit.hexsha
+        assert handler_local.get_message(snapshot) == 'release: v0.1.2'
+        assert handler_local.get_author_name(snapshot) == 'User Test'
+        assert handler_local.get_version(snapshot) == 'v0.1.2'
+        assert mock_commit.call_count == 0
+
+
+def test_get_infos_resolves_commit_once(git_repo_local, handler_local):
+    commit_method = handler_local.backend.read_commit
+    read_commit = handler_local.objects.read_commit
+
+    with patch.object(
+        handler_local.backend, 'read_commit', side_effect=commit_method
+    ) as mock_commit, patch.object(
+        handler_local.objects, 'read_commit', side_effect=read_commit
+    ) as mock_read_commit:
+        handler_local.get_infos()
+        assert mock_commit.call_count + mock_read_commit.call_count == 1
+
+
+@pytest.mark.parametrize('packed', [False, True])
+@pytest.mark.parametrize('rev', ['HEAD', 'origin/release', 'v0.1.2'])
+def test_get_commit_in_process(git_repo_local, handler_local, rev, packed):
+    if packed:
+        git_repo_local.git.gc('--quiet')
+
+    expected = CommitSnapshot.from_commit(git_repo_local.commit(rev))
+
+    with patch.object(handler_local.backend, 'read_commit') as mock_commit:
+        assert handler_local.get_commit(rev) == expected
+        assert mock_commit.call_count == 0
+
+
+def test_get_infos_branch_named_like_git_dir_file(
+    git_repo_local, handler_local
+):
+    commit = git_repo_local.commit('HEAD~1')
+    git_utils.branch(git_repo_local, 'description', commit)
+
+    assert handler_local.get_infos(
+        'description', fields=['full_commit']
+    ) == {'full_commit': commit.hexsha}
+
+
+@pytest.mark.parametrize('rev', [
+    'HEAD~1', 'HEAD^', 'master~2', 'v0.1.2^{commit}', 'HEAD^2', 'abbrev'
+])
+def test_get_commit_fallback(git_repo_local, handler_local, rev):
+    if rev == 'abbrev':
+        rev = git_repo_local.commit('HEAD~1').hexsha[0:8]
+    if rev == 'HEAD^2':
+        with pytest.raises((BadName, ValueError)):
+            handler_local.get_commit(rev)
+        return
+
+    expected = CommitSnapshot.from_commit(git_repo_local.commit(rev))
+
+    with patch('git.repo.base.Repo.commit') as mock_commit:
+        assert handler_local.get_commit(rev) == expected
+        assert mock_commit.call_count == 0
+
+    with pytest.raises((BadName, ValueError)):
+        handler_local.get_commit('unknown')
+
+
+def test_get_commits(git_repo_local, handler_local):
+    revs = ['HEAD', 'v0.1.2', 'HEAD~2', 'unknown', 'HEAD^{tree}', 'foo bar']
+
+    result = list(handler_local.get_commits(revs))
+
+    assert [rev for rev, _ in result] == revs
+    for rev, snapshot in result[0:3]:
+        assert snapshot == CommitSnapshot.from_commit(
+            git_repo_local.commit(rev)
+        )
+    assert result[3][1] is None
+    assert result[4][1] is None
+    assert result[5][1] is None
+
+
+def test_iter_history(git_repo_local, handler_local):
+    build_tag_index = handler_local.describer._build_tag_index
+    with patch.object(
+        handler_local.describer, '_build_tag_index',
+        side_effect=build_tag_index
+    ) as mock_tag_index, patch('git.cmd.Git.execute') as mock_execute:
+        history = list(
+            handler_local.iter_history(
+                ['v0.1.2~1..HEAD'], fields=['message', 'version']
+            )
+        )
+        assert mock_tag_index.call_count <= 1
+        assert mock_execute.call_count == 0
+
+    assert history == [
+        {
+            'message': 'commit 3',
+            'version': 'v0.1.2-1-g' + git_repo_local.commit().hexsha[0:7]
+        },
+        {
+            'message': 'release: v0.1.2',
+            'version': 'v0.1.2'
+        },
+    ]
+
+    assert len(list(handler_local.iter_history())) == 4
+
+    history = handler_local.iter_history()
+    assert next(history)['full_commit'] == git_repo_local.commit().hexsha
+    history.close()
+
+    with pytest.raises(GitCommandError):
+        list(handler_local.iter_history(['unknown..HEAD']))
+
+
+def test_get_infos_timings(git_repo_local):
+    timings = Timings()
+    handler = GitHandler(git_repo_local.working_dir, timings=timings)
+    handler.describe_in_process = lambda commit, budget=None: None
+
+    handler.get_infos()
+
+    names = [(kind, name) for kind, name, _ in timings.records]
+    assert names[0:2] == [
+        ('phase', 'resolve commit'),
+        ('phase', 'cache lookup'),
+    ]
+    assert (
+        'git', 'git describe --tag --always ' + git_repo_local.commit().hexsha
+    ) in names
+    assert any(
+        kind == 'git' and name.startswith('git for-each-ref')
+        for kind, name in names
+    )
+    assert ('phase', 'describe') in names
+    assert ('phase', 'branch containment') in names
+    assert ('phase', 'top branches') in names
+    assert names[-1] == ('phase', 'format')
+    assert all(seconds >= 0 for _, _, seconds in timings.records)
+
+
 def test_get_version_no_commit(handler):
     default = '8fa82b6'
     assert handler.get_version() == ''
@@ -177,6 +391,67 @@ def test_get_branches(git_repo_local, handler_local):
     assert handler_local.get_branches() == expected
 
 
+def test_get_branches_commit_graph(git_repo_local, handler_local):
+    expected = ['origin/feature/my_feature', 'origin/master']
+    git_repo_local.git.commit_graph('write', '--reachable')
+
+    with patch.object(handler_local.backend, 'containing') as mock_containing:
+        assert handler_local.get_branches() == expected
+        assert handler_local.get_branches('origin/release') == [
+            'origin/feature/my_feature', 'origin/master', 'origin/release'
+        ]
+        assert mock_containing.call_count == 0
+
+
+@pytest.mark.parametrize('commit_graph', [False, True])
+def test_get_containing(git_repo_local, commit_graph):
+    git_repo_local.create_head('topic', 'HEAD~1')
+    git_repo_local.create_tag('light', 'HEAD~2')
+    with git_repo_local.config_writer() as config:
+        config.set_value('user', 'name', 'User Test')
+        config.set_value('user', 'email', 'user@example.com')
+    git_repo_local.create_tag('annotated', 'HEAD~2', message='annotated')
+    if commit_graph:
+        git_repo_local.git.commit_graph('write', '--reachable')
+    handler = GitHandler(git_repo_local.working_dir)
+    namespaces = ('refs/remotes/', 'refs/heads/', 'refs/tags/')
+    commit = git_repo_local.commit('HEAD~2').hexsha
+
+    with patch('git.cmd.Git.execute', wraps=git_repo_local.git.execute) \
+            as mock_execute:
+        assert handler.get_containing(commit, namespaces) == {
+            'refs/remotes/': [
+                'origin/feature/my_feature', 'origin/master', 'origin/release'
+            ],
+            'refs/heads/': ['master', 'topic'],
+            'refs/tags/': ['annotated', 'light', 'v0.1.2'],
+        }
+        assert handler.get_containing('HEAD', namespaces[1:]) == {
+            'refs/heads/': ['master'],
+            'refs/tags/': [],
+        }
+        # one reachability computation per call
+        assert mock_execute.call_count == (0 if commit_graph else 2)
+
+
+def test_get_infos_containing(git_repo_local, handler_local):
+    git_repo_local.create_head('topic', 'HEAD~1')
+
+    assert handler_local.get_infos(
+        'HEAD~1', fields=['branches', 'local_branches', 'tags_containing']
+    ) == {
+        'branches': [
+            'feature/my_feature', 'master', 'release'
+        ],
+        'local_branches': ['master', 'topic'],
+        'tags_containing': ['v0.1.2'],
+    }
+
+    infos = handler_local.get_infos('HEAD~1')
+    assert 'local_branches' not in infos
+    assert 'tags_containing' not in infos
+
+
 def test_get_top_branches(git_repo_local, handler_local):
     branches = ['origin/feature/my_feature', 'origin/release', 'origin/master']
     expected = ['origin/feature/my_feature', 'origin/master']
@@ -187,6 +462,152 @@ def test_get_top_branches(git_repo_local, handler_local):
     ) == expected
 
 
+def test_get_top_branches_full_commit(git_repo_local, handler_local):
+    branches = ['origin/feature/my_feature', 'origin/release', 'origin/master']
+    expected = ['origin/feature/my_feature', 'origin/master']
+    full_commit = git_repo_local.commit('HEAD').hexsha
+
+    assert handler_local.get_top_branches(
+        branches=branches, full_commit=full_commit
+    ) == expected
+    # same 7 first characters but another commit
+    assert handler_local.get_top_branches(
+        branches=branches, full_commit=full_commit[0:7] + '0' * 33
+    ) == []
+
+
+def test_get_remote_refs(git_repo_local, handler_local):
+    refs = handler_local.get_remote_refs()
+
+    assert refs['origin/master'] == git_repo_local.commit('HEAD').hexsha
+    assert refs['origin/release'] == git_repo_local.commit('HEAD~1').hexsha
+
+
+def test_get_infos_cache(git_repo_local):
+    handler = GitHandler(git_repo_local.working_dir, cache=True)
+    expected = handler.get_infos()
+
+    handler = GitHandler(git_repo_local.working_dir, cache=True)
+    with patch.object(handler, 'get_containing') as mock_branches, \
+            patch.object(handler, 'get_version') as mock_version:
+        assert handler.get_infos()['version'] == expected['version']
+        assert handler.get_infos()['branches'] == expected['branches']
+        assert mock_branches.call_count == 0
+        assert mock_version.call_count == 0
+
+    git_repo_local.create_tag('v0.2.0')
+    assert handler.get_infos()['version'] == 'v0.2.0'
+
+
+def test_get_infos_fields(git_repo_local, handler_local):
+    commit = git_repo_local.commit('HEAD')
+
+    with patch.object(handler_local, 'get_containing') as mock_branches:
+        infos = handler_local.get_infos(fields=['version', 'full_commit'])
+        assert mock_branches.call_count == 0
+
+    assert infos == {'version': 'v0.1.2-1-g' + commit.hexsha[0:7],
+                     'full_commit': commit.hexsha}
+
+    with patch.object(handler_local, 'get_containing') as mock_branches, \
+            patch.object(handler_local, 'get_version') as mock_version:
+        assert handler_local.get_infos(fields=['message']) == {
+            'message': 'commit 3'
+        }
+        assert mock_branches.call_count == 0
+        assert mock_version.call_count == 0
+
+    with pytest.raises(ValueError):
+        handler_local.get_infos(fields=['version', 'foo'])
+
+
+def test_get_infos_fields_cache(git_repo_local):
+    handler = GitHandler(git_repo_local.working_dir, cache=True)
+    version = handler.get_infos(fields=['version'])['version']
+
+    handler = GitHandler(git_repo_local.working_dir, cache=True)
+    with patch.object(handler, 'get_version') as mock_version:
+        infos = handler.get_infos(fields=['version', 'branches'])
+        assert mock_version.call_count == 0
+
+    assert infos == {'version': version,
+                     'branches': ['feature/my_feature', 'master']}
+
+
+def test_get_infos_time_budget(git_repo_local):
+    commit = git_repo_local.commit('HEAD')
+    handler = GitHandler(git_repo_local.working_dir, cache=True)
+
+    infos = handler.get_infos(time_budget=60)
+    assert infos['degraded_fields'] == []
+    assert infos['version'] == 'v0.1.2-1-g' + commit.hexsha[0:7]
+
+    assert handler.get_infos(fields=['version'], time_budget=60) == {
+        'version': 'v0.1.2-1-g' + commit.hexsha[0:7],
+        'degraded_fields': [],
+    }
+
+    # an in process walk or a git command is never started
+    handler = GitHandler(git_repo_local.working_dir)
+    infos = handler.get_infos(time_budget=0)
+    assert infos['version'] == commit.hexsha[0:7]
+    assert 'version_source' not in infos
+    assert infos['branches'] == []
+    assert infos['top_branches'] == []
+    assert infos['degraded_fields'] == ['version', 'branches', 'top_branches']
+
+    infos = handler.get_infos(
+        fields=['version_source', 'branches_source'], time_budget=0
+    )
+    assert infos == {
+        'version_source': 'timeout',
+        'branches_source': 'timeout',
+        'degraded_fields': ['version_source', 'branches_source'],
+    }
+
+    assert handler.get_infos(fields=['version'], time_budget=0) == {
+        'version': commit.hexsha[0:7],
+        'degraded_fields': ['version'],
+    }
+    assert 'degraded_fields' not in handler.get_infos()
+
+
+def test_get_infos_time_budget_not_cached(git_repo_local):
+    handler = GitHandler(git_repo_local.working_dir, cache=True)
+    with patch('git_app_version.githandler.CONCURRENT_GIT', False), \
+            patch.object(
+                handler, 'get_containing', side_effect=BudgetExceeded
+            ):
+        infos = handler.get_infos(
+            fields=['version_source', 'branches', 'top_branches'],
+            time_budget=60
+        )
+    assert infos['degraded_fields'] == ['branches', 'top_branches']
+    assert infos['version_source'] == 'describe'
+
+    infos = handler.get_infos(time_budget=60)
+    assert infos['degraded_fields'] == []
+    assert infos['branches'] == ['feature/my_feature', 'master']
+
+
+def test_git_killed_by_budget(git_repo_local):
+    backend = GitHandler(git_repo_local.working_dir).backend
+    error = GitCommandError(['git', 'branch'], -9)
+
+    def execute(*args, **kwargs):
+        assert 0 < kwargs['kill_after_timeout'] <= 60
+        time.sleep(0.06)
+        raise error
+
+    with patch('git.cmd.Git.execute', side_effect=execute):
+        with pytest.raises(BudgetExceeded):
+            backend.git('branch', ('--remote', ), Budget(0.05))
+
+        # a failure within the budget is not a timeout
+        with pytest.raises(GitCommandError):
+            backend.git('branch', ('--remote', ), Budget(60))
+
+
 @pytest.mark.parametrize(
     "branches,expected", [
         (
@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 # from __future__ import unicode_literals
+import json
 import os
 import re
+import subprocess
+import sys
+import threading
 
 import click
 import pytest
 from click.testing import CliRunner
+from mock import patch
 
 import git_app_version
+from git_app_version.__main__ import cli
 from git_app_version.__main__ import dump as git_app_version_main
+from git_app_version.githandler import GitHandler
+from git_app_version.server import VersionServer
 from test_helpers import git_utils
 
 
@@ -124,6 +132,428 @@ def test_all(git_repo):
     assert result.exit_code == 0
 
 
+def test_cache(git_repo):
+    runner = CliRunner()
+
+    arg = ['--cache', git_repo.working_tree_dir]
+    cache_path = os.path.join(git_repo.git_dir, 'git-app-version', 'results')
+
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 0
+    assert len(os.listdir(cache_path)) == 1
+
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 0
+    assert re.search(r"version\s+0.1.2", result.output)
+
+
+@pytest.mark.parametrize('backend', ['gitpython', 'subprocess', 'python'])
+@pytest.mark.parametrize('commit', ['unknown', 'foo bar'])
+def test_unknown_commit(git_repo, backend, commit):
+    runner = CliRunner()
+
+    arg = ['-q', git_repo.working_tree_dir, commit, '--backend', backend]
+    result = runner.invoke(git_app_version_main, arg)
+
+    assert result.exit_code == 1
+    assert result.exception is None or isinstance(
+        result.exception, SystemExit
+    )
+    assert result.output.find("Unknown commit '{}'.".format(commit)) != -1
+
+
+def test_batch(git_repo):
+    runner = CliRunner()
+    first = git_utils.commit(git_repo, message='commit 2')
+    second = git_utils.commit(git_repo, message='commit 3')
+
+    arg = ['-q', git_repo.working_tree_dir, 'HEAD~1', '-c', '-']
+    result = runner.invoke(
+        git_app_version_main, arg, input='HEAD\n\nunknown\n'
+    )
+
+    assert result.exit_code == 1
+    assert result.output.find("Unknown commit 'unknown'.") != -1
+
+    for commit in (first, second):
+        output_path = os.path.join(
+            git_repo.working_tree_dir,
+            'version-{}.json'.format(commit.hexsha[0:7])
+        )
+        with open(output_path) as fpt:
+            data = json.load(fpt)
+        assert data['full_commit'] == commit.hexsha
+        assert data['version'] == '0.1.2-{}-g{}'.format(
+            1 if commit == first else 2, commit.hexsha[0:7]
+        )
+
+
+def test_fields(git_repo):
+    runner = CliRunner()
+    first = git_utils.commit(git_repo, message='commit 2')
+
+    arg = [
+        '-q', '--fields', 'version,full_commit', '-F', 'version',
+        git_repo.working_tree_dir, 'HEAD', 'HEAD~1'
+    ]
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 0
+
+    output_path = os.path.join(
+        git_repo.working_tree_dir, 'version-{}.json'.format(first.hexsha[0:7])
+    )
+    with open(output_path) as fpt:
+        assert json.load(fpt) == {
+            'version': '0.1.2-1-g{}'.format(first.hexsha[0:7]),
+            'full_commit': first.hexsha
+        }
+
+
+def test_fields_containing(git_repo):
+    runner = CliRunner()
+    git_utils.commit(git_repo, message='commit 2')
+
+    arg = [
+        '-q', '-F', 'local_branches,tags_containing', git_repo.working_dir,
+        'HEAD~1'
+    ]
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 0
+
+    output_path = os.path.join(git_repo.working_tree_dir, 'version.json')
+    with open(output_path) as fpt:
+        assert json.load(fpt) == {
+            'local_branches': ['master'],
+            'tags_containing': ['0.1.2']
+        }
+
+
+def test_skip_unchanged(git_repo):
+    runner = CliRunner()
+    json_path = os.path.join(git_repo.working_tree_dir, 'version.json')
+    sh_path = os.path.join(git_repo.working_tree_dir, 'version.sh')
+
+    arg = [
+        '--skip-unchanged', '-F', 'version,full_commit', '-f', 'json',
+        '-f', 'sh', git_repo.working_tree_dir
+    ]
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 0
+    assert result.output.endswith(
+        'written to :\n{}\n{}\n'.format(json_path, sh_path)
+    )
+
+    os.remove(sh_path)
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 0
+    assert result.output.endswith(
+        'written to :\n{}\nunchanged :\n{}\n'.format(sh_path, json_path)
+    )
+
+
+def test_deploy_date(git_repo, monkeypatch):
+    runner = CliRunner()
+    output_path = os.path.join(git_repo.working_tree_dir, 'version.json')
+    commit = git_repo.commit('HEAD')
+
+    arg = [
+        '-q', '-F', 'deploy_date,deploy_timestamp', '--deploy-date', 'commit',
+        git_repo.working_tree_dir
+    ]
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 0
+    with open(output_path) as fpt:
+        assert json.load(fpt)['deploy_timestamp'] == str(
+            commit.committed_date
+        )
+
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', '1456918425')
+    result = runner.invoke(git_app_version_main, arg[:3] + arg[5:])
+    assert result.exit_code == 0
+    with open(output_path) as fpt:
+        assert json.load(fpt) == {
+            'deploy_date': '2016-03-02T11:33:45+0000',
+            'deploy_timestamp': '1456918425'
+        }
+
+    arg[4] = 'yesterday'
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 2
+    assert 'yesterday is not a valid date' in result.output
+
+
+def test_backend(git_repo):
+    runner = CliRunner()
+    git_utils.commit(git_repo, message='commit 2')
+
+    outputs = []
+    for backend in ('gitpython', 'subprocess', 'python', 'auto'):
+        arg = [
+            '-q', '-F', 'full_commit,version,branches,local_branches',
+            '--backend', backend, git_repo.working_dir, 'HEAD~1'
+        ]
+        result = runner.invoke(git_app_version_main, arg)
+        assert result.exit_code == 0
+
+        output_path = os.path.join(git_repo.working_tree_dir, 'version.json')
+        with open(output_path) as fpt:
+            outputs.append(json.load(fpt))
+
+    assert outputs[0]['version'] == '0.1.2'
+    assert outputs[0]['local_branches'] == ['master']
+    assert all(output == outputs[0] for output in outputs)
+
+    result = runner.invoke(
+        git_app_version_main, ['--backend', 'dulwich', git_repo.working_dir]
+    )
+    assert result.exit_code == 2
+
+
+def test_fields_unknown(git_repo):
+    runner = CliRunner()
+
+    arg = ['--fields', 'version,foo', git_repo.working_tree_dir]
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 2
+    assert result.output.find('unknown field(s) foo') != -1
+
+
+def test_timeout(git_repo):
+    try:
+        runner = CliRunner(mix_stderr=False)
+    except TypeError:
+        # click >= 8.2 always keeps stderr apart
+        runner = CliRunner()
+    commit = git_utils.commit(git_repo, message='commit 2')
+    output_path = os.path.join(git_repo.working_tree_dir, 'version.json')
+
+    arg = ['-q', '--timeout', '60', '-F', 'version', git_repo.working_dir]
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 0
+    assert result.stderr == ''
+    with open(output_path) as fpt:
+        assert json.load(fpt) == {
+            'version': '0.1.2-1-g{}'.format(commit.hexsha[0:7]),
+            'degraded_fields': []
+        }
+
+    arg = ['-q', '--timeout', '0', '-F', 'version', git_repo.working_dir]
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 0
+    assert result.stderr.find(
+        'time budget exceeded for commit \'HEAD\', degraded fields : version'
+    ) != -1
+    with open(output_path) as fpt:
+        assert json.load(fpt) == {
+            'version': commit.hexsha[0:7],
+            'degraded_fields': ['version']
+        }
+
+
+def test_multiple_repositories(tmpdir_factory):
+    runner = CliRunner()
+    parent = str(tmpdir_factory.mktemp('repositories'))
+    other = str(tmpdir_factory.mktemp('other'))
+
+    repos = []
+    for name, version in (('service_a', '1.0.0'), ('service_b', '2.0.0')):
+        os.makedirs(os.path.join(parent, name))
+        repos.append(
+            git_utils.default_init(
+                version=version, repo_dir=os.path.join(parent, name)
+            )
+        )
+    os.makedirs(os.path.join(parent, 'not_git'))
+    repos.append(git_utils.default_init(version='3.0.0', repo_dir=other))
+
+    arg = [
+        '-r', other, '-j', '2', '-o', 'build/version',
+        os.path.join(parent, '*')
+    ]
+    result = runner.invoke(git_app_version_main, arg)
+
+    assert result.exit_code == 1
+    assert result.output.find(
+        "The directory '{}' is not a git repository.".format(
+            os.path.join(os.path.realpath(parent), 'not_git')
+        )
+    ) != -1
+
+    for repo, version in zip(repos, ('1.0.0', '2.0.0', '3.0.0')):
+        assert result.output.find(
+            'Repository : {}'.format(os.path.realpath(repo.working_dir))
+        ) != -1
+        output_path = os.path.join(
+            repo.working_tree_dir, 'build', 'version.json'
+        )
+        with open(output_path) as fpt:
+            assert json.load(fpt)['version'] == version
+
+
+def test_cli_default_command(git_repo):
+    runner = CliRunner()
+
+    for arg in (['-q'], ['dump', '-q']):
+        result = runner.invoke(cli, arg + [git_repo.working_tree_dir])
+        assert result.exit_code == 0
+
+    result = runner.invoke(cli, ['-V'])
+    assert result.output == 'git-app-version ' + git_app_version.__version__ \
+        + '\n'
+
+
+@pytest.mark.parametrize('running', [True, False])
+def test_daemon(git_repo, tmpdir_factory, running):
+    runner = CliRunner()
+    socket_path = os.path.join(
+        str(tmpdir_factory.mktemp('daemon')), 'daemon.sock'
+    )
+
+    if running:
+        server = VersionServer(socket_path)
+        thread = threading.Thread(target=server.serve_until_stopped)
+        thread.start()
+
+    try:
+        arg = [
+            '--daemon', '--socket', socket_path, git_repo.working_tree_dir
+        ]
+        result = runner.invoke(git_app_version_main, arg)
+        assert result.exit_code == 0
+        assert re.search(r"version\s+0.1.2", result.output)
+        if running:
+            assert len(server._handlers) == 1
+    finally:
+        if running:
+            server.stopped = True
+            thread.join()
+
+
+def test_watch(git_repo):
+    runner = CliRunner()
+    output_path = os.path.join(git_repo.working_tree_dir, 'version.json')
+    versions = []
+
+    def watch_changes(watcher, callback, debounce, on_error):
+        with open(output_path) as fpt:
+            versions.append(json.load(fpt)['version'])
+        on_error(ValueError('HEAD is being updated'))
+        git_utils.commit(git_repo, message='commit 2')
+        callback()
+
+    with patch(
+        'git_app_version.__main__.watch_changes', side_effect=watch_changes
+    ):
+        result = runner.invoke(
+            cli, ['watch', '-q', '-F', 'version', git_repo.working_tree_dir]
+        )
+    assert result.exit_code == 0
+
+    with open(output_path) as fpt:
+        versions.append(json.load(fpt)['version'])
+    assert versions[0] == '0.1.2'
+    assert re.match(r'^0\.1\.2-1-g[0-9a-f]{7}$', versions[1])
+
+
+def test_watch_startup_error(git_repo):
+    runner = CliRunner()
+    output_path = os.path.join(git_repo.working_tree_dir, 'version.json')
+    get_infos = GitHandler.get_infos
+    calls = []
+
+    def failing_once(self, *args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise ValueError('HEAD is being updated')
+        return get_infos(self, *args, **kwargs)
+
+    def watch_changes(watcher, callback, debounce, on_error):
+        assert not os.path.exists(output_path)
+        callback()
+
+    with patch.object(GitHandler, 'get_infos', failing_once), patch(
+        'git_app_version.__main__.watch_changes', side_effect=watch_changes
+    ):
+        result = runner.invoke(
+            cli, ['watch', '-q', '-F', 'version', git_repo.working_tree_dir]
+        )
+    assert result.exit_code == 0
+    assert result.output.find(
+        'Regeneration failed : HEAD is being updated'
+    ) != -1
+
+    with open(output_path) as fpt:
+        assert json.load(fpt)['version'] == '0.1.2'
+
+
+def test_history(git_repo):
+    runner = CliRunner()
+    git_utils.commit(git_repo, message='commit 2')
+
+    arg = ['history', '-F', 'version', git_repo.working_tree_dir, 'HEAD~2..']
+    result = runner.invoke(cli, arg)
+    assert result.exit_code == 0
+    lines = [json.loads(line) for line in result.output.splitlines()]
+    assert lines[1] == {'version': '0.1.2'}
+    assert lines[0]['version'].startswith('0.1.2-1-g')
+
+    output_path = os.path.join(git_repo.working_tree_dir, 'history.jsonl')
+    result = runner.invoke(
+        cli, ['history', '-o', output_path, git_repo.working_tree_dir]
+    )
+    assert result.exit_code == 0
+    with open(output_path) as fpt:
+        assert len(fpt.readlines()) == 3
+
+    result = runner.invoke(
+        cli, ['history', git_repo.working_tree_dir, 'unknown..HEAD']
+    )
+    assert result.exit_code == 1
+    assert result.output.find("Invalid revisions 'unknown..HEAD'.") != -1
+
+
+@pytest.mark.parametrize('several', [False, True])
+def test_profile(git_repo, tmpdir_factory, several):
+    try:
+        runner = CliRunner(mix_stderr=False)
+    except TypeError:
+        # click >= 8.2 always keeps stderr apart
+        runner = CliRunner()
+
+    arg = ['-q', '--profile', '-f', 'json', '-f', 'sh', git_repo.working_dir]
+    if several:
+        other = str(tmpdir_factory.mktemp('other'))
+        git_utils.default_init(repo_dir=other)
+        arg += ['-r', other]
+
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 0
+    assert result.stdout == ''
+    assert re.search(r'phase\s+describe\s+{}'.format(2 if several else 1),
+                     result.stderr)
+    assert re.search(r'dump\s+sh\s+{}'.format(2 if several else 1),
+                     result.stderr)
+
+    result = runner.invoke(
+        git_app_version_main, arg + ['--profile-format', 'json']
+    )
+    assert result.exit_code == 0
+    report = json.loads(result.stderr)
+    assert ('dump', 'json') in [
+        (item['kind'], item['name']) for item in report['summary']
+    ]
+
+
+def test_repository_glob_without_match(tmpdir):
+    runner = CliRunner()
+
+    result = runner.invoke(
+        git_app_version_main, [os.path.join(tmpdir, 'nothing*')]
+    )
+
+    assert result.exit_code == 2
+
+
 def test_metadata(git_repo):
     runner = CliRunner()
 
@@ -142,6 +572,20 @@ def test_metadata(git_repo):
     assert result.exit_code == 0
 
 
+def test_metadata_optional_field(git_repo):
+    runner = CliRunner()
+
+    arg = ['-q', '-m', 'version_source=ci', git_repo.working_tree_dir]
+    output_path = os.path.join(git_repo.working_tree_dir, 'version.json')
+
+    result = runner.invoke(git_app_version_main, arg)
+    assert result.exit_code == 0
+    with open(output_path) as fpt:
+        data = json.load(fpt)
+    assert data['version_source'] == 'ci'
+    assert 'branches_source' not in data
+
+
 def test_metadata_reserved_key(git_repo):
     runner = CliRunner()
 
@@ -169,3 +613,54 @@ def test_metadata_invalid_format(git_repo):
     result = runner.invoke(git_app_version_main, arg)
     assert result.exit_code == 2
     assert result.output.find(expected.format(bad_key)) != -1
+
+
+# libraries a `dump --quiet -f json` run must not import
+SLOW_IMPORTS = (
+    'git', 'tabulate', 'yaml', 'xmltodict', 'backports', 'iso8601',
+    'pkg_resources', 'multiprocessing', 'ctypes',
+)
+
+
+def imported_modules(args, cwd):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.abspath(
+            git_app_version.__file__
+        )))] + [path for path in [env.get('PYTHONPATH')] if path]
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime'] + args,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    _, stderr = process.communicate()
+    assert process.returncode == 0, stderr
+
+    return set(
+        line.rsplit('|', 1)[1].strip()
+        for line in stderr.decode('utf-8').splitlines()
+        if line.startswith('import time:') and not line.endswith('package')
+    )
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 7), reason='-X importtime requires python 3.7'
+)
+def test_import_time(git_repo):
+    modules = imported_modules(
+        ['-m', 'git_app_version', 'dump', '--quiet', '-f', 'json',
+         git_repo.working_tree_dir],
+        git_repo.working_tree_dir
+    )
+
+    assert os.path.exists(
+        os.path.join(git_repo.working_tree_dir, 'version.json')
+    )
+    assert 'git_app_version.dumper' in modules
+    slow = sorted(
+        name for name in modules if name.split('.')[0] in SLOW_IMPORTS
+    )
+    assert slow == []
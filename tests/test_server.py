@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import socket
+import threading
+
+import pytest
+
+from git_app_version import client
+from git_app_version.fanout import collect
+from git_app_version.server import VersionServer
+from test_helpers import git_utils
+
+
+@pytest.fixture()
+def git_repo(git_repo):
+    return git_utils.default_commits(git_repo)
+
+
+@pytest.fixture()
+def socket_path(tmpdir_factory):
+    return os.path.join(str(tmpdir_factory.mktemp('daemon')), 'daemon.sock')
+
+
+@pytest.fixture()
+def server(socket_path):
+    server = VersionServer(socket_path)
+    thread = threading.Thread(target=server.serve_until_stopped)
+    thread.start()
+    yield server
+    server.stopped = True
+    thread.join()
+
+
+def test_collect(server, socket_path, git_repo):
+    expected = collect(
+        git_repo.working_dir, ['HEAD', 'unknown'], deploy_date='commit'
+    )
+
+    assert client.collect(
+        git_repo.working_dir, ['HEAD', 'unknown'], socket_path=socket_path,
+        deploy_date='commit'
+    ) == expected
+
+    assert client.collect(
+        git_repo.working_dir, fields=['version'], socket_path=socket_path
+    ) == [('HEAD', {'version': '0.1.2'})]
+
+
+def test_handlers_stay_warm(server, socket_path, git_repo):
+    for _ in range(2):
+        client.collect(git_repo.working_dir, socket_path=socket_path)
+
+    assert len(server._handlers) == 1
+
+    git_utils.commit(git_repo, message='commit 2')
+    git_repo.create_tag('0.2.0')
+    assert client.collect(
+        git_repo.working_dir, fields=['version'], socket_path=socket_path
+    ) == [('HEAD', {'version': '0.2.0'})]
+
+
+def test_client_environment(server, socket_path, git_repo, monkeypatch):
+    monkeypatch.setenv('SOURCE_DATE_EPOCH', '1456918425')
+    assert client.collect(
+        git_repo.working_dir, fields=['deploy_timestamp'],
+        socket_path=socket_path
+    ) == [('HEAD', {'deploy_timestamp': '1456918425'})]
+
+    # the daemon environment is never used
+    assert server.dispatch({
+        'repository': git_repo.working_dir,
+        'fields': ['deploy_timestamp'],
+        'environ': {'SOURCE_DATE_EPOCH': '0'}
+    }) == {'results': [('HEAD', {'deploy_timestamp': '0'})]}
+    results = server.dispatch({
+        'repository': git_repo.working_dir, 'fields': ['deploy_timestamp']
+    })['results']
+    assert results[0][1]['deploy_timestamp'] != '1456918425'
+
+
+def test_socket_mode(server, socket_path):
+    assert os.stat(socket_path).st_mode & 0o777 == 0o600
+
+
+def test_errors(server, socket_path, tmpdir_factory):
+    not_git = str(tmpdir_factory.mktemp('not_git'))
+
+    with pytest.raises(client.DaemonError) as exc:
+        client.collect(not_git, socket_path=socket_path)
+    assert str(exc.value) == (
+        "The directory '{}' is not a git repository.".format(not_git)
+    )
+
+    assert client.request(
+        {'command': 'foo'}, socket_path
+    ) == {'error': 'unknown command foo'}
+
+
+def test_no_daemon(socket_path, git_repo):
+    assert not client.ping(socket_path)
+    assert client.collect(git_repo.working_dir, socket_path=socket_path) \
+        is None
+
+
+def test_shutdown_and_stale_socket(socket_path):
+    server = VersionServer(socket_path)
+    thread = threading.Thread(target=server.serve_until_stopped)
+    thread.start()
+
+    assert client.ping(socket_path)
+    with pytest.raises(socket.error):
+        VersionServer(socket_path)
+
+    assert client.request({'command': 'shutdown'}, socket_path) == {
+        'stopped': True
+    }
+    thread.join()
+    assert not os.path.exists(socket_path)
+
+    # a socket file left by a killed daemon
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    VersionServer(socket_path).server_close()
+
+
+def test_idle_timeout(socket_path):
+    server = VersionServer(socket_path, idle_timeout=0.1)
+    server.serve_until_stopped()
+
+    assert not os.path.exists(socket_path)
+
+
+def test_default_socket_path(monkeypatch):
+    monkeypatch.setenv('GIT_APP_VERSION_SOCKET', '/foo/bar.sock')
+    assert client.default_socket_path() == '/foo/bar.sock'
+
+    monkeypatch.delenv('GIT_APP_VERSION_SOCKET')
+    monkeypatch.setenv('XDG_RUNTIME_DIR', '/run/user/1000')
+    assert client.default_socket_path() == (
+        '/run/user/1000/git-app-version-{}.sock'.format(os.getuid())
+    )
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import threading
+import time
+
+import pytest
+
+from git_app_version.watcher import (
+    InotifyWatcher, PollingWatcher, create_watcher, load_libc, watch
+)
+from test_helpers import git_utils
+
+
+def inotify_available():
+    try:
+        load_libc()
+    except OSError:
+        return False
+    return True
+
+
+@pytest.fixture()
+def git_repo(git_repo):
+    return git_utils.default_commits(git_repo)
+
+
+@pytest.fixture(params=['inotify', 'polling'])
+def watcher(request, git_repo):
+    if request.param == 'inotify':
+        if not inotify_available():
+            pytest.skip('inotify is unavailable')
+        watcher = InotifyWatcher(git_repo.git_dir)
+    else:
+        watcher = PollingWatcher(git_repo.git_dir, poll_interval=0.01)
+
+    yield watcher
+    watcher.close()
+
+
+def test_create_watcher(git_repo):
+    watcher = create_watcher(git_repo.git_dir, inotify=False)
+    assert isinstance(watcher, PollingWatcher)
+    watcher.close()
+
+    watcher = create_watcher(git_repo.git_dir)
+    expected = InotifyWatcher if inotify_available() else PollingWatcher
+    assert isinstance(watcher, expected)
+    watcher.close()
+
+
+@pytest.mark.parametrize(
+    'change', [
+        lambda repo: git_utils.commit(repo, message='commit 2'),
+        lambda repo: repo.git.branch('feature/foo'),
+        lambda repo: repo.git.pack_refs('--all'),
+        lambda repo: repo.git.checkout('-q', '--detach'),
+        lambda repo: repo.git.reset('-q', '--hard', 'HEAD~1'),
+    ]
+)
+def test_detect_changes(watcher, git_repo, change):
+    assert not watcher.wait(0.05)
+
+    # mtime resolution of some file systems
+    time.sleep(0.01)
+    change(git_repo)
+
+    assert watcher.wait(2)
+    while watcher.wait(0.1):
+        pass
+    assert not watcher.wait(0.05)
+
+
+def test_ignore_working_tree(watcher, git_repo):
+    with open(os.path.join(git_repo.working_dir, 'foo.txt'), 'w') as fpt:
+        fpt.write('foo')
+    git_repo.git.add('foo.txt')
+
+    assert not watcher.wait(0.1)
+
+
+def test_watch_debounce(watcher, git_repo):
+    calls = []
+    stop = threading.Event()
+
+    def callback():
+        calls.append(git_repo.commit('HEAD').message.strip())
+        stop.set()
+
+    thread = threading.Thread(
+        target=watch, args=(watcher, callback, 0.3, stop)
+    )
+    thread.start()
+
+    for index in range(3):
+        git_utils.commit(git_repo, message='burst {}'.format(index))
+    thread.join(10)
+
+    assert calls == ['burst 2']
+
+
+def test_watch_callback_error(watcher, git_repo):
+    calls = []
+    errors = []
+    stop = threading.Event()
+
+    def callback():
+        calls.append(git_repo.commit('HEAD').message.strip())
+        if len(calls) == 1:
+            raise ValueError('HEAD is being updated')
+        stop.set()
+
+    thread = threading.Thread(
+        target=watch, args=(watcher, callback, 0.05, stop, errors.append)
+    )
+    thread.start()
+
+    git_utils.commit(git_repo, message='first')
+    for _ in range(100):
+        if errors:
+            break
+        time.sleep(0.05)
+    git_utils.commit(git_repo, message='second')
+    thread.join(10)
+    stop.set()
+
+    assert not thread.is_alive()
+    assert [str(exc) for exc in errors] == ['HEAD is being updated']
+    assert calls == ['first', 'second']